@@ -1,26 +1,46 @@
 # config.py
-from pydantic_settings import BaseSettings
+import os
+import functools
+from dataclasses import dataclass, fields
 from pathlib import Path
+from dotenv import load_dotenv
 
-class Settings(BaseSettings):
+BASE_DIR = Path(__file__).parent
+DEFAULT_DATA_PATH = BASE_DIR / "storage" / "data"
+
+@dataclass(frozen=True)
+class Settings:
     # OpenAI
     OPENAI_API_KEY: str
     EMBEDDING_MODEL: str = "text-embedding-3-large"
     LLM_MODEL: str = "gpt-4o"
     MAX_TOKENS: int = 4096
     TEMPERATURE: float = 0.7
+    OPENAI_MAX_CONCURRENCY: int = 16  # In-flight chat completions per client
     
     # Storage
-    BASE_PATH: Path = Path(__file__).parent
-    DATA_PATH: Path = BASE_PATH / "storage" / "data"
-    CACHE_PATH: Path = DATA_PATH / "cache"
-    CHAPTERS_PATH: Path = DATA_PATH / "chapters"
-    EMBEDDINGS_PATH: Path = DATA_PATH / "embeddings"
+    BASE_PATH: Path = BASE_DIR
+    DATA_PATH: Path = DEFAULT_DATA_PATH
+    CACHE_PATH: Path = DEFAULT_DATA_PATH / "cache"
+    CHAPTERS_PATH: Path = DEFAULT_DATA_PATH / "chapters"
+    EMBEDDINGS_PATH: Path = DEFAULT_DATA_PATH / "embeddings"
+    STORAGE_BACKEND: str = "json"  # Options: json, sqlite (indexed chapter_id lookups)
     
     # Processing
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    CHUNK_TOKENS: int = 256  # Upload splitter chunk size, in embedding-model tokens (~1000 chars)
+    CHUNK_OVERLAP_TOKENS: int = 50
+    CHUNK_DUPLICATE_JACCARD: float = 0.9  # Upload chunks this similar to an earlier one are dropped
     EMBEDDING_BATCH_SIZE: int = 100
+    EMBEDDING_MAX_CONCURRENCY: int = 8  # Embedding batches in flight at once
+    EMBEDDING_CACHE_SIZE: int = 2048  # Embeddings kept in memory (all are persisted on disk)
+    
+    # Vector Store
+    VECTOR_IVF_THRESHOLD: int = 20000  # Switch to IVF-PQ once the corpus reaches this size
+    VECTOR_IVF_FACTORY: str = "IVF256,PQ48"
+    VECTOR_IVF_NPROBE: int = 16
+    VECTOR_SEARCH_PROFILE: str = ""  # Options: fast, balanced, recall (sets nprobe instead of VECTOR_IVF_NPROBE)
     
     # Langchain Settings
     TEXT_SPLITTER_TYPE: str = "recursive"  # Options: recursive, markdown, character
@@ -29,15 +49,35 @@ class Settings(BaseSettings):
     # Question Generation
     VALIDATION_CONFIDENCE_THRESHOLD: int = 80
     MAX_REGENERATION_ATTEMPTS: int = 2
+    QUESTION_CANDIDATES: int = 3  # Drafts requested per generation call (n)
+    VALIDATION_MODEL: str = "gpt-4o-mini"
+    SEMANTIC_DUPLICATE_THRESHOLD: float = 0.92  # Max cosine similarity to an existing question
+    QUESTION_CACHE_CHAPTERS: int = 32  # Chapters whose dedup indexes stay in memory
+    CHUNK_QUALITY_FLUSH_EVERY: int = 10  # Questions between chunk quality writes
+    RAG_ANSWER_CACHE_SIMILARITY: float = 0.9  # Min cosine similarity to reuse an earlier RAG answer (0.9 over 0.85: fewer wrong reuses)
+    LLM_RESPONSE_CACHE_TTL: int = 600  # Seconds identical validation prompts reuse a response
+
+@functools.lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build settings from the environment (and .env) once per process"""
+    load_dotenv(BASE_DIR / ".env")
+    
+    if not os.environ.get("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY is not set (environment or .env)")
+    
+    # Override defaults with environment values, cast to the default's type
+    overrides = {"OPENAI_API_KEY": os.environ["OPENAI_API_KEY"]}
+    for field in fields(Settings)[1:]:
+        raw = os.environ.get(field.name)
+        if raw is not None:
+            overrides[field.name] = type(field.default)(raw)
+    
+    s = Settings(**overrides)
+    
+    # Create directories
+    for path in [s.DATA_PATH, s.CACHE_PATH, s.CHAPTERS_PATH, s.EMBEDDINGS_PATH]:
+        path.mkdir(parents=True, exist_ok=True)
     
-    class Config:
-        env_file = ".env"
-        
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # Create directories
-        for path in [self.DATA_PATH, self.CACHE_PATH, self.CHAPTERS_PATH, 
-                     self.EMBEDDINGS_PATH]:
-            path.mkdir(parents=True, exist_ok=True)
+    return s
 
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
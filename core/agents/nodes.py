@@ -1,60 +1,394 @@
 # core/agents/nodes.py
-from typing import Dict, Any, List
-from openai import AsyncOpenAI
-import json
-import time
+from typing import Dict, Any, List, Optional, Tuple
+from pathlib import Path
+import orjson
+import atexit
 import random
-from collections import Counter
+import hashlib
+import time
+import heapq
+import math
+import asyncio
+import re
+import numpy as np
+from collections import Counter, OrderedDict, deque
 from config import settings
 from storage.vector_store import LocalVectorStore
+from core.openai_client import get_openai_client
 from core.embeddings import EmbeddingManager
 from core.image_processor import ImageProcessor
-from storage.json_store import JSONStorage
+from storage.factory import create_storage
+from core.question_index import QuestionIndex
+from core.search_batcher import SearchBatcher
 from .prompts import get_generation_prompt, get_validation_prompt
 from utils.logger import setup_logger
 import difflib
 
 logger = setup_logger(__name__)
 
+# Difficulty-based retrieval configuration
+CONTEXT_CONFIG = {
+    "intermediate": {"k": 15, "chunks_to_use": 3},  # Simpler, fewer chunks
+    "advanced": {"k": 20, "chunks_to_use": 5},      # Standard
+    "complex": {"k": 25, "chunks_to_use": 7}        # More context for complex
+}
+
+RETRIEVAL_QUERIES = {
+    "intermediate": "fundamental concepts, definitions, basic mechanisms in medical textbook",
+    "advanced": "clinical applications, pathophysiology, diagnostic approach in medical context",
+    "complex": "complex cases, differential diagnosis, complications, multi-system integration"
+}
+
+# Capitalized words or acronyms of 5+ chars; inner hyphens kept, punctuation dropped
+MEDICAL_TERM_RE = re.compile(r"\b[A-Z](?:[A-Za-z0-9]|-(?=[A-Za-z0-9])){4,}\b")
+
+# Completed top-level "question" string in a partially streamed JSON draft
+QUESTION_FIELD_RE = re.compile(r'"question"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
 class QuestionGeneratorNodes:
     """Individual nodes for the LangGraph workflow"""
     
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    _shared_vector_store: Optional[LocalVectorStore] = None  # read-only store shared by instances
+    
+    @classmethod
+    def _default_vector_store(cls) -> LocalVectorStore:
+        """Memory-mapped store loaded once per process for instances given no store"""
+        if cls._shared_vector_store is None:
+            vector_store = LocalVectorStore()
+            vector_store.load(settings.EMBEDDINGS_PATH, mmap=True)
+            cls._shared_vector_store = vector_store
+        else:
+            cls._shared_vector_store.reload_if_changed(settings.EMBEDDINGS_PATH)
+        return cls._shared_vector_store
+    
+    def __init__(self, vector_store: Optional[LocalVectorStore] = None):
+        # Shared pooled client for concurrent generations; the semaphore
+        # caps in-flight chat completions so bursts don't trip rate limits
+        self.client = get_openai_client()
+        self._llm_semaphore = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
         self.embedding_manager = EmbeddingManager()
         self.image_processor = ImageProcessor()
-        self.vector_store = LocalVectorStore()
-        self.vector_store.load(settings.EMBEDDINGS_PATH)
-        self.storage = JSONStorage(settings.CACHE_PATH)
+        
+        if vector_store is None:
+            vector_store = self._default_vector_store()
+        self.vector_store = vector_store
+        self.search_batcher = SearchBatcher(vector_store)
+        self.storage = create_storage()
         
         # Add caches for performance
         self._question_cache = {}  # chapter_id -> questions
-        self._cache_timestamp = {}  # chapter_id -> timestamp
+        self._questions_mtime = None  # questions.json mtime when _question_cache was grouped
+        self._cache_mtime = {}  # chapter_id -> questions.json mtime when cached
+        self._stale_chapters = set()  # chapters to re-read on next access
+        self._recent_chapters = OrderedDict()  # LRU order of chapters with derived caches
+        self._chunk_quality: Optional[Dict[str, deque]] = None  # chunk_id -> last 10 scores
+        self._chunk_quality_pending = 0  # updates not yet written to disk
+        atexit.register(self._flush_chunk_quality)
+        self._validation_inflight: Dict[str, asyncio.Future] = {}  # prompt hash -> pending response
+        self._validation_responses = OrderedDict()  # prompt hash -> (monotonic time, response)
+        self._validation_verdicts = OrderedDict()  # draft hash -> (monotonic time, verdict)
+        self._search_cache = OrderedDict()  # (query, k, chapter_id) -> (store version, results)
+        self._question_arrays = {}  # chapter_id -> struct-of-arrays view of cached questions
+        self._question_index = {}  # chapter_id -> QuestionIndex
+        self._image_ids_cache = {}  # chapter_id -> (images.json mtime, image ids)
+        self._query_embeddings_path = settings.CACHE_PATH / "query_embeddings.npz"
+        self._query_embeddings = self._load_query_embeddings()  # query -> embedding
+        self._question_vectors = {}  # chapter_id -> {question text: unit embedding}
+        self._question_matrix = {}  # chapter_id -> (questions mtime, (N, d) embedding matrix)
     
     def _get_cached_questions(self, chapter_id: int) -> list:
         """Get questions with caching to reduce disk I/O"""
-        current_time = time.time()
+        mtime = self.storage.get_mtime('questions')
+        
+        # One full read, grouped by chapter, whenever questions.json changes
+        # on disk - not a filtered scan per chapter
+        if mtime != self._questions_mtime:
+            grouped = {}
+            for q in self.storage.load('questions'):
+                grouped.setdefault(q.get('chapter_id'), []).append(q)
+            
+            self._question_cache = grouped
+            self._cache_mtime = dict.fromkeys(grouped, mtime)
+            self._question_arrays = {}
+            self._stale_chapters.clear()
+            self._questions_mtime = mtime
+        
+        if chapter_id in self._stale_chapters:
+            self._question_cache[chapter_id] = self.storage.filter('questions', chapter_id=chapter_id)
+            self._stale_chapters.discard(chapter_id)
+        
+        questions = self._question_cache.setdefault(chapter_id, [])
+        self._cache_mtime.setdefault(chapter_id, mtime)
+        self._touch_chapter(chapter_id)
+        if chapter_id not in self._question_arrays:
+            arrays = {'texts': [], 'terms': [], 'source_chunks': [], 'recent_chunks': None, 'topics': None}
+            for q in questions:
+                self._append_question_arrays(arrays, q)
+            self._question_arrays[chapter_id] = arrays
         
-        # Cache for 30 seconds
-        if (chapter_id in self._question_cache and 
-            current_time - self._cache_timestamp.get(chapter_id, 0) < 30):
-            return self._question_cache[chapter_id]
+        return questions
+    
+    def _append_question_arrays(self, arrays: Dict[str, list], question: Dict[str, Any]) -> None:
+        terms = frozenset(self._question_terms(question))
+        
+        # Slide the covered-topic window: add the new question's terms and
+        # drop those of the question that falls out of the last 15
+        topics = arrays['topics']
+        if topics is not None:
+            topics.update(terms)
+            if len(arrays['terms']) >= 15:
+                topics.subtract(arrays['terms'][-15])
+                arrays['topics'] = +topics  # Drop zero counts
+        
+        arrays['texts'].append(question.get('question', ''))
+        arrays['terms'].append(terms)
+        arrays['source_chunks'].append(question.get('source_chunks', []))
+        arrays['recent_chunks'] = None  # recent-window union is stale now
+    
+    def _recent_chunk_indices(self, arrays: Dict[str, Any]) -> set:
+        """Chunk indices used by the last 20 questions, cached until a question is added"""
+        if arrays['recent_chunks'] is None:
+            arrays['recent_chunks'] = set().union(*arrays['source_chunks'][-20:])
+        return arrays['recent_chunks']
+    
+    def _get_question_arrays(self, chapter_id: int) -> Dict[str, list]:
+        """
+        Parallel per-question columns for a chapter: texts, term frozensets, source chunks
         
-        # Reload from disk
-        questions = self.storage.filter('questions', chapter_id=chapter_id)
-        self._question_cache[chapter_id] = questions
-        self._cache_timestamp[chapter_id] = current_time
+        The dedup and retrieval loops read these instead of digging through
+        the question dicts on every call.
+        """
+        self._get_cached_questions(chapter_id)
+        return self._question_arrays[chapter_id]
+    
+    def _touch_chapter(self, chapter_id: int) -> None:
+        """Mark a chapter as recently used, evicting derived caches of the least recent"""
+        self._recent_chapters[chapter_id] = None
+        self._recent_chapters.move_to_end(chapter_id)
+        
+        # Term sets, LSH indexes and embedding matrices are rebuilt on demand
+        # (embeddings from their on-disk cache), so only the hot chapters keep them
+        while len(self._recent_chapters) > settings.QUESTION_CACHE_CHAPTERS:
+            evicted, _ = self._recent_chapters.popitem(last=False)
+            for cache in (self._question_arrays, self._question_index,
+                          self._question_matrix, self._question_vectors):
+                cache.pop(evicted, None)
+    
+    def record_question(self, question: Dict[str, Any]) -> None:
+        """Add a just-saved question to the cache in place instead of re-reading storage"""
+        chapter_id = question.get('chapter_id')
+        if self._questions_mtime is None or chapter_id in self._stale_chapters:
+            return  # The next read loads it from storage
+        
+        self._question_cache.setdefault(chapter_id, []).append(question)
+        if chapter_id in self._question_arrays:
+            self._append_question_arrays(self._question_arrays[chapter_id], question)
+        
+        # Our own write moved the mtime; adopt it so it doesn't force a reload
+        mtime = self.storage.get_mtime('questions')
+        self._cache_mtime[chapter_id] = mtime
+        self._questions_mtime = mtime
+    
+    def invalidate_question_cache(self, chapter_id: Optional[int] = None) -> None:
+        """Drop cached questions for a chapter (or all chapters)"""
+        if chapter_id is None:
+            self._questions_mtime = None
+            self._question_matrix.clear()
+        else:
+            self._stale_chapters.add(chapter_id)
+            self._cache_mtime.pop(chapter_id, None)
+            self._question_arrays.pop(chapter_id, None)
+            self._question_matrix.pop(chapter_id, None)
+    
+    def _load_query_embeddings(self) -> Dict[str, np.ndarray]:
+        """Load persisted retrieval-query embeddings for the current embedding model"""
+        if not self._query_embeddings_path.exists():
+            return {}
         
-        return questions
+        try:
+            data = np.load(self._query_embeddings_path)
+            if str(data['model']) != settings.EMBEDDING_MODEL:
+                return {}
+            return {str(q): emb for q, emb in zip(data['queries'], data['embeddings'].astype('float32'))}
+        except Exception as e:
+            logger.warning(f"Failed to load query embedding cache: {e}")
+            return {}
+    
+    def _save_query_embeddings(self, query_embeddings: Dict[str, np.ndarray]) -> None:
+        """Persist retrieval-query embeddings so they survive restarts"""
+        try:
+            np.savez(
+                self._query_embeddings_path,
+                model=np.array(settings.EMBEDDING_MODEL),
+                queries=np.array(list(query_embeddings.keys())),
+                # Half precision on disk halves the file; vectors are widened
+                # back to float32 on load
+                embeddings=np.array(list(query_embeddings.values()), dtype='float16')
+            )
+        except Exception as e:
+            logger.warning(f"Failed to save query embedding cache: {e}")
+    
+    async def _embed_query(self, query: str) -> np.ndarray:
+        """Embed a retrieval query, reusing the cached vector for repeated queries"""
+        if query in self._query_embeddings:
+            return self._query_embeddings[query]
+        
+        embedding = np.array(await self.embedding_manager.embed_text(query), dtype='float32')
+        self._query_embeddings[query] = embedding
+        
+        # Bound the cache - topic-avoidance suffixes make the query space open-ended
+        while len(self._query_embeddings) > 256:
+            del self._query_embeddings[next(iter(self._query_embeddings))]
+        
+        # Snapshot so the writer thread never sees the dict mutate
+        await asyncio.to_thread(self._save_query_embeddings, dict(self._query_embeddings))
+        return embedding
+    
+    def _question_vectors_path(self, chapter_id: int) -> Path:
+        return settings.CACHE_PATH / "question_embeddings" / f"chapter_{chapter_id}.npz"
+    
+    def _load_question_vectors(self, chapter_id: int) -> Dict[str, np.ndarray]:
+        """Load persisted question embeddings for a chapter (current embedding model only)"""
+        path = self._question_vectors_path(chapter_id)
+        if not path.exists():
+            return {}
+        
+        try:
+            data = np.load(path)
+            if str(data['model']) != settings.EMBEDDING_MODEL:
+                return {}
+            return {str(q): emb for q, emb in zip(data['questions'], data['embeddings'].astype('float32'))}
+        except Exception as e:
+            logger.warning(f"Failed to load question embeddings for chapter {chapter_id}: {e}")
+            return {}
+    
+    def _save_question_vectors(self, chapter_id: int, vectors: Dict[str, np.ndarray]) -> None:
+        """Persist a chapter's question embeddings so warm-up is a single np.load"""
+        path = self._question_vectors_path(chapter_id)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(
+                path,
+                model=np.array(settings.EMBEDDING_MODEL),
+                questions=np.array(list(vectors.keys())),
+                embeddings=np.array(list(vectors.values()), dtype='float16')  # float32 again on load
+            )
+        except Exception as e:
+            logger.warning(f"Failed to save question embeddings for chapter {chapter_id}: {e}")
+    
+    @staticmethod
+    def _unit_vector(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    async def _embed_questions(self, texts: List[str], chapter_id: int) -> None:
+        """Embed texts not yet known for the chapter, in one batched request"""
+        vectors = self._question_vectors[chapter_id]
+        missing = [t for t in dict.fromkeys(texts) if t and t not in vectors]
+        if missing:
+            embeddings = await self.embedding_manager.batch_embed(missing)
+            for text, embedding in zip(missing, embeddings):
+                vectors[text] = self._unit_vector(embedding)
+    
+    async def _get_question_matrix(
+        self, 
+        chapter_id: int, 
+        prefetch: List[str] = ()
+    ) -> np.ndarray:
+        """
+        (N, d) unit embeddings of the chapter's stored questions, rebuilt when questions change
+        
+        Texts in prefetch ride along with any backfill request so the caller's
+        own lookups afterwards don't need a second round-trip.
+        """
+        existing_texts = list(self._get_question_arrays(chapter_id)['texts'])
+        mtime = self._cache_mtime[chapter_id]
+        
+        cached = self._question_matrix.get(chapter_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        if chapter_id not in self._question_vectors:
+            self._question_vectors[chapter_id] = await asyncio.to_thread(
+                self._load_question_vectors, chapter_id
+            )
+        
+        # Questions saved before embeddings were stored are backfilled once
+        texts = [text for text in existing_texts if text]
+        if texts:
+            await self._embed_questions(texts + list(prefetch), chapter_id)
+        
+        vectors = self._question_vectors[chapter_id]
+        stored = {text: vectors[text] for text in texts}
+        matrix = np.vstack(list(stored.values())) if stored else np.empty((0, 0), dtype='float32')
+        self._question_matrix[chapter_id] = (mtime, matrix)
+        
+        await asyncio.to_thread(self._save_question_vectors, chapter_id, stored)
+        return matrix
+    
+    async def _check_semantic_uniqueness(
+        self, 
+        drafts: List[str], 
+        chapter_id: int
+    ) -> List[Tuple[bool, str]]:
+        """
+        Compare drafts to existing questions by embedding cosine similarity
+        
+        Catches paraphrases that text similarity misses. Failures fall back
+        to treating the drafts as unique, leaving the text checks in charge.
+        """
+        threshold = settings.SEMANTIC_DUPLICATE_THRESHOLD
+        
+        try:
+            matrix = await self._get_question_matrix(chapter_id, prefetch=drafts)
+            if not len(matrix):
+                return [(True, "Question is unique")] * len(drafts)
+            
+            await self._embed_questions(drafts, chapter_id)
+        except Exception as e:
+            logger.warning(f"Semantic uniqueness check skipped: {e}")
+            return [(True, "Question is unique")] * len(drafts)
+        
+        vectors = self._question_vectors[chapter_id]
+        results = []
+        for draft in drafts:
+            score = float((matrix @ vectors[draft]).max()) if draft in vectors else 0.0
+            if score > threshold:
+                results.append((False, f"Semantic similarity {score*100:.1f}% exceeds threshold ({threshold*100:.0f}%)"))
+            else:
+                results.append((True, "Question is unique"))
+        return results
+    
+    def _get_question_index(self, chapter_id: int) -> QuestionIndex:
+        """Get the chapter's near-duplicate index, synced with cached questions"""
+        questions = self._get_cached_questions(chapter_id)
+        
+        if chapter_id not in self._question_index:
+            self._question_index[chapter_id] = QuestionIndex()
+        
+        index = self._question_index[chapter_id]
+        index.sync(questions)
+        return index
     
     def _calculate_question_similarity(self, q1: str, q2: str) -> float:
         """Calculate similarity between two questions using SequenceMatcher"""
-        return difflib.SequenceMatcher(None, q1.lower(), q2.lower()).ratio()
+        q1, q2 = q1.casefold(), q2.casefold()
+        if q1 == q2:
+            return 1.0
+        if not q1 or not q2:
+            return 0.0
+        return difflib.SequenceMatcher(None, q1, q2, autojunk=False).ratio()
     
     def _extract_medical_terms(self, text: str) -> list[str]:
         """Extract key medical terms (capitalized words, >4 chars)"""
-        words = text.split()
-        return [w.lower() for w in words if len(w) > 4 and (w[0].isupper() or w.isupper())]
+        return [term.casefold() for term in MEDICAL_TERM_RE.findall(text)]
+    
+    def _question_terms(self, question: Dict[str, Any]) -> list[str]:
+        """Medical terms stored with a question (extracted for questions saved before that)"""
+        if 'medical_terms' in question:
+            return question['medical_terms']
+        return self._extract_medical_terms(question.get('question', ''))
     
     def _is_question_unique(
         self, 
@@ -68,57 +402,185 @@ class QuestionGeneratorNodes:
         Returns:
             (is_unique, reason)
         """
-        existing_questions = self._get_cached_questions(chapter_id)
-        
-        for existing_q in existing_questions:
-            existing_text = existing_q.get('question', '')
+        index = self._get_question_index(chapter_id)  # also refreshes the cached term sets
+        
+        # Text similarity check over the LSH candidates, most similar first.
+        # seq2 is pinned to the new question so difflib builds its b2j index
+        # once, and only true upper bounds on ratio() (length, then character
+        # multiset) dismiss candidates before ratio() runs
+        new_folded = new_question.casefold()  # index texts are casefolded the same way
+        new_len = len(new_folded)
+        matcher = difflib.SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(new_folded)
+        for existing_text in index.candidates(new_question):
+            if existing_text == new_folded:
+                return False, "Exact duplicate of an existing question"
+            
+            existing_len = len(existing_text)
+            if 2 * min(new_len, existing_len) / (new_len + existing_len) <= threshold:
+                continue
             
-            # Text similarity check
-            text_similarity = self._calculate_question_similarity(new_question, existing_text)
+            matcher.set_seq1(existing_text)
+            if matcher.quick_ratio() <= threshold:
+                continue
             
+            text_similarity = matcher.ratio()
             if text_similarity > threshold:
                 return False, f"Text similarity {text_similarity*100:.1f}% exceeds threshold ({threshold*100:.0f}%)"
-            
-            # Additional check: compare key medical terms
-            new_terms = set(self._extract_medical_terms(new_question))
-            existing_terms = set(self._extract_medical_terms(existing_text))
-            
-            if new_terms and existing_terms:
+        
+        # Additional check: compare key medical terms
+        new_terms = set(self._extract_medical_terms(new_question))
+        if not new_terms:
+            return True, "Question is unique"
+        
+        for existing_terms in self._question_arrays[chapter_id]['terms']:
+            if existing_terms:
                 term_overlap = len(new_terms & existing_terms) / len(new_terms | existing_terms)
                 if term_overlap > 0.7:  # 70% term overlap
                     return False, f"Medical term overlap {term_overlap*100:.1f}% too high"
         
         return True, "Question is unique"
     
-    def _extract_covered_topics(self, questions: list) -> list[str]:
-        """Extract main topics from existing questions"""
-        topics = []
-        for q in questions[-15:]:  # Last 15 questions
-            # Extract key medical terms
-            terms = self._extract_medical_terms(q.get('question', ''))
-            topics.extend(terms)
+    def _extract_covered_topics(self, arrays: Dict[str, Any]) -> list[str]:
+        """Extract main topics from the chapter's last 15 questions"""
+        # Counted once, then kept current by _append_question_arrays
+        if arrays['topics'] is None:
+            topics = Counter()
+            for terms in arrays['terms'][-15:]:
+                topics.update(terms)
+            arrays['topics'] = topics
         
         # Return most common topics
-        return [topic for topic, _ in Counter(topics).most_common(10)]
+        return [topic for topic, _ in arrays['topics'].most_common(10)]
+    
+    def _load_chunk_quality(self) -> Dict[str, deque]:
+        """Load chunk quality history into per-chunk ring buffers of the last 10 scores"""
+        quality_data = self.storage.load('chunk_quality') or {}
+        return {
+            chunk_id: deque(entry.get('scores', []), maxlen=10)
+            for chunk_id, entry in quality_data.items()
+        }
     
-    def _update_chunk_quality_scores(self, chunks: list, score: int):
-        """Track which chunks produce high-quality questions"""
+    def _update_chunk_quality_scores(self, chunks: list, score: int) -> bool:
+        """
+        Track which chunks produce high-quality questions
+        
+        Scores are kept in memory; returns True when enough updates have
+        accumulated that the caller should flush them to disk.
+        """
         try:
-            quality_data = self.storage.load('chunk_quality') or {}
+            if self._chunk_quality is None:
+                self._chunk_quality = self._load_chunk_quality()
             
             for chunk in chunks[:3]:
                 chunk_id = str(chunk['metadata']['chunk_index'])
-                if chunk_id not in quality_data:
-                    quality_data[chunk_id] = {'scores': [], 'avg': 0}
-                
-                quality_data[chunk_id]['scores'].append(score)
-                # Keep only last 10 scores
-                quality_data[chunk_id]['scores'] = quality_data[chunk_id]['scores'][-10:]
-                quality_data[chunk_id]['avg'] = sum(quality_data[chunk_id]['scores']) / len(quality_data[chunk_id]['scores'])
+                self._chunk_quality.setdefault(chunk_id, deque(maxlen=10)).append(score)
             
-            self.storage.save('chunk_quality', quality_data)
+            self._chunk_quality_pending += 1
+            return self._chunk_quality_pending >= settings.CHUNK_QUALITY_FLUSH_EVERY
         except Exception as e:
             logger.warning(f"Failed to update chunk quality: {e}")
+            return False
+    
+    def _flush_chunk_quality(self) -> None:
+        """Write pending chunk quality scores to storage in one save"""
+        if not self._chunk_quality_pending or self._chunk_quality is None:
+            return
+        
+        quality_data = {
+            chunk_id: {'scores': list(scores), 'avg': sum(scores) / len(scores)}
+            for chunk_id, scores in list(self._chunk_quality.items())
+        }
+        self._chunk_quality_pending = 0
+        
+        try:
+            self.storage.save('chunk_quality', quality_data)
+        except Exception as e:
+            logger.warning(f"Failed to save chunk quality: {e}")
+    
+    def _get_image_ids(self, chapter_id: int) -> List[int]:
+        """Get the chapter's image ids, cached until images.json changes"""
+        mtime = self.storage.get_mtime('images')
+        cached = self._image_ids_cache.get(chapter_id)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        
+        ids = [img['id'] for img in self.storage.filter('images', chapter_id=chapter_id) if 'id' in img]
+        self._image_ids_cache[chapter_id] = (mtime, ids)
+        return ids
+    
+    async def _select_images(self, state: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Pick up to 2 random images for the chapter (None if images not requested)"""
+        if not state.get('include_images', False):
+            return None
+        
+        ids = await asyncio.to_thread(self._get_image_ids, state['chapter_id'])
+        if not ids:
+            return []
+        
+        chosen = random.sample(ids, min(2, len(ids)))
+        return await asyncio.to_thread(self.storage.get_many, 'images', chosen)
+    
+    @staticmethod
+    def _weighted_sample(results: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+        """
+        Sample k results without replacement, weighted by similarity
+        
+        Efraimidis-Spirakis weighted reservoir: each result gets the key
+        -ln(u) / weight and the k smallest keys win, so closer chunks are
+        favoured while selection stays random. Scores are L2 distances,
+        turned into weights as 1 / (1 + distance).
+        """
+        return heapq.nsmallest(
+            k,
+            results,
+            key=lambda r: -math.log(1.0 - random.random()) * (1.0 + max(r['score'], 0.0))
+        )
+    
+    async def _search_chunks(
+        self, 
+        query: str, 
+        query_embedding: np.ndarray, 
+        k: int, 
+        chapter_id: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Vector search with results cached per (query, k, chapter)
+        
+        Search results are deterministic until the store changes, so batch
+        calls and repeat runs with the same query skip the search. Chunk
+        selection afterwards stays random, so drafts still vary.
+        """
+        key = (query, k, chapter_id)
+        cached = self._search_cache.get(key)
+        if cached is not None and cached[0] == self.vector_store.version:
+            self._search_cache.move_to_end(key)
+            return cached[1]
+        
+        results = await self.search_batcher.search(query_embedding, k=k, filter_chapter=chapter_id)
+        self._search_cache[key] = (self.vector_store.version, results)
+        while len(self._search_cache) > 128:
+            self._search_cache.popitem(last=False)
+        return results
+    
+    def _retrieval_query(self, existing: Dict[str, Any], difficulty: str) -> str:
+        """Retrieval query for a difficulty, steered away from already covered topics"""
+        base_query = RETRIEVAL_QUERIES.get(difficulty, RETRIEVAL_QUERIES['intermediate'])
+        
+        # Build smarter query that avoids covered topics
+        if existing['texts']:
+            covered_topics = self._extract_covered_topics(existing)
+            if covered_topics:
+                return f"{base_query}. Focus on areas different from: {', '.join(covered_topics[:5])}"
+        
+        return base_query
+    
+    async def prefetch_context(self, chapter_id: int, difficulty: str) -> None:
+        """Embed the retrieval query and run the search once, ahead of a concurrent batch"""
+        config = CONTEXT_CONFIG.get(difficulty, CONTEXT_CONFIG['advanced'])
+        query = self._retrieval_query(self._get_question_arrays(chapter_id), difficulty)
+        query_embedding = await self._embed_query(query)
+        await self._search_chunks(query, query_embedding, config['k'], chapter_id)
     
     async def retrieve_context(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -126,167 +588,244 @@ class QuestionGeneratorNodes:
         """
         logger.info(f"Retrieving context for chapter {state['chapter_id']}, difficulty: {state['difficulty']}")
         
-        # Difficulty-based configuration
-        context_config = {
-            "intermediate": {"k": 15, "chunks_to_use": 3},  # Simpler, fewer chunks
-            "advanced": {"k": 20, "chunks_to_use": 5},      # Standard
-            "complex": {"k": 25, "chunks_to_use": 7}        # More context for complex
-        }
-        
-        config = context_config.get(state['difficulty'], context_config['advanced'])
+        config = CONTEXT_CONFIG.get(state['difficulty'], CONTEXT_CONFIG['advanced'])
+        chunks_to_use = config['chunks_to_use']
         
         # Get existing questions with cache
-        existing_questions = self._get_cached_questions(state['chapter_id'])
+        existing = self._get_question_arrays(state['chapter_id'])
         
-        # Analyze what topics have been covered
-        covered_topics = self._extract_covered_topics(existing_questions)
+        query = self._retrieval_query(existing, state['difficulty'])
         
-        # Build smarter query that avoids covered topics
-        query_map = {
-            "intermediate": f"fundamental concepts, definitions, basic mechanisms in medical textbook",
-            "advanced": f"clinical applications, pathophysiology, diagnostic approach in medical context",
-            "complex": f"complex cases, differential diagnosis, complications, multi-system integration"
-        }
+        # Embed the query and pick images concurrently - both are independent I/O
+        query_embedding, selected_images = await asyncio.gather(
+            self._embed_query(query),
+            self._select_images(state)
+        )
         
-        base_query = query_map.get(state['difficulty'], query_map['intermediate'])
+        # Search vector store with expanded retrieval - concurrent generations
+        # are coalesced into one batched search in a worker thread
+        results = await self._search_chunks(query, query_embedding, config['k'], state['chapter_id'])
         
-        # Add topic avoidance if we have covered topics
-        if covered_topics:
-            query = f"{base_query}. Focus on areas different from: {', '.join(covered_topics[:5])}"
+        if not existing['texts']:
+            # First questions - randomize for variety, leaning towards the best matches
+            selected_results = self._weighted_sample(results, chunks_to_use)
         else:
-            query = base_query
-        
-        # Get embedding
-        query_embedding = await self.embedding_manager.embed_text(query)
-        
-        # Search vector store with expanded retrieval
-        results = self.vector_store.search(
-            query_embedding,
-            k=config['k'],
-            filter_chapter=state['chapter_id']
-        )
-        
-        # Smart chunk selection with uniqueness and quality
-        if existing_questions:
-            used_chunk_indices = set()
-            # Check last 20 questions instead of 5 for better diversity
-            for q in existing_questions[-20:]:
-                used_chunk_indices.update(q.get('source_chunks', []))
+            # Smart chunk selection: prefer chunks not used by the last 20 questions
+            used_chunk_indices = self._recent_chunk_indices(existing)
             
-            # Separate unused and used chunks
-            unused_results = [r for r in results if r['metadata'].get('chunk_index') not in used_chunk_indices]
-            used_results = [r for r in results if r['metadata'].get('chunk_index') in used_chunk_indices]
+            # Separate unused and used chunks in one pass
+            unused_results, used_results = [], []
+            for r in results:
+                if r['metadata'].get('chunk_index') in used_chunk_indices:
+                    used_results.append(r)
+                else:
+                    unused_results.append(r)
             
-            # Prioritize unused chunks with randomization
-            if len(unused_results) >= config['chunks_to_use']:
-                random.shuffle(unused_results)
-                selected_results = unused_results[:config['chunks_to_use']]
-            else:
-                # Mix unused and high-quality used chunks
-                random.shuffle(unused_results)
-                random.shuffle(used_results)
-                combined = unused_results + used_results
-                selected_results = combined[:config['chunks_to_use']]
-        else:
-            # First questions - just randomize for variety
-            random.shuffle(results)
-            selected_results = results[:config['chunks_to_use']]
+            # Prioritize unused chunks with randomization, topping up with used ones
+            selected_results = self._weighted_sample(unused_results, chunks_to_use)
+            if len(selected_results) < chunks_to_use:
+                selected_results += self._weighted_sample(
+                    used_results, chunks_to_use - len(selected_results)
+                )
         
         state['retrieved_chunks'] = selected_results
         
-        # Retrieve images if requested
-        if state.get('include_images', False):
-            images = self.storage.filter('images', chapter_id=state['chapter_id'])
-            if images:
-                selected_images = random.sample(images, min(2, len(images)))
-                state['retrieved_images'] = selected_images
-            else:
-                state['retrieved_images'] = []
+        # Prompt context only depends on the retrieved chunks, so build it
+        # once here rather than on every generation/validation attempt
+        state['context_text'] = "\n\n".join(
+            f"[Source {i+1} - Page {chunk['metadata']['page_number']}]\n{chunk['metadata']['text_600']}"
+            for i, chunk in enumerate(selected_results)
+        )
+        state['source_context'] = "\n".join(
+            chunk['metadata']['text_300'] for chunk in selected_results[:2]
+        )
+        state['generation_prompt'] = ''  # Rendered from the new context on first use
+        
+        if selected_images is not None:
+            state['retrieved_images'] = selected_images
         
         logger.info(f"Retrieved {len(selected_results)} chunks and {len(state.get('retrieved_images', []))} images")
         
         return state
     
-    async def generate_question(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Node 2: Generate question using GPT-4o with enhanced context
+    async def _generate_candidates(
+        self,
+        state: Dict[str, Any]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Tuple[bool, str]]]:
         """
-        logger.info("Generating question")
-        
-        # Prepare context with appropriate amount based on difficulty
-        chunks_to_use = len(state['retrieved_chunks'])
-        context_text = "\n\n".join([
-            f"[Source {i+1} - Page {chunk['metadata']['page_number']}]\n{chunk['metadata']['text'][:600]}"
-            for i, chunk in enumerate(state['retrieved_chunks'])
-        ])
+        Request settings.QUESTION_CANDIDATES question drafts in one streamed chat completion
         
-        # Analyze image if present
-        image_context = ""
-        if state.get('retrieved_images'):
+        Returns:
+            (candidates, uniqueness results keyed by question text); candidates
+            is empty when the stream was aborted because every draft was a duplicate
+        """
+        # The prompt includes the image analysis, so it is awaited first.
+        # Reuse the analysis from a previous attempt when regenerating - the
+        # image and its surrounding text don't change.
+        if state.get('retrieved_images') and not state.get('image_analysis'):
             image = state['retrieved_images'][0]
             
-            surrounding_text = next(
-                (chunk['metadata']['text'] for chunk in state['retrieved_chunks']
-                 if chunk['metadata']['page_number'] == image['page_number']),
-                ""
-            )
+            # First retrieved chunk per page, built once
+            page_to_text = {}
+            for chunk in state['retrieved_chunks']:
+                page_to_text.setdefault(chunk['metadata']['page_number'], chunk['metadata']['text'])
+            surrounding_text = page_to_text.get(image['page_number'], "")
             
-            analysis = await self.image_processor.analyze_image(
+            state['image_analysis'] = await self.image_processor.analyze_image(
                 image['path'],
                 surrounding_text[:500]
             )
-            image_context = analysis['analysis']
-            state['image_analysis'] = analysis
-        
-        # Generate prompt
-        prompt = get_generation_prompt(
-            state['difficulty'],
-            context_text,
-            image_context
-        )
         
-        try:
-            response = await self.client.chat.completions.create(
+        # The context, difficulty and image analysis are fixed for the run, so
+        # the prompt is rendered once and regeneration attempts resend the
+        # identical string (which also keeps it eligible for prompt caching)
+        prompt = state.get('generation_prompt')
+        if not prompt:
+            image_context = (state.get('image_analysis') or {}).get('analysis', "")
+            prompt = get_generation_prompt(
+                state['difficulty'],
+                state['context_text'],
+                image_context
+            )
+            state['generation_prompt'] = prompt
+        
+        # n candidates share one prompt encoding and one round-trip; the
+        # semaphore is held until the stream is drained
+        async with self._llm_semaphore:
+            stream = await self.client.chat.completions.create(
                 model=settings.LLM_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a medical education expert creating unique, high-quality exam questions. Focus on creating diverse questions that test different aspects of the material."},
                     {"role": "user", "content": prompt}
                 ],
                 response_format={"type": "json_object"},
-                temperature=settings.TEMPERATURE
+                temperature=settings.TEMPERATURE,
+                n=settings.QUESTION_CANDIDATES,
+                stream=True
             )
             
-            question_draft = json.loads(response.choices[0].message.content)
+            # Run the uniqueness check as soon as each candidate's "question"
+            # field has streamed in, while the explanation is still generating
+            parts: Dict[int, List[str]] = {}
+            prechecked: Dict[str, Tuple[bool, str]] = {}
+            checked = set()  # choice indices whose question was already checked
+            async for chunk in stream:
+                for choice in chunk.choices:
+                    if not choice.delta.content:
+                        continue
+                    
+                    parts.setdefault(choice.index, []).append(choice.delta.content)
+                    if choice.index in checked:
+                        continue
+                    
+                    match = QUESTION_FIELD_RE.search(''.join(parts[choice.index]))
+                    if match:
+                        checked.add(choice.index)
+                        question_text = orjson.loads(f'"{match.group(1)}"')
+                        prechecked[question_text] = self._is_question_unique(
+                            question_text, state['chapter_id']
+                        )
+                        
+                        # Every draft's stem duplicates an existing question -
+                        # stop paying for explanations that would be discarded
+                        if (len(checked) == settings.QUESTION_CANDIDATES and
+                                not any(is_unique for is_unique, _ in prechecked.values())):
+                            await stream.close()
+                            logger.info("All drafts duplicate existing questions, stream aborted")
+                            return [], prechecked
+        
+        candidates = []
+        for idx in sorted(parts):
+            try:
+                candidates.append(orjson.loads(''.join(parts[idx])))
+            except orjson.JSONDecodeError as e:
+                logger.warning(f"Skipping unparseable candidate: {e}")
+        
+        if not candidates:
+            raise ValueError("No parseable question candidates returned")
+        
+        return candidates, prechecked
+    
+    async def generate_question(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Node 2: Generate question using GPT-4o with enhanced context
+        
+        Drafts left over from a previous multi-candidate request are used
+        on regeneration before making another API call.
+        """
+        logger.info("Generating question")
+        
+        try:
+            candidates = state.get('question_candidates') or []
+            prechecked = {}
+            if not candidates:
+                candidates, prechecked = await self._generate_candidates(state)
             
-            # Check uniqueness with enhanced method
-            is_unique, reason = self._is_question_unique(
-                question_draft['question'],
-                state['chapter_id']
-            )
+            if not candidates:
+                # Stream cut short on duplicates - fail this attempt without a draft
+                _, reason = next(iter(prechecked.values()))
+                state['uniqueness_check'] = {'is_unique': False, 'reason': reason}
+                state['question_candidates'] = []
+                state['generation_attempt'] = state.get('generation_attempt', 0) + 1
+                logger.warning(f"Question not unique: {reason}")
+                return state
+            
+            # Text checks first, then one embedding request covers every
+            # draft that passed them
+            checks = [
+                prechecked.get(candidate['question']) or self._is_question_unique(
+                    candidate['question'],
+                    state['chapter_id']
+                )
+                for candidate in candidates
+            ]
+            text_unique = [i for i, (is_unique, _) in enumerate(checks) if is_unique]
+            if text_unique:
+                semantic_checks = await self._check_semantic_uniqueness(
+                    [candidates[i]['question'] for i in text_unique],
+                    state['chapter_id']
+                )
+                for i, check in zip(text_unique, semantic_checks):
+                    checks[i] = check
             
-            if not is_unique:
+            # Take the first candidate that passes the uniqueness checks
+            question_draft = None
+            for i, (is_unique, reason) in enumerate(checks):
+                if is_unique:
+                    question_draft = candidates[i]
+                    state['question_candidates'] = candidates[i + 1:]
+                    break
+            
+            if question_draft is None:
+                # None unique - fail this attempt so the next one requests fresh drafts
+                question_draft = candidates[0]
+                is_unique, reason = checks[0]
+                state['question_candidates'] = []
                 logger.warning(f"Question not unique: {reason}")
-                state['uniqueness_check'] = {
-                    'is_unique': False,
-                    'reason': reason
-                }
-            else:
-                state['uniqueness_check'] = {
-                    'is_unique': True,
-                    'reason': reason
-                }
+            
+            state['uniqueness_check'] = {
+                'is_unique': is_unique,
+                'reason': reason
+            }
             
             # Format explanation properly
             if isinstance(question_draft.get('explanation'), dict):
                 exp = question_draft['explanation']
-                correct_option = question_draft['options'][question_draft['correct_answer']]
+                options = question_draft['options']
+                correct = question_draft['correct_answer']
+                correct_option = options[correct]
+                distractor_lines = "\n".join([
+                    f"- Option {k} ({options[k]}): {v}"
+                    for k, v in exp.get('distractor_analysis', {}).items()
+                    if k != correct
+                ])
                 
                 formatted_explanation = f"""
 **Why "{correct_option}" is the correct answer:**
 {exp.get('correct_reasoning', '')}
 
 **Analysis of Other Options:**
-{chr(10).join([f"- Option {k} ({question_draft['options'][k]}): {v}" for k, v in exp.get('distractor_analysis', {}).items() if k != question_draft['correct_answer']])}
+{distractor_lines}
 
 **Clinical Context:**
 {exp.get('clinical_context', '')}
@@ -328,6 +867,63 @@ class QuestionGeneratorNodes:
         
         return state
     
+    async def _request_validation(self, prompt: str) -> str:
+        """
+        Run the validation completion, sharing identical prompts
+        
+        Concurrent callers with the same prompt await one in-flight request,
+        and recent responses are reused for settings.LLM_RESPONSE_CACHE_TTL
+        seconds. Generation is deliberately not coalesced - identical
+        prompts there must still yield distinct questions.
+        """
+        key = hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+        
+        cached = self._validation_responses.get(key)
+        if cached and time.monotonic() - cached[0] < settings.LLM_RESPONSE_CACHE_TTL:
+            return cached[1]
+        
+        if key in self._validation_inflight:
+            return await asyncio.shield(self._validation_inflight[key])
+        
+        future = asyncio.get_running_loop().create_future()
+        self._validation_inflight[key] = future
+        try:
+            async with self._llm_semaphore:
+                response = await self.client.chat.completions.create(
+                    model=settings.VALIDATION_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    response_format={"type": "json_object"},
+                    temperature=0.3
+                )
+            content = response.choices[0].message.content
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved - there may be no other waiters
+            raise
+        finally:
+            del self._validation_inflight[key]
+        
+        future.set_result(content)
+        self._validation_responses[key] = (time.monotonic(), content)
+        while len(self._validation_responses) > 256:
+            self._validation_responses.popitem(last=False)
+        return content
+    
+    @staticmethod
+    def _draft_key(question_draft: Dict[str, Any], source_context: str) -> str:
+        """Hash of what a verdict depends on: stem, options, answer and source"""
+        payload = orjson.dumps(
+            [
+                " ".join(question_draft.get('question', '').casefold().split()),
+                question_draft.get('options'),
+                question_draft.get('correct_answer'),
+                source_context
+            ],
+            option=orjson.OPT_SORT_KEYS,
+            default=str
+        )
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+    
     async def validate_accuracy(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
         Node 3: Validate medical accuracy, quality, and uniqueness
@@ -347,26 +943,26 @@ class QuestionGeneratorNodes:
             }
             return state
         
-        # Prepare source context
-        source_context = "\n".join([
-            chunk['metadata']['text'][:300]
-            for chunk in state['retrieved_chunks'][:2]
-        ])
+        # A regenerated draft often repeats an already-judged question with only
+        # the explanation reworded; reuse its verdict instead of re-validating
+        draft_key = self._draft_key(question_draft, state['source_context'])
+        cached = self._validation_verdicts.get(draft_key)
+        if cached and time.monotonic() - cached[0] < settings.LLM_RESPONSE_CACHE_TTL:
+            logger.info("Reusing validation verdict for an already-judged draft")
+            state['validation_result'] = dict(cached[1])
+            return state
         
         # Validation prompt
-        prompt = get_validation_prompt(question_draft, source_context)
+        prompt = get_validation_prompt(question_draft, state['source_context'])
         
         try:
-            response = await self.client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                response_format={"type": "json_object"},
-                temperature=0.3
-            )
-            
-            validation = json.loads(response.choices[0].message.content)
+            validation = orjson.loads(await self._request_validation(prompt))
             state['validation_result'] = validation
             
+            self._validation_verdicts[draft_key] = (time.monotonic(), validation)
+            while len(self._validation_verdicts) > 256:
+                self._validation_verdicts.popitem(last=False)
+            
             logger.info(f"Validation complete: valid={validation['is_valid']}, confidence={validation['confidence_score']}")
             
         except Exception as e:
@@ -388,6 +984,9 @@ class QuestionGeneratorNodes:
         
         question = state['question_draft']
         
+        # Store medical terms so uniqueness checks don't re-extract them
+        question['medical_terms'] = self._extract_medical_terms(question['question'])
+        
         # Add source chunk metadata
         question['source_chunks'] = [
             chunk['metadata']['chunk_index'] 
@@ -400,10 +999,8 @@ class QuestionGeneratorNodes:
             question['confidence_score'] = confidence
             
             # Update chunk quality scores for future prioritization
-            self._update_chunk_quality_scores(
-                state['retrieved_chunks'],
-                confidence
-            )
+            if self._update_chunk_quality_scores(state['retrieved_chunks'], confidence):
+                await asyncio.to_thread(self._flush_chunk_quality)
         
         state['final_question'] = question
         
@@ -1,5 +1,5 @@
 # core/agents/prompts.py
-from typing import Dict
+from typing import Dict, Tuple
 
 DIFFICULTY_DESCRIPTIONS = {
     "intermediate": """
@@ -26,8 +26,8 @@ DIFFICULTY_DESCRIPTIONS = {
     """
 }
 
-def get_generation_prompt(difficulty: str, context: str, image_context: str = "") -> str:
-    """Generate the main question generation prompt with context-aware application templates"""
+def _render_generation_prompt(difficulty: str, context: str, image_section: str) -> str:
+    """Render the full generation prompt (used once per difficulty to build the templates below)"""
     
     # Base instruction varies by difficulty
     if difficulty == "intermediate":
@@ -82,7 +82,7 @@ Step 1: **Analyze the content context** to determine the appropriate scenario ty
 **Source Material**:
 {context}
 
-{f"**Medical Image Context**:\n{image_context}\n" if image_context else ""}
+{image_section}
 
 {question_format_instruction}
 
@@ -178,6 +178,45 @@ For each reference, provide:
 
 Now analyze the provided context and generate an appropriate question:"""
 
+# Everything except the source context and image section is fixed per
+# difficulty, so render it once at import and split around those two slots
+_CONTEXT_SLOT = "\x00context\x00"
+_IMAGE_SLOT = "\x00image\x00"
+_GENERATION_TEMPLATES: Dict[str, Tuple[str, str, str]] = {}
+for _difficulty in DIFFICULTY_DESCRIPTIONS:
+    _prefix, _rest = _render_generation_prompt(_difficulty, _CONTEXT_SLOT, _IMAGE_SLOT).split(_CONTEXT_SLOT)
+    _middle, _suffix = _rest.split(_IMAGE_SLOT)
+    _GENERATION_TEMPLATES[_difficulty] = (_prefix, _middle, _suffix)
+
+def get_generation_prompt(difficulty: str, context: str, image_context: str = "") -> str:
+    """Generate the main question generation prompt with context-aware application templates"""
+    prefix, middle, suffix = _GENERATION_TEMPLATES[difficulty]
+    image_section = f"**Medical Image Context**:\n{image_context}\n" if image_context else ""
+    return "".join((prefix, context, middle, image_section, suffix))
+
+_VALIDATION_CRITERIA = """**Validation Criteria**:
+1. Factual Accuracy: Does the question align with source material?
+2. Medical Correctness: Is the medical information accurate?
+3. Answer Clarity: Is there definitively ONE correct answer?
+4. Distractor Quality: Are wrong options plausible but clearly incorrect?
+5. Explanation Completeness: Does it explain correct AND incorrect options?
+6. Reference Quality: Are references specific and verifiable?
+7. **Application Quality** (if case-based): Is the scenario realistic and based on source content?
+
+**Response Format** (JSON):
+{
+    "is_valid": true/false,
+    "confidence_score": 0-100,
+    "issues": ["List specific problems if any"],
+    "suggestions": ["Improvements if needed"],
+    "medical_accuracy": true/false,
+    "clarity_score": 0-100,
+    "explanation_quality_score": 0-100,
+    "application_quality_score": 0-100
+}
+
+Provide your validation:"""
+
 def get_validation_prompt(question_data: Dict, source_context: str) -> str:
     """Generate the validation prompt with application-based criteria"""
     
@@ -191,7 +230,7 @@ Distractor Analysis: {explanation.get('distractor_analysis', 'N/A')}
 Clinical Context: {explanation.get('clinical_context', 'N/A')}
 """
     
-    return f"""You are a medical fact-checker reviewing an MCQ for accuracy and quality.
+    return "".join((f"""You are a medical fact-checker reviewing an MCQ for accuracy and quality.
 
 **Question to Review**:
 Question: {question_data['question']}
@@ -203,25 +242,4 @@ Question Type: {question_data.get('question_type', 'N/A')}
 **Source Context**:
 {source_context}
 
-**Validation Criteria**:
-1. Factual Accuracy: Does the question align with source material?
-2. Medical Correctness: Is the medical information accurate?
-3. Answer Clarity: Is there definitively ONE correct answer?
-4. Distractor Quality: Are wrong options plausible but clearly incorrect?
-5. Explanation Completeness: Does it explain correct AND incorrect options?
-6. Reference Quality: Are references specific and verifiable?
-7. **Application Quality** (if case-based): Is the scenario realistic and based on source content?
-
-**Response Format** (JSON):
-{{
-    "is_valid": true/false,
-    "confidence_score": 0-100,
-    "issues": ["List specific problems if any"],
-    "suggestions": ["Improvements if needed"],
-    "medical_accuracy": true/false,
-    "clarity_score": 0-100,
-    "explanation_quality_score": 0-100,
-    "application_quality_score": 0-100
-}}
-
-Provide your validation:"""
\ No newline at end of file
+""", _VALIDATION_CRITERIA))
\ No newline at end of file
@@ -1,7 +1,8 @@
 # core/agents/question_generator.py
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Optional, Dict, Any
+from typing import TypedDict, AsyncIterator, List, Optional, Dict, Any
 from .nodes import QuestionGeneratorNodes
+from storage.vector_store import LocalVectorStore
 from config import settings
 from utils.logger import setup_logger
 import asyncio
@@ -15,8 +16,12 @@ class QuestionState(TypedDict):
     include_images: bool
     retrieved_chunks: List[Dict[str, Any]]
     retrieved_images: List[Dict[str, Any]]
+    context_text: str
+    source_context: str
+    generation_prompt: str
     image_analysis: Optional[Dict[str, Any]]
     question_draft: Optional[Dict[str, Any]]
+    question_candidates: List[Dict[str, Any]]
     validation_result: Optional[Dict[str, Any]]
     final_question: Optional[Dict[str, Any]]
     generation_attempt: int
@@ -26,8 +31,8 @@ class QuestionState(TypedDict):
 class QuestionGeneratorAgent:
     """LangGraph-based agent for question generation with validation"""
     
-    def __init__(self):
-        self.nodes = QuestionGeneratorNodes()
+    def __init__(self, vector_store: Optional[LocalVectorStore] = None):
+        self.nodes = QuestionGeneratorNodes(vector_store)
         self.graph = self._build_graph()
         
     def _build_graph(self) -> StateGraph:
@@ -120,8 +125,12 @@ class QuestionGeneratorAgent:
             'include_images': include_images,
             'retrieved_chunks': [],
             'retrieved_images': [],
+            'context_text': '',
+            'source_context': '',
+            'generation_prompt': '',
             'image_analysis': None,
             'question_draft': None,
+            'question_candidates': [],
             'validation_result': None,
             'final_question': None,
             'generation_attempt': 0,
@@ -154,9 +163,9 @@ class QuestionGeneratorAgent:
         difficulty: str = "intermediate",
         include_images: bool = False,
         max_concurrent: int = 3
-    ) -> List[Dict[str, Any]]:
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        Generate multiple questions concurrently in batches
+        Generate multiple questions concurrently, at most max_concurrent at a time
         
         Args:
             chapter_id: ID of the chapter
@@ -165,38 +174,45 @@ class QuestionGeneratorAgent:
             include_images: Whether to include image-based questions
             max_concurrent: Number of questions to generate simultaneously
             
-        Returns:
-            List of generated questions
+        Yields:
+            Each generated question as soon as it completes (failures are skipped)
         """
-        questions = []
-        
         logger.info(f"Starting batch generation: {count} questions, {max_concurrent} concurrent")
         
-        # Process in batches of max_concurrent
-        for i in range(0, count, max_concurrent):
-            batch_size = min(max_concurrent, count - i)
-            
-            logger.info(f"Generating batch {i//max_concurrent + 1}: {batch_size} questions")
-            
-            # Create tasks for this batch
-            tasks = [
-                self.generate_single_question(chapter_id, difficulty, include_images)
-                for _ in range(batch_size)
-            ]
-            
-            # Run concurrently
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Filter out failures and exceptions
-            valid_questions = [
-                q for q in batch_results 
-                if isinstance(q, dict) and q is not None
-            ]
-            
-            questions.extend(valid_questions)
-            
-            logger.info(f"Batch complete: {len(valid_questions)}/{batch_size} successful")
+        # Every task in the batch searches with the same query - run it once
+        # up front so their retrieve_context steps hit the warm caches and only
+        # the per-question chunk sampling differs
+        try:
+            await self.nodes.prefetch_context(chapter_id, difficulty)
+        except Exception as e:
+            logger.warning(f"Context prefetch failed, tasks will retrieve individually: {e}")
+        
+        # One task per question, with the semaphore bounding how many run at
+        # once - a slow question no longer holds back the next group
+        semaphore = asyncio.Semaphore(max_concurrent)
         
-        logger.info(f"Batch generation complete: {len(questions)}/{count} questions generated")
+        async def generate_one() -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                return await self.generate_single_question(chapter_id, difficulty, include_images)
         
-        return questions
\ No newline at end of file
+        tasks = [asyncio.create_task(generate_one()) for _ in range(count)]
+        generated = 0
+        try:
+            # Hand each question out as it finishes so callers can persist and
+            # display it while the rest are still generating
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    question = await next_done
+                except Exception as e:
+                    logger.error(f"Question task failed: {e}")
+                    continue
+                
+                if isinstance(question, dict):
+                    generated += 1
+                    yield question
+        finally:
+            # Caller stopped early - don't leave generations running
+            for task in tasks:
+                task.cancel()
+        
+        logger.info(f"Batch generation complete: {generated}/{count} questions generated")
\ No newline at end of file
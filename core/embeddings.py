@@ -1,8 +1,12 @@
 # core/embeddings.py
-from openai import AsyncOpenAI
-from typing import List
+from typing import List, Optional
+from collections import OrderedDict
 import asyncio
+import hashlib
+import numpy as np
 from config import settings
+from core.openai_client import get_openai_client
+from storage.embedding_cache import EmbeddingCache
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -11,41 +15,133 @@ class EmbeddingManager:
     """Manage OpenAI embeddings"""
     
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = get_openai_client()
         self.model = settings.EMBEDDING_MODEL
         self.batch_size = settings.EMBEDDING_BATCH_SIZE
+        
+        # Exact-match caches keyed by a hash of (model, text): a bounded
+        # in-memory LRU in front of a persistent SQLite store
+        self._cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._disk_cache = EmbeddingCache(settings.CACHE_PATH / "embedding_cache.db")
+    
+    def _cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode('utf-8')).hexdigest()
+    
+    def _remember(self, key: str, embedding: np.ndarray) -> None:
+        self._cache[key] = embedding
+        self._cache.move_to_end(key)
+        while len(self._cache) > settings.EMBEDDING_CACHE_SIZE:
+            self._cache.popitem(last=False)
+    
+    async def _cached(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached embeddings for keys (None where missing), memory first then disk"""
+        found = [self._cache.get(key) for key in keys]
+        
+        disk_keys = [key for key, embedding in zip(keys, found) if embedding is None]
+        if disk_keys:
+            on_disk = await asyncio.to_thread(self._disk_cache.get_many, disk_keys)
+            for i, key in enumerate(keys):
+                if found[i] is None and key in on_disk:
+                    found[i] = on_disk[key]
+                    self._remember(key, on_disk[key])
+        
+        return found
     
     async def embed_text(self, text: str) -> List[float]:
         """Embed single text"""
+        key = self._cache_key(text)
+        cached = (await self._cached([key]))[0]
+        if cached is not None:
+            return cached.tolist()
+        
         try:
             response = await self.client.embeddings.create(
                 input=text,
                 model=self.model
             )
-            return response.data[0].embedding
         except Exception as e:
             logger.error(f"Error embedding text: {e}")
             raise
+        
+        embedding = response.data[0].embedding
+        vector = np.asarray(embedding, dtype='float32')
+        self._remember(key, vector)
+        await asyncio.to_thread(self._disk_cache.put_many, {key: vector})
+        return embedding
     
-    async def batch_embed(self, texts: List[str]) -> List[List[float]]:
-        """Embed multiple texts in batches"""
-        all_embeddings = []
+    async def batch_embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed multiple texts in batches, several batches in flight at once
+        
+        Returns:
+            (len(texts), dimension) float32 array, one row per text
+        """
+        keys = [self._cache_key(text) for text in texts]
+        embeddings = await self._cached(keys)
         
-        for i in range(0, len(texts), self.batch_size):
-            batch = texts[i:i + self.batch_size]
+        # Only cache misses go to the API, each distinct text once
+        # (repeated headers and captions would otherwise be embedded per copy)
+        misses = {}
+        for key, text, embedding in zip(keys, texts, embeddings):
+            if embedding is None:
+                misses.setdefault(key, text)
+        
+        missing = sum(embedding is None for embedding in embeddings)
+        if len(misses) < len(texts):
+            logger.info(
+                f"Embedding {len(misses)} unique texts for {len(texts)} inputs "
+                f"({len(texts) - missing} cached, {missing - len(misses)} duplicates)"
+            )
+        
+        miss_keys = list(misses)
+        miss_texts = list(misses.values())
+        batches = [miss_texts[i:i + self.batch_size] for i in range(0, len(miss_texts), self.batch_size)]
+        semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+        
+        async def embed_batch(batch_num: int, batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                try:
+                    response = await self.client.embeddings.create(
+                        input=batch,
+                        model=self.model
+                    )
+                except Exception as e:
+                    logger.error(f"Error in batch {batch_num}: {e}")
+                    raise
             
-            try:
-                response = await self.client.embeddings.create(
-                    input=batch,
-                    model=self.model
-                )
-                embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(embeddings)
-                
-                logger.info(f"Embedded batch {i//self.batch_size + 1}/{(len(texts)-1)//self.batch_size + 1}")
-                
-            except Exception as e:
-                logger.error(f"Error in batch {i//self.batch_size}: {e}")
-                raise
-        
-        return all_embeddings
\ No newline at end of file
+            logger.info(f"Embedded batch {batch_num + 1}/{len(batches)}")
+            return [item.embedding for item in response.data]
+        
+        # gather preserves batch order, so results line up with miss_keys.
+        # Failures don't cancel sibling batches: whatever succeeded is cached
+        # before re-raising, so a retry only pays for the failed batches.
+        results = await asyncio.gather(
+            *[embed_batch(n, batch) for n, batch in enumerate(batches)],
+            return_exceptions=True
+        )
+        
+        new_embeddings = {}
+        for n, batch_embeddings in enumerate(results):
+            if isinstance(batch_embeddings, BaseException):
+                continue
+            batch_keys = miss_keys[n * self.batch_size:(n + 1) * self.batch_size]
+            for key, embedding in zip(batch_keys, batch_embeddings):
+                vector = np.asarray(embedding, dtype='float32')
+                new_embeddings[key] = vector
+                self._remember(key, vector)
+        
+        if new_embeddings:
+            await asyncio.to_thread(self._disk_cache.put_many, new_embeddings)
+        
+        for batch_embeddings in results:
+            if isinstance(batch_embeddings, BaseException):
+                raise batch_embeddings
+        
+        # Scatter back to every input position, duplicates included, as one
+        # float32 matrix the vector store can take without converting lists
+        if not keys:
+            return np.empty((0, 0), dtype='float32')
+        return np.stack([
+            embedding if embedding is not None else new_embeddings[key]
+            for key, embedding in zip(keys, embeddings)
+        ])
@@ -1,18 +1,81 @@
 # core/image_processor.py
-from openai import AsyncOpenAI
-import base64
+import asyncio
+import hashlib
+import mmap
+import orjson
+import pybase64
 from pathlib import Path
-from typing import Dict
+from typing import BinaryIO, Dict, Optional
+from PIL import Image
 from config import settings
+from core.openai_client import get_openai_client
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Images no larger than this on both sides go out at detail="low"
+# (a flat 85 tokens); "high" tiles them at 765+ tokens for no extra detail
+LOW_DETAIL_MAX_SIDE = 512
+
+# Fixed instructions go first, in the system turn, so every request shares an
+# identical prefix the provider can serve from its prompt cache; only the
+# context text and the image vary, and they come last
+IMAGE_ANALYSIS_RUBRIC = """Analyze the medical image the user provides in detail, using the textbook context given with it.
+
+Provide a comprehensive analysis including:
+1. **Anatomical Structures**: Identify all visible anatomical structures
+2. **Pathological Findings**: Note any abnormalities or pathology
+3. **Clinical Significance**: Explain the diagnostic or educational value
+4. **Key Features**: Highlight important features for learning
+5. **Labels/Annotations**: Describe any visible labels or markings
+
+Be precise and use medical terminology appropriate for exam preparation."""
+
 class ImageProcessor:
     """Process and analyze medical images using GPT-4V"""
     
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = get_openai_client()
+        
+        # Analyses keyed by hash of (model, image bytes, context), kept on disk
+        # so re-analysing the same figure is free across restarts
+        self.cache_path = settings.CACHE_PATH / "image_analysis"
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self._analysis_cache: Dict[str, Dict[str, str]] = {}
+    
+    def _cache_key(self, image_bytes: mmap.mmap, context: str) -> str:
+        h = hashlib.sha256()
+        h.update(settings.LLM_MODEL.encode('utf-8') + b"\0")
+        h.update(image_bytes)
+        h.update(b"\0" + context.encode('utf-8'))
+        return h.hexdigest()
+    
+    def _load_cached(self, key: str) -> Optional[Dict[str, str]]:
+        path = self.cache_path / f"{key}.json"
+        if not path.exists():
+            return None
+        try:
+            return orjson.loads(path.read_bytes())
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable image analysis cache {path.name}: {e}")
+            return None
+    
+    def _save_cached(self, key: str, result: Dict[str, str]) -> None:
+        try:
+            (self.cache_path / f"{key}.json").write_bytes(orjson.dumps(result))
+        except OSError as e:
+            logger.warning(f"Could not cache image analysis: {e}")
+    
+    @staticmethod
+    def _detail_for(image_file: BinaryIO) -> str:
+        """Pick the vision detail level from the image dimensions (header only)"""
+        try:
+            image_file.seek(0)
+            with Image.open(image_file) as img:
+                width, height = img.size
+        except Exception:
+            return "high"
+        return "low" if max(width, height) <= LOW_DETAIL_MAX_SIDE else "high"
     
     async def analyze_image(
         self, 
@@ -29,40 +92,44 @@ class ImageProcessor:
         Returns:
             Dictionary with analysis results
         """
-        logger.info(f"Analyzing image: {image_path}")
-        
-        # Read and encode image
-        with open(image_path, 'rb') as f:
-            image_data = base64.b64encode(f.read()).decode()
+        # Map the file instead of reading it: hashing and base64 encoding both
+        # work on the mapping, so no intermediate bytes copy is made
+        with open(image_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image_bytes:
+            key = self._cache_key(image_bytes, context)
+            cached = self._analysis_cache.get(key)
+            if cached is None:
+                cached = await asyncio.to_thread(self._load_cached, key)
+            if cached is not None:
+                logger.info(f"Using cached analysis for image: {image_path}")
+                self._analysis_cache[key] = cached
+                return cached
+            
+            logger.info(f"Analyzing image: {image_path}")
+            
+            detail = self._detail_for(f)
+            # pybase64's SIMD encoder is several times faster than stdlib base64
+            image_data = pybase64.b64encode_as_string(image_bytes)
         
-        prompt = f"""Analyze this medical image in detail. 
-
-Context from textbook: {context if context else 'No additional context provided'}
-
-Provide a comprehensive analysis including:
-1. **Anatomical Structures**: Identify all visible anatomical structures
-2. **Pathological Findings**: Note any abnormalities or pathology
-3. **Clinical Significance**: Explain the diagnostic or educational value
-4. **Key Features**: Highlight important features for learning
-5. **Labels/Annotations**: Describe any visible labels or markings
-
-Be precise and use medical terminology appropriate for exam preparation."""
+        context_text = f"Context from textbook: {context if context else 'No additional context provided'}"
         
         try:
             response = await self.client.chat.completions.create(
                 model=settings.LLM_MODEL,
                 messages=[{
+                    "role": "system",
+                    "content": IMAGE_ANALYSIS_RUBRIC
+                }, {
                     "role": "user",
                     "content": [
                         {
                             "type": "text",
-                            "text": prompt
+                            "text": context_text
                         },
                         {
                             "type": "image_url",
                             "image_url": {
                                 "url": f"data:image/png;base64,{image_data}",
-                                "detail": "high"
+                                "detail": detail
                             }
                         }
                     ]
@@ -72,12 +139,16 @@ Be precise and use medical terminology appropriate for exam preparation."""
             
             analysis = response.choices[0].message.content
             
-            logger.info("Image analysis completed successfully")
+            logger.info(f"Image analysis completed successfully (detail={detail})")
             
-            return {
+            result = {
                 'analysis': analysis,
                 'model_used': settings.LLM_MODEL
             }
+            self._analysis_cache[key] = result
+            await asyncio.to_thread(self._save_cached, key, result)
+            
+            return result
             
         except Exception as e:
             logger.error(f"Error analyzing image: {e}")
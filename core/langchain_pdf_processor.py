@@ -1,30 +1,92 @@
-from typing import List, Dict
+from typing import Iterator, List, Dict
 from pathlib import Path
-from langchain_community.document_loaders import PyMuPDFLoader
+import fitz  # PyMuPDF
+import tiktoken
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from core.question_index import QuestionIndex
 from config import settings
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+def _token_counter():
+    """len() replacement counting tokens of the embedding model's encoding"""
+    try:
+        encoding = tiktoken.encoding_for_model(settings.EMBEDDING_MODEL)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    
+    # encode_ordinary treats special-token text in PDFs as plain text
+    def count_tokens(text: str) -> int:
+        return len(encoding.encode_ordinary(text))
+    
+    return count_tokens
+
 class LangchainPDFProcessor:
-    """Process PDF files using Langchain's PyMuPDFLoader"""
+    """Process PDF files with PyMuPDF and Langchain's text splitter"""
     
     def __init__(self):
+        # Size chunks in tokens so every chunk costs the embedding API about
+        # the same, rather than varying with characters-per-token
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=200,
-            length_function=len,
+            chunk_size=settings.CHUNK_TOKENS,
+            chunk_overlap=settings.CHUNK_OVERLAP_TOKENS,
+            length_function=_token_counter(),
             add_start_index=True,
         )
     
+    def iter_chunks(
+        self, 
+        pdf_path: Path,
+        chapter_id: int
+    ) -> Iterator[List[Dict]]:
+        """
+        Yield each page's text chunks as soon as the page is parsed
+        
+        Lets callers start embedding early chunks while later pages are
+        still being read. Chunk indices run across the whole document.
+        """
+        # Repeated headers, footers and boilerplate would cost an embedding
+        # call and a vector slot per copy: exact repeats (after folding case
+        # and whitespace) and near-duplicates of an earlier chunk are skipped
+        seen = set()
+        # (the LSH threshold sits a bit looser than the Jaccard rule; LSH is
+        # used from the first chunk, as a full scan per chunk would be
+        # quadratic over the whole document)
+        near_duplicates = QuestionIndex(threshold=settings.CHUNK_DUPLICATE_JACCARD - 0.1, full_scan_below=0)
+        chunk_index = 0
+        skipped = 0
+        with fitz.open(pdf_path) as doc:
+            for page_num, page in enumerate(doc):
+                page_chunks = []
+                for chunk in self.text_splitter.create_documents([page.get_text()]):
+                    normalized = ' '.join(chunk.page_content.casefold().split())
+                    if normalized in seen or near_duplicates.candidates(normalized, min_jaccard=settings.CHUNK_DUPLICATE_JACCARD):
+                        skipped += 1
+                        continue
+                    seen.add(normalized)
+                    near_duplicates.add(chunk_index, normalized)
+                    
+                    page_chunks.append({
+                        'chapter_id': chapter_id,
+                        'page_number': page_num + 1,
+                        'text': chunk.page_content,
+                        'chunk_index': chunk_index,
+                        'source_file': str(pdf_path),
+                        'start_index': chunk.metadata.get('start_index', 0)
+                    })
+                    chunk_index += 1
+                yield page_chunks
+        
+        logger.info(f"Extracted {chunk_index} chunks from PDF ({skipped} duplicates skipped)")
+    
     def process_pdf(
         self, 
         pdf_path: Path,
         chapter_id: int
     ) -> List[Dict]:
         """
-        Extract text from PDF using Langchain's PyMuPDFLoader
+        Extract text from PDF with PyMuPDF, split into token-sized chunks
         
         Args:
             pdf_path: Path to the PDF file
@@ -36,28 +98,7 @@ class LangchainPDFProcessor:
         logger.info(f"Processing PDF: {pdf_path}")
         
         try:
-            # Load PDF using Langchain's loader
-            loader = PyMuPDFLoader(str(pdf_path))
-            documents = loader.load()
-            
-            # Split documents into chunks
-            chunks = self.text_splitter.split_documents(documents)
-            
-            # Format chunks with metadata
-            formatted_chunks = []
-            for i, chunk in enumerate(chunks):
-                formatted_chunks.append({
-                    'chapter_id': chapter_id,
-                    'page_number': chunk.metadata.get('page', 0) + 1,  # Langchain uses 0-based pages
-                    'text': chunk.page_content,
-                    'chunk_index': i,
-                    'source_file': str(pdf_path),
-                    'start_index': chunk.metadata.get('start_index', 0)
-                })
-            
-            logger.info(f"Extracted {len(formatted_chunks)} chunks from PDF")
-            return formatted_chunks
-            
+            return [chunk for page_chunks in self.iter_chunks(pdf_path, chapter_id) for chunk in page_chunks]
         except Exception as e:
             logger.error(f"Error processing PDF: {e}")
             raise
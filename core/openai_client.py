@@ -0,0 +1,24 @@
+# core/openai_client.py
+import functools
+import httpx
+from openai import AsyncOpenAI
+from config import settings
+
+@functools.lru_cache(maxsize=1)
+def get_openai_client() -> AsyncOpenAI:
+    """
+    Process-wide AsyncOpenAI client over one pooled HTTP/2 connection pool
+    
+    Sharing it means TLS sessions are reused and parallel embedding batches
+    and completions multiplex over the same connections. Its connections are
+    bound to the event loop that first uses them, so drive it through
+    utils.resources.run_async rather than a fresh asyncio.run() loop.
+    """
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=60
+        )
+    )
@@ -0,0 +1,96 @@
+# core/question_index.py
+import re
+from typing import Dict, Any, List
+from datasketch import MinHash, MinHashLSH
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+SHINGLE_SIZE = 4
+
+def shingles(text: str) -> frozenset:
+    """Character 4-gram shingle set (text is expected to be casefolded already)"""
+    return frozenset(text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+
+class QuestionIndex:
+    """MinHash LSH index over a chapter's existing questions for near-duplicate lookup"""
+    
+    def __init__(self, threshold: float = 0.2, num_perm: int = 128, full_scan_below: int = 1000):
+        # LSH recall is probabilistic: a pair whose word Jaccard is right at
+        # the threshold is only found about half the time, and pairs missed
+        # here never reach the exact similarity check. Indexes smaller than
+        # full_scan_below (a chapter's questions, typically) therefore
+        # return every stored text; larger ones use LSH with a low threshold.
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.full_scan_below = full_scan_below
+        self.lsh = MinHashLSH(threshold=threshold, num_perm=num_perm)
+        self.texts: Dict[Any, str] = {}  # question key -> casefolded text
+        self.shingles: Dict[Any, frozenset] = {}  # question key -> 4-gram shingles
+    
+    def _minhash(self, text: str) -> MinHash:
+        """Compute MinHash signature over the word tokens of casefolded text"""
+        m = MinHash(num_perm=self.num_perm)
+        tokens = set(_TOKEN_RE.findall(text))
+        m.update_batch([t.encode('utf-8') for t in tokens])
+        return m
+    
+    def add(self, key: Any, text: str) -> None:
+        """Insert a question into the index"""
+        if key in self.texts:
+            return
+        # Fold once; the signature, shingles and stored text all reuse it
+        folded = text.casefold()
+        self.lsh.insert(key, self._minhash(folded))
+        self.texts[key] = folded
+        self.shingles[key] = shingles(folded)
+    
+    def sync(self, questions: List[Dict[str, Any]]) -> None:
+        """Bring the index in line with the given question list (incremental when possible)"""
+        keys = [q.get('id', i) for i, q in enumerate(questions)]
+        
+        # Questions were removed (e.g. chapter deleted) - rebuild from scratch
+        if not set(keys).issuperset(self.texts):
+            self.lsh = MinHashLSH(threshold=self.threshold, num_perm=self.num_perm)
+            self.texts = {}
+            self.shingles = {}
+        
+        added = 0
+        for key, q in zip(keys, questions):
+            if key not in self.texts:
+                self.add(key, q.get('question', ''))
+                added += 1
+        
+        if added:
+            logger.info(f"Indexed {added} questions ({len(self.texts)} total)")
+    
+    def candidates(self, text: str, min_jaccard: float = 0.0) -> List[str]:
+        """
+        Return casefolded texts of stored questions likely similar to text
+        
+        Candidates (every stored question below full_scan_below, LSH hits
+        otherwise) are ordered by 4-gram shingle Jaccard (C-level set ops on
+        precomputed signatures), most similar first. Shingle Jaccard is not
+        a bound on SequenceMatcher.ratio(), so it only drops hits when the
+        caller's own rule is a Jaccard threshold (min_jaccard).
+        """
+        folded = text.casefold()
+        new_shingles = shingles(folded)
+        scored = []
+        if len(self.texts) < self.full_scan_below:
+            keys = list(self.texts)
+        else:
+            keys = self.lsh.query(self._minhash(folded))
+        
+        for key in keys:
+            existing = self.shingles[key]
+            inter = len(new_shingles & existing)
+            union = len(new_shingles) + len(existing) - inter
+            jaccard = inter / union if union else 1.0
+            if jaccard >= min_jaccard:
+                scored.append((jaccard, self.texts[key]))
+        
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [existing_text for _, existing_text in scored]
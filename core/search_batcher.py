@@ -0,0 +1,64 @@
+# core/search_batcher.py
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from storage.vector_store import LocalVectorStore
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class SearchBatcher:
+    """Coalesce vector searches issued within a short window into one batch_search call"""
+    
+    def __init__(self, vector_store: LocalVectorStore, window: float = 0.005):
+        self.vector_store = vector_store
+        self.window = window  # seconds to wait for more queries before searching
+        self._pending: List[Tuple[np.ndarray, int, Optional[int], asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        filter_chapter: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Queue a search and wait for the batch it joins to complete"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((query_embedding, k, filter_chapter, future))
+        
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+        
+        return await future
+    
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window)
+        batch, self._pending = self._pending, []
+        self._flush_task = None
+        
+        # One search at the largest k serves every query; each keeps its own top k
+        max_k = max(k for _, k, _, _ in batch)
+        queries = np.stack([
+            np.asarray(query, dtype='float32').reshape(-1) for query, _, _, _ in batch
+        ])
+        
+        try:
+            # faiss releases the GIL, so the loop keeps serving other requests
+            results = await asyncio.to_thread(
+                self.vector_store.batch_search,
+                queries,
+                max_k,
+                [filter_chapter for _, _, filter_chapter, _ in batch]
+            )
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        if len(batch) > 1:
+            logger.info(f"Coalesced {len(batch)} vector searches into one batch")
+        
+        for (_, k, _, future), query_results in zip(batch, results):
+            if not future.done():
+                future.set_result(query_results[:k])
@@ -1,13 +1,12 @@
 # pages/1_📊_Dashboard.py
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
+from operator import itemgetter
 from config import settings
 from utils.logger import setup_logger
 from utils.session_init import init_session_state
 from utils.design_system import get_global_css, COLORS
+from utils.storage_cache import load_cached
 
 logger = setup_logger(__name__)
 
@@ -17,15 +16,70 @@ init_session_state()
 # Apply global CSS
 st.markdown(get_global_css(), unsafe_allow_html=True)
 
-# Load data
-storage = st.session_state.storage
-chapters = storage.load('chapters')
-questions = storage.load('questions')
-attempts = storage.load('attempts')
-rag_conversations = storage.load('rag_conversations')
+DIFFICULTY_LEVELS = ['intermediate', 'advanced', 'complex']
+TIMELINE_MAX_POINTS = 500  # Longer histories are LTTB-downsampled before plotting
+PLOTLY_CONFIG = {'displaylogo': False, 'responsive': True}  # Shared st.plotly_chart config
 
-# Header with gradient
-st.markdown(f"""
+# Accuracy status bands for pd.cut: [0, 60) error, [60, 70) warning, 70+ success
+ACCURACY_BINS = [float('-inf'), 60, 70, float('inf')]
+ACCURACY_COLORS = [COLORS['error'], COLORS['warning'], COLORS['success']]
+
+# Card markup as format_map templates, built once instead of re-evaluating
+# long f-strings on every rerun (COLORS keys are valid placeholders too)
+METRIC_CARD_TPL = """
+    <div style="background: {background}; padding: 1.5rem; border-radius: 1rem; color: white; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
+        <div style="font-size: 0.875rem; opacity: 0.9; font-weight: 600;">{label}</div>
+        <div style="font-size: 2.5rem; font-weight: 700; margin: 0.5rem 0;">{value}</div>
+        <div style="font-size: 0.875rem; opacity: 0.8;">{caption}</div>
+    </div>
+    """
+
+EMPTY_ACCURACY_CARD = {
+    'background': "linear-gradient(135deg, #a8edea 0%, #fed6e3 100%)",
+    'label': "ACCURACY",
+    'value': "N/A",
+    'caption': "No attempts yet"
+}
+
+STAT_CARD_TPL = """
+            <div style="
+                background: {bg_primary};
+                padding: 1rem;
+                border-radius: 0.75rem;
+                border: 1px solid {border};
+                margin-bottom: 0.75rem;
+                display: flex;
+                justify-content: space-between;
+                align-items: center;
+            ">
+                <div>
+                    <div style="color: {text_secondary}; font-size: 0.875rem; font-weight: 600;">{label}</div>
+                    <div style="color: {text_primary}; font-size: 1.5rem; font-weight: 700;">{value}</div>
+                </div>
+                <div style="font-size: 2rem;">{emoji}</div>
+            </div>
+            """
+
+DIFFICULTY_CARD_TPL = """
+                <div style="
+                    background: {color}15;
+                    padding: 1.5rem;
+                    border-radius: 0.75rem;
+                    margin-bottom: 1rem;
+                    border-left: 4px solid {color};
+                ">
+                    <h4 style="margin: 0; color: {color}; font-size: 1.1rem;">{difficulty}</h4>
+                    <div style="font-size: 2.5rem; font-weight: 700; color: {color}; margin: 0.5rem 0;">
+                        {accuracy:.0f}%
+                    </div>
+                    <div style="color: {text_secondary}; font-size: 0.875rem;">
+                        {attempts} attempts
+                    </div>
+                </div>
+                """
+
+# Static banners depend only on COLORS, so they are formatted once at import
+HEADER_HTML = f"""
 <div style="
     background: {COLORS['gradient_primary']};
     padding: 2rem;
@@ -38,11 +92,9 @@ st.markdown(f"""
         Track your progress and master your medical knowledge
     </p>
 </div>
-""", unsafe_allow_html=True)
+"""
 
-# Welcome message if no data
-if not chapters:
-    st.markdown(f"""
+WELCOME_HTML = f"""
     <div style="
         background: {COLORS['bg_secondary']};
         border: 2px dashed {COLORS['border']};
@@ -58,60 +110,76 @@ if not chapters:
             📤 Upload PDF → ❓ Generate Questions → 📝 Practice → 📊 Track Progress
         </p>
     </div>
-    """, unsafe_allow_html=True)
+    """
+
+# Load data
+storage = st.session_state.storage
+chapters = load_cached(storage, 'chapters')
+questions = load_cached(storage, 'questions')
+attempts = load_cached(storage, 'attempts')
+rag_conversations = load_cached(storage, 'rag_conversations')
+
+# Collection sizes, bound once for the rest of the page
+n_chapters = len(chapters)
+n_questions = len(questions)
+n_attempts = len(attempts)
+n_rag = len(rag_conversations)
+
+# Header with gradient
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
+
+# Welcome message if no data
+if not chapters:
+    st.markdown(WELCOME_HTML, unsafe_allow_html=True)
     st.stop()
 
 # Top metrics with modern cards
 st.markdown("### 📈 Quick Stats")
-col1, col2, col3, col4 = st.columns(4)
 
-with col1:
-    st.markdown(f"""
-    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 1.5rem; border-radius: 1rem; color: white; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-        <div style="font-size: 0.875rem; opacity: 0.9; font-weight: 600;">CHAPTERS</div>
-        <div style="font-size: 2.5rem; font-weight: 700; margin: 0.5rem 0;">{len(chapters)}</div>
-        <div style="font-size: 0.875rem; opacity: 0.8;">Uploaded</div>
-    </div>
-    """, unsafe_allow_html=True)
+if attempts:
+    # Every attempt is saved with a bool is_correct; summing the bools via
+    # map/itemgetter keeps the loop in C
+    correct = sum(map(itemgetter('is_correct'), attempts))
+    accuracy = (correct / n_attempts) * 100
+    accuracy_card = {
+        'background': "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)" if accuracy >= 70 else "linear-gradient(135deg, #fa709a 0%, #fee140 100%)",
+        'label': "ACCURACY",
+        'value': f"{accuracy:.1f}%",
+        'caption': f"{correct}/{n_attempts} Correct"
+    }
+else:
+    accuracy_card = EMPTY_ACCURACY_CARD
 
-with col2:
-    st.markdown(f"""
-    <div style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); padding: 1.5rem; border-radius: 1rem; color: white; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-        <div style="font-size: 0.875rem; opacity: 0.9; font-weight: 600;">QUESTIONS</div>
-        <div style="font-size: 2.5rem; font-weight: 700; margin: 0.5rem 0;">{len(questions)}</div>
-        <div style="font-size: 0.875rem; opacity: 0.8;">Generated</div>
-    </div>
-    """, unsafe_allow_html=True)
+metric_cards = [
+    {
+        'background': "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        'label': "CHAPTERS",
+        'value': n_chapters,
+        'caption': "Uploaded"
+    },
+    {
+        'background': "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
+        'label': "QUESTIONS",
+        'value': n_questions,
+        'caption': "Generated"
+    },
+    accuracy_card,
+    {
+        'background': "linear-gradient(135deg, #30cfd0 0%, #330867 100%)",
+        'label': "RAG QUERIES",
+        'value': n_rag,
+        'caption': "Conversations"
+    },
+]
 
-with col3:
-    if attempts:
-        correct = sum(1 for a in attempts if a.get('is_correct', False))
-        accuracy = (correct / len(attempts)) * 100
-        color_gradient = "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)" if accuracy >= 70 else "linear-gradient(135deg, #fa709a 0%, #fee140 100%)"
-        st.markdown(f"""
-        <div style="background: {color_gradient}; padding: 1.5rem; border-radius: 1rem; color: white; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-            <div style="font-size: 0.875rem; opacity: 0.9; font-weight: 600;">ACCURACY</div>
-            <div style="font-size: 2.5rem; font-weight: 700; margin: 0.5rem 0;">{accuracy:.1f}%</div>
-            <div style="font-size: 0.875rem; opacity: 0.8;">{correct}/{len(attempts)} Correct</div>
-        </div>
-        """, unsafe_allow_html=True)
-    else:
-        st.markdown(f"""
-        <div style="background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%); padding: 1.5rem; border-radius: 1rem; color: white; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-            <div style="font-size: 0.875rem; opacity: 0.9; font-weight: 600;">ACCURACY</div>
-            <div style="font-size: 2.5rem; font-weight: 700; margin: 0.5rem 0;">N/A</div>
-            <div style="font-size: 0.875rem; opacity: 0.8;">No attempts yet</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-with col4:
-    st.markdown(f"""
-    <div style="background: linear-gradient(135deg, #30cfd0 0%, #330867 100%); padding: 1.5rem; border-radius: 1rem; color: white; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-        <div style="font-size: 0.875rem; opacity: 0.9; font-weight: 600;">RAG QUERIES</div>
-        <div style="font-size: 2.5rem; font-weight: 700; margin: 0.5rem 0;">{len(rag_conversations)}</div>
-        <div style="font-size: 0.875rem; opacity: 0.8;">Conversations</div>
-    </div>
-    """, unsafe_allow_html=True)
+# One markdown element laid out as a 4-column grid rather than four columns
+# with an element each; cards are stripped so no blank line splits the HTML
+st.markdown(
+    '<div style="display: grid; grid-template-columns: repeat(4, 1fr); gap: 1rem;">'
+    + "".join(METRIC_CARD_TPL.format_map(card).strip() for card in metric_cards)
+    + '</div>',
+    unsafe_allow_html=True
+)
 
 st.markdown("<br>", unsafe_allow_html=True)
 
@@ -119,21 +187,115 @@ if not attempts:
     st.info("📝 No practice data yet. Generate and answer questions to see detailed analytics!")
     st.stop()
 
-# Modern tabs
-tab1, tab2, tab3, tab4 = st.tabs([
-    "📊 Performance", 
-    "📚 Chapters", 
-    "🎯 Difficulty",
-    "📅 Timeline"
-])
+# Analytics dependencies load only past the empty-state exits above, so a new
+# user's first (empty) visit skips the pandas/Plotly import cost
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from utils.helpers import lttb_indices
+
+# st.plotly_chart serializes through plotly.io.to_json; orjson (already a
+# dependency) encodes the figures' NumPy arrays far faster than stdlib json
+pio.json.config.default_engine = 'orjson'
+
+# Aggregations are cached on a cheap version stamp of the underlying data, so
+# reruns from widget clicks skip them until storage actually changes. The
+# underscore-prefixed record lists are excluded from Streamlit's hashing.
+@st.cache_data(ttl=300)
+def _compute_attempt_stats(data_version: tuple, _attempts: list, _questions: list, _chapters: list) -> dict:
+    """
+    Every dashboard statistic from one attempts DataFrame
+    
+    Args:
+        data_version: Storage mtimes and record counts identifying the data
+        _attempts, _questions, _chapters: Raw storage records
+    """
+    # Frames are built straight from the records, picking only the columns used
+    df_att = pd.DataFrame(_attempts, columns=['chapter_id', 'question_id', 'is_correct', 'created_at'])
+    df_att['is_correct'] = df_att['is_correct'].fillna(False).astype(bool)
+    
+    # Chapters: one groupby, merged onto names in chapter order (inner merge
+    # drops chapters without attempts)
+    chap_grp = df_att.groupby('chapter_id')['is_correct'].agg(Attempts='size', Correct='sum')
+    df_chapters = pd.DataFrame(_chapters, columns=['id', 'name']).rename(columns={'id': 'chapter_id'}).merge(
+        chap_grp, left_on='chapter_id', right_index=True
+    )
+    df_chapters['Chapter'] = [name[:40] + '...' if len(name) > 40 else name for name in df_chapters['name']]
+    
+    # Difficulty: attach each attempt's question difficulty (first question
+    # per id, as the old lookup did). As an ordered categorical of the known
+    # levels, unknown values drop out and groupby works on integer codes,
+    # returning the levels already in display order
+    df_questions = pd.DataFrame(_questions, columns=['id', 'difficulty']).rename(columns={'id': 'question_id'})
+    df_questions = df_questions.drop_duplicates('question_id')
+    df_questions['difficulty'] = pd.Categorical(
+        df_questions['difficulty'].fillna('intermediate').str.lower(),
+        categories=DIFFICULTY_LEVELS,
+        ordered=True
+    )
+    df_diff = df_att.merge(df_questions, on='question_id').groupby('difficulty', observed=True)['is_correct'].agg(
+        Attempts='size', Correct='sum'
+    )
+    df_diff = df_diff.rename_axis('Difficulty').reset_index()
+    df_diff['Difficulty'] = df_diff['Difficulty'].cat.rename_categories(str.title)
+    
+    for df in (df_chapters, df_diff):
+        df['Correct'] = df['Correct'].astype(int)
+        df['Incorrect'] = df['Attempts'] - df['Correct']
+        df['Accuracy'] = df['Correct'] / df['Attempts'] * 100
+        # Status color for every row in one binning pass
+        df['Color'] = pd.cut(df['Accuracy'], bins=ACCURACY_BINS, labels=ACCURACY_COLORS, right=False).astype(str)
+    
+    # Timeline: attempts with a timestamp, grouped by the raw date string;
+    # only the (few) grouped dates are parsed with to_datetime
+    dated = df_att.dropna(subset=['created_at'])
+    df_time = dated.assign(Date=dated['created_at'].str.slice(0, 10)).groupby('Date', sort=True)['is_correct'].agg(
+        Total='size', Correct='sum'
+    ).reset_index()
+    df_time['Correct'] = df_time['Correct'].astype(int)
+    df_time['Accuracy'] = df_time['Correct'] / df_time['Total'] * 100
+    df_time['Date'] = pd.to_datetime(df_time['Date'])
+    
+    # Cap the plotted series; LTTB keeps the line's peaks and troughs
+    if len(df_time) > TIMELINE_MAX_POINTS:
+        df_time = df_time.iloc[lttb_indices(
+            df_time['Date'].to_numpy().view('int64'),
+            df_time['Accuracy'].to_numpy(),
+            TIMELINE_MAX_POINTS
+        )].reset_index(drop=True)
+    
+    return {
+        'chapters': df_chapters[['Chapter', 'Attempts', 'Correct', 'Incorrect', 'Accuracy', 'Color']].reset_index(drop=True),
+        'difficulty': df_diff[['Difficulty', 'Attempts', 'Correct', 'Incorrect', 'Accuracy', 'Color']],
+        'timeline': df_time
+    }
+
+attempt_stats = _compute_attempt_stats(
+    tuple(
+        (name, storage.get_mtime(name), count)
+        for name, count in (('attempts', n_attempts), ('questions', n_questions), ('chapters', n_chapters))
+    ),
+    attempts,
+    questions,
+    chapters
+)
+
+# Tab-style view selector: unlike st.tabs, which runs every tab body on each
+# rerun, only the selected view builds (and serializes) its Plotly figure
+active_view = st.radio(
+    "View",
+    ["📊 Performance", "📚 Chapters", "🎯 Difficulty", "📅 Timeline"],
+    horizontal=True,
+    label_visibility='collapsed'
+)
 
 # TAB 1: Performance Overview
-with tab1:
+if active_view == "📊 Performance":
     col_left, col_right = st.columns([2, 1])
     
     with col_left:
-        correct_count = sum(1 for a in attempts if a.get('is_correct', False))
-        incorrect_count = len(attempts) - correct_count
+        correct_count = correct
+        incorrect_count = n_attempts - correct_count
         
         fig_donut = go.Figure(data=[go.Pie(
             labels=['Correct', 'Incorrect'],
@@ -146,13 +308,14 @@ with tab1:
         )])
         
         fig_donut.update_layout(
+            uirevision='dash',
             showlegend=True,
             height=400,
             paper_bgcolor='rgba(0,0,0,0)',
             plot_bgcolor='rgba(0,0,0,0)',
             font=dict(size=14, color=COLORS['text_primary']),
             annotations=[dict(
-                text=f'<b>{(correct_count/len(attempts)*100):.0f}%</b>',
+                text=f'<b>{(correct_count/n_attempts*100):.0f}%</b>',
                 x=0.5, y=0.5,
                 font_size=48,
                 showarrow=False,
@@ -160,11 +323,10 @@ with tab1:
             )]
         )
         
-        st.plotly_chart(fig_donut, use_container_width=True)
+        st.plotly_chart(fig_donut, use_container_width=True, config=PLOTLY_CONFIG)
     
     with col_right:
-        total_attempts = len(attempts)
-        accuracy = (correct_count / total_attempts) * 100
+        accuracy = (correct_count / n_attempts) * 100
         
         if accuracy >= 80:
             rating = "Excellent"
@@ -194,56 +356,31 @@ with tab1:
             <div style="font-size: 3rem; text-align: center; margin-bottom: 0.5rem;">{emoji}</div>
             <h2 style="color: {color}; margin: 0; text-align: center; font-size: 1.75rem;">{rating}</h2>
             <p style="text-align: center; color: {COLORS['text_secondary']}; margin: 0.5rem 0 0 0;">
-                Based on {total_attempts} attempts
+                Based on {n_attempts} attempts
             </p>
         </div>
         """, unsafe_allow_html=True)
         
         # Stats cards
         stats = [
-            ("Total Attempts", total_attempts, "📝"),
+            ("Total Attempts", n_attempts, "📝"),
             ("Correct", correct_count, "✅"),
             ("Incorrect", incorrect_count, "❌"),
         ]
         
-        for label, value, emoji in stats:
-            st.markdown(f"""
-            <div style="
-                background: {COLORS['bg_primary']};
-                padding: 1rem;
-                border-radius: 0.75rem;
-                border: 1px solid {COLORS['border']};
-                margin-bottom: 0.75rem;
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-            ">
-                <div>
-                    <div style="color: {COLORS['text_secondary']}; font-size: 0.875rem; font-weight: 600;">{label}</div>
-                    <div style="color: {COLORS['text_primary']}; font-size: 1.5rem; font-weight: 700;">{value}</div>
-                </div>
-                <div style="font-size: 2rem;">{emoji}</div>
-            </div>
-            """, unsafe_allow_html=True)
+        st.markdown(
+            "\n".join(
+                STAT_CARD_TPL.format_map({**COLORS, 'label': label, 'value': value, 'emoji': emoji}).strip()
+                for label, value, emoji in stats
+            ),
+            unsafe_allow_html=True
+        )
 
 # TAB 2: Chapter Analysis
-with tab2:
-    chapter_stats = []
-    for chapter in chapters:
-        chapter_attempts = [a for a in attempts if a.get('chapter_id') == chapter['id']]
-        if chapter_attempts:
-            correct = sum(1 for a in chapter_attempts if a.get('is_correct', False))
-            accuracy = (correct / len(chapter_attempts) * 100)
-            chapter_stats.append({
-                'Chapter': chapter['name'][:40] + '...' if len(chapter['name']) > 40 else chapter['name'],
-                'Attempts': len(chapter_attempts),
-                'Correct': correct,
-                'Incorrect': len(chapter_attempts) - correct,
-                'Accuracy': accuracy
-            })
+elif active_view == "📚 Chapters":
+    df_chapters = attempt_stats['chapters']
     
-    if chapter_stats:
-        df_chapters = pd.DataFrame(chapter_stats)
+    if not df_chapters.empty:
         
         fig_chapters = go.Figure()
         
@@ -252,16 +389,14 @@ with tab2:
             y=df_chapters['Chapter'],
             x=df_chapters['Correct'],
             orientation='h',
-            marker=dict(
-                color=df_chapters['Accuracy'],
-                colorscale=[[0, '#EF4444'], [0.5, '#F59E0B'], [1, '#10B981']],
-                showscale=True,
-                colorbar=dict(title="Accuracy %", len=0.5)
-            ),
-            text=df_chapters['Correct'],
+            # Colors resolved in the stats pipeline, so the browser builds no colorscale/colorbar
+            marker=dict(color=df_chapters['Color']),
+            customdata=df_chapters['Accuracy'],
+            texttemplate='%{x}',  # Label from the bar value, no parallel text array
             textposition='inside',
             textfont=dict(color='white', size=14),
-            hovertemplate='<b>%{y}</b><br>Correct: %{x}<br>Accuracy: %{marker.color:.1f}%<extra></extra>'
+            cliponaxis=False,
+            hovertemplate='<b>%{y}</b><br>Correct: %{x}<br>Accuracy: %{customdata:.1f}%<extra></extra>'
         ))
         
         fig_chapters.add_trace(go.Bar(
@@ -270,15 +405,19 @@ with tab2:
             x=df_chapters['Incorrect'],
             orientation='h',
             marker=dict(color='#FCA5A5'),
-            text=df_chapters['Incorrect'],
+            texttemplate='%{x}',
             textposition='inside',
-            textfont=dict(color='white', size=14)
+            textfont=dict(color='white', size=14),
+            cliponaxis=False
         ))
         
         fig_chapters.update_layout(
+            uirevision='dash',
             barmode='stack',
-            height=max(350, len(chapter_stats) * 70),
+            height=max(350, len(df_chapters) * 70),
             xaxis_title="Number of Attempts",
+            # Stack totals are known, so Plotly needn't recompute the extent
+            xaxis=dict(range=[0, df_chapters['Attempts'].max() * 1.05], autorange=False),
             paper_bgcolor='rgba(0,0,0,0)',
             plot_bgcolor='rgba(0,0,0,0)',
             font=dict(size=13, color=COLORS['text_primary']),
@@ -286,33 +425,28 @@ with tab2:
             legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
         )
         
-        st.plotly_chart(fig_chapters, use_container_width=True)
+        st.plotly_chart(fig_chapters, use_container_width=True, config=PLOTLY_CONFIG)
+        
+        # Static legend for the accuracy bands of the "Correct" bars
+        st.markdown(
+            f"""<div style="display: flex; gap: 1.5rem; color: {COLORS['text_secondary']}; font-size: 0.875rem;">"""
+            + "".join(
+                f"""<span><span style="display: inline-block; width: 0.75rem; height: 0.75rem; border-radius: 0.2rem; background: {color}; margin-right: 0.4rem;"></span>{label}</span>"""
+                for color, label in (
+                    (COLORS['success'], "Accuracy ≥ 70%"),
+                    (COLORS['warning'], "60–69%"),
+                    (COLORS['error'], "< 60%")
+                )
+            )
+            + "</div>",
+            unsafe_allow_html=True
+        )
 
 # TAB 3: Difficulty Breakdown
-with tab3:
-    difficulty_stats = {'intermediate': [], 'advanced': [], 'complex': []}
-    
-    for attempt in attempts:
-        question = next((q for q in questions if q['id'] == attempt['question_id']), None)
-        if question:
-            diff = question.get('difficulty', 'intermediate').lower()
-            if diff in difficulty_stats:
-                difficulty_stats[diff].append(attempt.get('is_correct', False))
-    
-    diff_data = []
-    for diff, results in difficulty_stats.items():
-        if results:
-            accuracy = sum(results) / len(results) * 100
-            diff_data.append({
-                'Difficulty': diff.title(),
-                'Attempts': len(results),
-                'Correct': sum(results),
-                'Incorrect': len(results) - sum(results),
-                'Accuracy': accuracy
-            })
+elif active_view == "🎯 Difficulty":
+    df_diff = attempt_stats['difficulty']
     
-    if diff_data:
-        df_diff = pd.DataFrame(diff_data)
+    if not df_diff.empty:
         
         col1, col2 = st.columns([2, 1])
         
@@ -324,7 +458,7 @@ with tab3:
                 x=df_diff['Difficulty'],
                 y=df_diff['Correct'],
                 marker_color=COLORS['success'],
-                text=df_diff['Correct'],
+                texttemplate='%{y}',
                 textposition='outside',
                 textfont=dict(size=14)
             ))
@@ -334,12 +468,13 @@ with tab3:
                 x=df_diff['Difficulty'],
                 y=df_diff['Incorrect'],
                 marker_color=COLORS['error'],
-                text=df_diff['Incorrect'],
+                texttemplate='%{y}',
                 textposition='outside',
                 textfont=dict(size=14)
             ))
             
             fig_diff.update_layout(
+                uirevision='dash',
                 barmode='group',
                 height=400,
                 xaxis_title="Difficulty Level",
@@ -349,53 +484,36 @@ with tab3:
                 font=dict(size=13, color=COLORS['text_primary'])
             )
             
-            st.plotly_chart(fig_diff, use_container_width=True)
+            st.plotly_chart(fig_diff, use_container_width=True, config=PLOTLY_CONFIG)
         
         with col2:
-            for _, row in df_diff.iterrows():
-                color = COLORS['success'] if row['Accuracy'] >= 70 else COLORS['warning'] if row['Accuracy'] >= 60 else COLORS['error']
-                st.markdown(f"""
-                <div style="
-                    background: {color}15;
-                    padding: 1.5rem;
-                    border-radius: 0.75rem;
-                    margin-bottom: 1rem;
-                    border-left: 4px solid {color};
-                ">
-                    <h4 style="margin: 0; color: {color}; font-size: 1.1rem;">{row['Difficulty']}</h4>
-                    <div style="font-size: 2.5rem; font-weight: 700; color: {color}; margin: 0.5rem 0;">
-                        {row['Accuracy']:.0f}%
-                    </div>
-                    <div style="color: {COLORS['text_secondary']}; font-size: 0.875rem;">
-                        {row['Attempts']} attempts
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+            # Plain column tuples (no per-row Series), all cards in one element
+            st.markdown(
+                "\n".join(
+                    DIFFICULTY_CARD_TPL.format_map({
+                        **COLORS,
+                        'color': color,
+                        'difficulty': difficulty,
+                        'accuracy': accuracy,
+                        'attempts': attempts_count
+                    }).strip()
+                    for difficulty, attempts_count, accuracy, color in zip(
+                        df_diff['Difficulty'], df_diff['Attempts'], df_diff['Accuracy'], df_diff['Color']
+                    )
+                ),
+                unsafe_allow_html=True
+            )
 
 # TAB 4: Progress Timeline
-with tab4:
-    attempts_with_dates = []
-    for attempt in attempts:
-        if 'created_at' in attempt:
-            date = attempt['created_at'][:10]
-            attempts_with_dates.append({
-                'Date': date,
-                'Correct': 1 if attempt.get('is_correct') else 0,
-                'Total': 1
-            })
+elif active_view == "📅 Timeline":
+    df_time_grouped = attempt_stats['timeline']
     
-    if attempts_with_dates:
-        df_time = pd.DataFrame(attempts_with_dates)
-        df_time_grouped = df_time.groupby('Date').agg({
-            'Correct': 'sum',
-            'Total': 'sum'
-        }).reset_index()
-        df_time_grouped['Accuracy'] = (df_time_grouped['Correct'] / df_time_grouped['Total'] * 100)
-        df_time_grouped['Date'] = pd.to_datetime(df_time_grouped['Date'])
+    if not df_time_grouped.empty:
         
         fig_timeline = go.Figure()
         
-        fig_timeline.add_trace(go.Scatter(
+        # WebGL trace: the frontend redraws it without a full SVG re-layout
+        fig_timeline.add_trace(go.Scattergl(
             x=df_time_grouped['Date'],
             y=df_time_grouped['Accuracy'],
             mode='lines+markers',
@@ -417,6 +535,7 @@ with tab4:
         )
         
         fig_timeline.update_layout(
+            uirevision='dash',
             height=450,
             xaxis_title="Date",
             yaxis_title="Accuracy (%)",
@@ -427,4 +546,4 @@ with tab4:
             hovermode='x unified'
         )
         
-        st.plotly_chart(fig_timeline, use_container_width=True)
\ No newline at end of file
+        st.plotly_chart(fig_timeline, use_container_width=True, config=PLOTLY_CONFIG)
\ No newline at end of file
@@ -1,26 +1,22 @@
 # pages/2_📤_Upload_PDF.py
 import streamlit as st
-from pathlib import Path
 import asyncio
+import numpy as np
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
 from core.langchain_pdf_processor import LangchainPDFProcessor
-from core.embeddings import EmbeddingManager
-from storage.vector_store import LocalVectorStore
 from config import settings
 from utils.logger import setup_logger
 from utils.session_init import init_session_state
 from utils.cascade_delete import cascade_delete_chapter
+from utils.resources import get_embedding_manager, get_vector_store, submit_async
+from utils.storage_cache import load_cached
 from utils.design_system import get_global_css, COLORS
 
 logger = setup_logger(__name__)
 
-st.set_page_config(page_title="Upload PDF", page_icon="📤", layout="wide")
-init_session_state()
-
-# Apply global CSS
-st.markdown(get_global_css(), unsafe_allow_html=True)
-
-# Header
-st.markdown(f"""
+# Static markup depends only on COLORS, so it is formatted once at import
+HEADER_HTML = f"""
 <div style="
     background: {COLORS['gradient_info']};
     padding: 2rem;
@@ -33,12 +29,9 @@ st.markdown(f"""
         Upload medical textbook chapters to create your personalized knowledge base
     </p>
 </div>
-""", unsafe_allow_html=True)
-
-storage = st.session_state.storage
+"""
 
-# Upload Section
-st.markdown(f"""
+UPLOAD_SECTION_HTML = f"""
 <div style="
     background: {COLORS['bg_secondary']};
     border: 2px solid {COLORS['border']};
@@ -48,7 +41,126 @@ st.markdown(f"""
 ">
     <h3 style="margin: 0 0 1rem 0; color: {COLORS['text_primary']};">Upload New Chapter</h3>
 </div>
-""", unsafe_allow_html=True)
+"""
+
+CHAPTER_DETAILS_HTML = f"""
+    <h4 style="margin: 1.5rem 0 1rem 0; color: {COLORS['text_primary']};">Chapter Details</h4>
+    """
+
+PROCESSING_HTML = f"""
+            <div style="
+                background: {COLORS['bg_primary']};
+                border: 1px solid {COLORS['border']};
+                border-radius: 1rem;
+                padding: 2rem;
+                margin: 1rem 0;
+            ">
+                <h4 style="margin: 0 0 1rem 0; color: {COLORS['text_primary']};">Processing PDF...</h4>
+            </div>
+            """
+
+CHAPTERS_HEADING_HTML = f"""
+<h2 style="color: {COLORS['text_primary']}; margin: 2rem 0 1rem 0;">📚 Your Chapters</h2>
+"""
+
+EMPTY_CHAPTERS_HTML = f"""
+    <div style="
+        background: {COLORS['bg_secondary']};
+        border: 2px dashed {COLORS['border']};
+        border-radius: 1rem;
+        padding: 3rem;
+        text-align: center;
+    ">
+        <div style="font-size: 4rem; margin-bottom: 1rem;">📚</div>
+        <h3 style="color: {COLORS['text_secondary']};">No chapters uploaded yet</h3>
+        <p style="color: {COLORS['text_tertiary']};">Upload your first chapter above to get started</p>
+    </div>
+    """
+
+# Markup with per-upload values as format_map templates (COLORS keys are
+# valid placeholders too), instead of re-evaluating long f-strings
+FILE_SELECTED_TPL = """
+    <div style="
+        background: {success}15;
+        border-left: 4px solid {success};
+        padding: 1rem;
+        border-radius: 0.5rem;
+        margin: 1rem 0;
+    ">
+        <strong style="color: {success};">✓ File selected:</strong> {filename}
+    </div>
+    """
+
+SUCCESS_TPL = """
+            <div style="
+                background: {success}15;
+                border: 2px solid {success};
+                border-radius: 1rem;
+                padding: 2rem;
+                margin: 1rem 0;
+            ">
+                <h3 style="color: {success}; margin: 0 0 1rem 0;">✓ Success!</h3>
+                <p style="margin: 0; color: {text_primary};">
+                    <strong>"{chapter_name}"</strong> processed successfully!
+                </p>
+                <div style="
+                    display: grid;
+                    grid-template-columns: repeat(2, 1fr);
+                    gap: 1rem;
+                    margin-top: 1rem;
+                ">
+                    <div style="background: white; padding: 1rem; border-radius: 0.5rem;">
+                        <div style="color: {text_secondary}; font-size: 0.875rem;">Text Chunks</div>
+                        <div style="color: {primary}; font-size: 1.5rem; font-weight: 700;">{num_chunks}</div>
+                    </div>
+                    <div style="background: white; padding: 1rem; border-radius: 0.5rem;">
+                        <div style="color: {text_secondary}; font-size: 0.875rem;">Embeddings</div>
+                        <div style="color: {primary}; font-size: 1.5rem; font-weight: 700;">{num_embeddings}</div>
+                    </div>
+                </div>
+            </div>
+            """
+
+ERROR_TPL = """
+            <div style="
+                background: {error}15;
+                border-left: 4px solid {error};
+                padding: 1.5rem;
+                border-radius: 0.5rem;
+            ">
+                <strong style="color: {error};">Error:</strong> {message}
+            </div>
+            """
+
+CONFIRM_DELETE_TPL = """
+        <div style="
+            background: {warning}15;
+            border: 2px solid {warning};
+            border-radius: 0.75rem;
+            padding: 1.5rem;
+            margin: 1rem 0;
+        ">
+            <h4 style="color: {warning}; margin: 0 0 0.5rem 0;">⚠️ Confirm Deletion</h4>
+            <p style="margin: 0; color: {text_primary};">
+                Delete <strong>"{chapter_name}"</strong>?<br>
+                This will permanently remove: PDF, questions, attempts, RAG conversations, and embeddings.
+            </p>
+        </div>
+        """
+
+st.set_page_config(page_title="Upload PDF", page_icon="📤", layout="wide")
+init_session_state()
+
+# Apply global CSS
+st.markdown(get_global_css(), unsafe_allow_html=True)
+
+# Header
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
+
+storage = st.session_state.storage
+
+# Upload Section
+st.markdown(UPLOAD_SECTION_HTML, unsafe_allow_html=True)
 
 uploaded_file = st.file_uploader(
     "Choose a PDF file",
@@ -58,22 +170,10 @@ uploaded_file = st.file_uploader(
 )
 
 if uploaded_file:
-    st.markdown(f"""
-    <div style="
-        background: {COLORS['success']}15;
-        border-left: 4px solid {COLORS['success']};
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin: 1rem 0;
-    ">
-        <strong style="color: {COLORS['success']};">✓ File selected:</strong> {uploaded_file.name}
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(FILE_SELECTED_TPL.format_map({**COLORS, 'filename': uploaded_file.name}), unsafe_allow_html=True)
     
     # Metadata form
-    st.markdown(f"""
-    <h4 style="margin: 1.5rem 0 1rem 0; color: {COLORS['text_primary']};">Chapter Details</h4>
-    """, unsafe_allow_html=True)
+    st.markdown(CHAPTER_DETAILS_HTML, unsafe_allow_html=True)
     
     col1, col2 = st.columns(2)
     
@@ -100,17 +200,7 @@ if uploaded_file:
         progress_container = st.container()
         
         with progress_container:
-            st.markdown(f"""
-            <div style="
-                background: {COLORS['bg_primary']};
-                border: 1px solid {COLORS['border']};
-                border-radius: 1rem;
-                padding: 2rem;
-                margin: 1rem 0;
-            ">
-                <h4 style="margin: 0 0 1rem 0; color: {COLORS['text_primary']};">Processing PDF...</h4>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(PROCESSING_HTML, unsafe_allow_html=True)
             
             progress_bar = st.progress(0)
             status_text = st.empty()
@@ -120,38 +210,82 @@ if uploaded_file:
             chapter_id = len(chapters) + 1
             
             # Save PDF
-            status_text.markdown(f"**Step 1/4:** Saving PDF file...")
+            status_text.markdown(f"**Step 1/3:** Saving PDF file...")
             progress_bar.progress(10)
             
             pdf_path = settings.CHAPTERS_PATH / f"chapter_{chapter_id}.pdf"
             with open(pdf_path, 'wb') as f:
                 f.write(uploaded_file.getbuffer())
             
-            # Extract content
-            status_text.markdown(f"**Step 2/4:** Extracting text from PDF...")
+            # Extract content and generate embeddings
+            status_text.markdown(f"**Step 2/3:** Extracting text and generating embeddings...")
             progress_bar.progress(30)
             
             processor = LangchainPDFProcessor()
-            chunks = processor.process_pdf(pdf_path, chapter_id)
-            
-            # Generate embeddings
-            status_text.markdown(f"**Step 3/4:** Generating embeddings ({len(chunks)} chunks)...")
-            progress_bar.progress(60)
+            embedding_manager = get_embedding_manager()
+            embed_progress = {'done': 0, 'total': 0}  # Written on the loop thread
             
-            embedding_manager = EmbeddingManager()
-            chunk_texts = [chunk['text'] for chunk in chunks]
+            async def extract_and_embed():
+                # Pages are parsed one at a time on a worker thread, so the
+                # shared event loop keeps serving other sessions meanwhile.
+                # Each full batch of chunks is embedded while later pages are
+                # still being read; once EMBEDDING_MAX_CONCURRENCY batches are
+                # in flight, parsing waits for one to finish.
+                chunks = []
+                tasks = []
+                slots = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+                
+                async def embed(batch):
+                    try:
+                        return await embedding_manager.batch_embed([chunk['text'] for chunk in batch])
+                    finally:
+                        slots.release()
+                        embed_progress['done'] += 1
+                
+                async def submit(batch):
+                    await slots.acquire()
+                    embed_progress['total'] += 1
+                    tasks.append(asyncio.create_task(embed(batch)))
+                
+                pages = processor.iter_chunks(pdf_path, chapter_id)
+                pending = []
+                try:
+                    while (page_chunks := await asyncio.to_thread(next, pages, None)) is not None:
+                        chunks.extend(page_chunks)
+                        pending.extend(page_chunks)
+                        while len(pending) >= settings.EMBEDDING_BATCH_SIZE:
+                            await submit(pending[:settings.EMBEDDING_BATCH_SIZE])
+                            pending = pending[settings.EMBEDDING_BATCH_SIZE:]
+                    if pending:
+                        await submit(pending)
+                    results = await asyncio.gather(*tasks)
+                except BaseException:
+                    for task in tasks:
+                        task.cancel()
+                    raise
+                finally:
+                    pages.close()
+                
+                return chunks, np.concatenate(results) if results else []
             
-            async def get_embeddings():
-                return await embedding_manager.batch_embed(chunk_texts)
+            # The vector store (re)loads on this thread while the pipeline runs
+            ingest = submit_async(extract_and_embed())
+            vector_store = get_vector_store()
             
-            embeddings = asyncio.run(get_embeddings())
+            # Elements can only be updated from this thread, so poll the
+            # embedding batches' progress until the pipeline finishes
+            while True:
+                try:
+                    chunks, embeddings = ingest.result(timeout=0.25)
+                    break
+                except FutureTimeoutError:
+                    if embed_progress['total']:
+                        progress_bar.progress(30 + 55 * embed_progress['done'] // embed_progress['total'])
             
             # Store in vector database
-            status_text.markdown(f"**Step 4/4:** Storing in vector database...")
+            status_text.markdown(f"**Step 3/3:** Storing {len(chunks)} chunks in vector database...")
             progress_bar.progress(85)
             
-            vector_store = LocalVectorStore()
-            vector_store.load(settings.EMBEDDINGS_PATH)
             vector_store.add_embeddings(embeddings, chunks)
             vector_store.save(settings.EMBEDDINGS_PATH)
             
@@ -173,173 +307,112 @@ if uploaded_file:
             
             # Success message
             st.balloons()
-            st.markdown(f"""
-            <div style="
-                background: {COLORS['success']}15;
-                border: 2px solid {COLORS['success']};
-                border-radius: 1rem;
-                padding: 2rem;
-                margin: 1rem 0;
-            ">
-                <h3 style="color: {COLORS['success']}; margin: 0 0 1rem 0;">✓ Success!</h3>
-                <p style="margin: 0; color: {COLORS['text_primary']};">
-                    <strong>"{chapter_name}"</strong> processed successfully!
-                </p>
-                <div style="
-                    display: grid;
-                    grid-template-columns: repeat(2, 1fr);
-                    gap: 1rem;
-                    margin-top: 1rem;
-                ">
-                    <div style="background: white; padding: 1rem; border-radius: 0.5rem;">
-                        <div style="color: {COLORS['text_secondary']}; font-size: 0.875rem;">Text Chunks</div>
-                        <div style="color: {COLORS['primary']}; font-size: 1.5rem; font-weight: 700;">{len(chunks)}</div>
-                    </div>
-                    <div style="background: white; padding: 1rem; border-radius: 0.5rem;">
-                        <div style="color: {COLORS['text_secondary']}; font-size: 0.875rem;">Embeddings</div>
-                        <div style="color: {COLORS['primary']}; font-size: 1.5rem; font-weight: 700;">{len(embeddings)}</div>
-                    </div>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-            
+            st.markdown(SUCCESS_TPL.format_map({**COLORS, 'chapter_name': chapter_name, 'num_chunks': len(chunks), 'num_embeddings': len(embeddings)}), unsafe_allow_html=True)
+        
         except Exception as e:
             logger.error(f"Error processing PDF: {e}", exc_info=True)
-            st.markdown(f"""
-            <div style="
-                background: {COLORS['error']}15;
-                border-left: 4px solid {COLORS['error']};
-                padding: 1.5rem;
-                border-radius: 0.5rem;
-            ">
-                <strong style="color: {COLORS['error']};">Error:</strong> {str(e)}
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(ERROR_TPL.format_map({**COLORS, 'message': str(e)}), unsafe_allow_html=True)
 
 # Existing Chapters Section
 st.markdown("---")
-st.markdown(f"""
-<h2 style="color: {COLORS['text_primary']}; margin: 2rem 0 1rem 0;">📚 Your Chapters</h2>
-""", unsafe_allow_html=True)
+st.markdown(CHAPTERS_HEADING_HTML, unsafe_allow_html=True)
 
-chapters = storage.load('chapters')
+def render_stat(label, value, color, size, weight):
+    return f"""
+        <div style="text-align: center; flex: 1;">
+            <div style="color: {COLORS['text_secondary']}; font-size: 0.75rem;">{label}</div>
+            <div style="color: {color}; font-size: {size}; font-weight: {weight};">{value}</div>
+        </div>"""
 
-if chapters:
-    for chapter in chapters:
-        # Chapter card
-        st.markdown(f"""
-        <div style="
-            background: {COLORS['bg_primary']};
-            border: 1px solid {COLORS['border']};
-            border-radius: 1rem;
-            padding: 1.5rem;
-            margin-bottom: 1rem;
-            box-shadow: {COLORS['text_tertiary']}22 0 4px 6px;
-            transition: all 0.3s ease;
-        " onmouseover="this.style.boxShadow='0 8px 12px rgba(0,0,0,0.1)'" onmouseout="this.style.boxShadow='0 4px 6px rgba(0,0,0,0.05)'">
-            <div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 1rem;">
-                <div>
-                    <h3 style="margin: 0; color: {COLORS['text_primary']};">📖 {chapter['name']}</h3>
-                    <p style="margin: 0.5rem 0 0 0; color: {COLORS['text_secondary']}; font-size: 0.875rem;">
-                        {chapter.get('filename', 'Unknown file')}
-                    </p>
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-        
-        # Stats
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.markdown(f"""
-            <div style="text-align: center;">
-                <div style="color: {COLORS['text_secondary']}; font-size: 0.75rem;">CHUNKS</div>
-                <div style="color: {COLORS['primary']}; font-size: 1.5rem; font-weight: 700;">{chapter.get('num_chunks', 'N/A')}</div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(f"""
-            <div style="text-align: center;">
-                <div style="color: {COLORS['text_secondary']}; font-size: 0.75rem;">ID</div>
-                <div style="color: {COLORS['primary']}; font-size: 1.5rem; font-weight: 700;">{chapter['id']}</div>
+def render_chapter_card(chapter):
+    subject = render_stat('SUBJECT', chapter['subject'], COLORS['info'], '1rem', 600) if chapter.get('subject') else '<div style="flex: 1;"></div>'
+    year = render_stat('YEAR', chapter['year'], COLORS['info'], '1rem', 600) if chapter.get('year') else '<div style="flex: 1;"></div>'
+    return f"""
+    <div style="
+        background: {COLORS['bg_primary']};
+        border: 1px solid {COLORS['border']};
+        border-radius: 1rem;
+        padding: 1.5rem;
+        margin-bottom: 1rem;
+        box-shadow: {COLORS['text_tertiary']}22 0 4px 6px;
+        transition: all 0.3s ease;
+    " onmouseover="this.style.boxShadow='0 8px 12px rgba(0,0,0,0.1)'" onmouseout="this.style.boxShadow='0 4px 6px rgba(0,0,0,0.05)'">
+        <div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 1rem;">
+            <div>
+                <h3 style="margin: 0; color: {COLORS['text_primary']};">📖 {chapter['name']}</h3>
+                <p style="margin: 0.5rem 0 0 0; color: {COLORS['text_secondary']}; font-size: 0.875rem;">
+                    {chapter.get('filename', 'Unknown file')}
+                </p>
             </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            if chapter.get('subject'):
-                st.markdown(f"""
-                <div style="text-align: center;">
-                    <div style="color: {COLORS['text_secondary']}; font-size: 0.75rem;">SUBJECT</div>
-                    <div style="color: {COLORS['info']}; font-size: 1rem; font-weight: 600;">{chapter['subject']}</div>
-                </div>
-                """, unsafe_allow_html=True)
-        
-        with col4:
-            if chapter.get('year'):
-                st.markdown(f"""
-                <div style="text-align: center;">
-                    <div style="color: {COLORS['text_secondary']}; font-size: 0.75rem;">YEAR</div>
-                    <div style="color: {COLORS['info']}; font-size: 1rem; font-weight: 600;">{chapter['year']}</div>
-                </div>
-                """, unsafe_allow_html=True)
-        
-        st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Delete button
-        delete_col1, delete_col2 = st.columns([5, 1])
+        </div>
+        <div style="display: flex; gap: 1rem;">{render_stat('CHUNKS', chapter.get('num_chunks', 'N/A'), COLORS['primary'], '1.5rem', 700)}{render_stat('ID', chapter['id'], COLORS['primary'], '1.5rem', 700)}{subject}{year}
+        </div>
+    </div>"""
+
+CARD_FIELDS = ('id', 'name', 'filename', 'num_chunks', 'subject', 'year')
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def render_chapters_html(chapters_tuple: tuple) -> str:
+    """All chapter cards as one HTML string, rebuilt only when a displayed field changes"""
+    return "".join(render_chapter_card(dict(fields)) for fields in chapters_tuple)
+
+@st.fragment
+def chapters_section():
+    """Chapter list and delete flow; its widgets rerun only this section"""
+    chapters = load_cached(storage, 'chapters')
+    
+    if chapters:
+        # All cards go out in one markdown element, and a single form replaces
+        # the per-chapter delete buttons, so a rerun sends a fixed number of
+        # elements however many chapters there are. Only the fields a card shows
+        # go into the (hashed) cache key; absent ones are left out so the cards'
+        # defaults still apply.
+        chapters_tuple = tuple(
+            tuple((field, chapter[field]) for field in CARD_FIELDS if field in chapter)
+            for chapter in chapters
+        )
+        st.markdown(render_chapters_html(chapters_tuple), unsafe_allow_html=True)
         
-        with delete_col2:
-            if st.button("🗑️ Delete", key=f"delete_{chapter['id']}", type="secondary", use_container_width=True):
-                st.session_state[f'confirm_delete_{chapter["id"]}'] = True
+        with st.form("delete_form"):
+            delete_col1, delete_col2 = st.columns([5, 1])
+            
+            with delete_col1:
+                delete_choice = st.radio(
+                    "Chapter to delete",
+                    options=[chapter['id'] for chapter in chapters],
+                    format_func={c['id']: c['name'] for c in chapters}.get,
+                    horizontal=True,
+                    label_visibility="collapsed"
+                )
+            
+            with delete_col2:
+                if st.form_submit_button("🗑️ Delete", type="secondary", use_container_width=True):
+                    st.session_state.pending_delete_id = delete_choice
         
         # Confirmation dialog
-        if st.session_state.get(f'confirm_delete_{chapter["id"]}', False):
-            st.markdown(f"""
-            <div style="
-                background: {COLORS['warning']}15;
-                border: 2px solid {COLORS['warning']};
-                border-radius: 0.75rem;
-                padding: 1.5rem;
-                margin: 1rem 0;
-            ">
-                <h4 style="color: {COLORS['warning']}; margin: 0 0 0.5rem 0;">⚠️ Confirm Deletion</h4>
-                <p style="margin: 0; color: {COLORS['text_primary']};">
-                    Delete <strong>"{chapter['name']}"</strong>?<br>
-                    This will permanently remove: PDF, questions, attempts, RAG conversations, and embeddings.
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
+        chapter = next((c for c in chapters if c['id'] == st.session_state.get('pending_delete_id')), None)
+        if chapter:
+            st.markdown(CONFIRM_DELETE_TPL.format_map({**COLORS, 'chapter_name': chapter['name']}), unsafe_allow_html=True)
             
             confirm_col1, confirm_col2 = st.columns(2)
             
             with confirm_col1:
-                if st.button("✓ Yes, Delete", key=f"confirm_yes_{chapter['id']}", type="primary", use_container_width=True):
+                if st.button("✓ Yes, Delete", key="confirm_yes", type="primary", use_container_width=True):
                     with st.spinner("Deleting..."):
                         stats = cascade_delete_chapter(chapter['id'], storage)
                         
                         if stats['chapter_deleted']:
                             st.success(f"Chapter deleted: {stats['questions_deleted']} questions, {stats['attempts_deleted']} attempts removed")
-                            del st.session_state[f'confirm_delete_{chapter["id"]}']
-                            st.rerun()
+                            del st.session_state.pending_delete_id
+                            st.rerun(scope="fragment")
                         else:
                             st.error("Failed to delete chapter")
             
             with confirm_col2:
-                if st.button("✗ Cancel", key=f"confirm_no_{chapter['id']}", use_container_width=True):
-                    del st.session_state[f'confirm_delete_{chapter["id"]}']
-                    st.rerun()
-else:
-    st.markdown(f"""
-    <div style="
-        background: {COLORS['bg_secondary']};
-        border: 2px dashed {COLORS['border']};
-        border-radius: 1rem;
-        padding: 3rem;
-        text-align: center;
-    ">
-        <div style="font-size: 4rem; margin-bottom: 1rem;">📚</div>
-        <h3 style="color: {COLORS['text_secondary']};">No chapters uploaded yet</h3>
-        <p style="color: {COLORS['text_tertiary']};">Upload your first chapter above to get started</p>
-    </div>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+                if st.button("✗ Cancel", key="confirm_no", use_container_width=True):
+                    del st.session_state.pending_delete_id
+                    st.rerun(scope="fragment")
+    else:
+        st.markdown(EMPTY_CHAPTERS_HTML, unsafe_allow_html=True)
+
+chapters_section()
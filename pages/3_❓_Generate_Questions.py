@@ -1,10 +1,10 @@
 # pages/3_❓_Generate_Questions.py
 import streamlit as st
-import asyncio
-from core.agents.question_generator import QuestionGeneratorAgent
 from config import settings
 from utils.logger import setup_logger
 from utils.session_init import init_session_state
+from utils.resources import get_question_agent, iterate_async, run_async
+from utils.storage_cache import filter_cached, load_cached
 
 logger = setup_logger(__name__)
 
@@ -12,7 +12,17 @@ st.set_page_config(page_title="Generate Questions", page_icon="❓", layout="wid
 init_session_state()
 
 storage = st.session_state.storage
-chapters = storage.load('chapters')
+chapters = load_cached(storage, 'chapters')
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def read_image(path: str) -> bytes:
+    """Image file contents, read from disk once per path"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+# Name -> chapter lookups for the selectors (reversed so the first chapter
+# wins on duplicate names, as a front-to-back scan would)
+chapters_by_name = {c['name']: c for c in reversed(chapters)}
 
 st.title("❓ Generate Practice Questions")
 
@@ -67,7 +77,7 @@ with st.expander("⚡ Advanced Settings"):
 # Generate button
 if st.button("🎯 Generate Questions", type="primary", use_container_width=True):
     
-    chapter_id = next(c['id'] for c in chapters if c['name'] == selected_chapter)
+    chapter_id = chapters_by_name[selected_chapter]['id']
     
     with st.spinner("🔄 Generating questions..."):
         
@@ -75,10 +85,18 @@ if st.button("🎯 Generate Questions", type="primary", use_container_width=True
         status_container = st.empty()
         questions_container = st.container()
         
-        agent = QuestionGeneratorAgent()
+        agent = get_question_agent()
         generated_count = 0
         failed_count = 0
         
+        async def save_questions(questions):
+            # Runs on the agent's event loop, between generation steps, so
+            # tasks never read questions (file or cache) mid-update. One
+            # storage write per batch rather than one per question.
+            storage.extend('questions', questions)
+            for question in questions:
+                agent.nodes.record_question(question)
+        
         # Calculate batches
         total_batches = (num_questions + batch_size - 1) // batch_size
         
@@ -92,9 +110,10 @@ if st.button("🎯 Generate Questions", type="primary", use_container_width=True
                 f"({current_batch_size} questions simultaneously)..."
             )
             
-            # Use batch generation method
+            # Use batch generation method; questions arrive as each completes
+            batch_questions = []
             try:
-                batch_results = asyncio.run(
+                batch_results = iterate_async(
                     agent.generate_batch_questions(
                         chapter_id=chapter_id,
                         count=current_batch_size,
@@ -108,28 +127,38 @@ if st.button("🎯 Generate Questions", type="primary", use_container_width=True
                 for result in batch_results:
                     question_num = generated_count + 1
                     
-                    if result:
-                        # Save question
-                        storage.append('questions', result)
-                        generated_count += 1
-                        
-                        # Display preview
-                        with questions_container:
-                            with st.expander(f"✅ Question {question_num} - Preview"):
-                                st.markdown(f"**Q:** {result['question'][:150]}...")
-                                st.write(f"**Difficulty:** {result['difficulty']}")
-                                st.write(f"**Confidence:** {result.get('confidence_score', 'N/A')}%")
-                    else:
-                        failed_count += 1
-                        st.warning(f"⚠️ Failed to generate question {question_num}")
+                    # Saved together once the batch finishes
+                    batch_questions.append(result)
+                    generated_count += 1
+                    
+                    # Display preview
+                    with questions_container:
+                        with st.expander(f"✅ Question {question_num} - Preview"):
+                            st.markdown(f"**Q:** {result['question'][:150]}...")
+                            st.write(f"**Difficulty:** {result['difficulty']}")
+                            st.write(f"**Confidence:** {result.get('confidence_score', 'N/A')}%")
+                    
+                    # Update progress
+                    progress_bar.progress(generated_count / num_questions)
                 
             except Exception as e:
                 logger.error(f"Error in batch generation: {e}")
                 st.error(f"Batch {batch_num + 1} failed: {str(e)}")
-                failed_count += current_batch_size
             
-            # Update progress
-            progress_bar.progress(generated_count / num_questions)
+            # Questions completed before a failure are kept too
+            if batch_questions:
+                try:
+                    run_async(save_questions(batch_questions))
+                except Exception as e:
+                    logger.error(f"Error saving batch {batch_num + 1}: {e}")
+                    st.error(f"Saving batch {batch_num + 1} failed: {str(e)}")
+                    generated_count -= len(batch_questions)
+                    batch_questions = []
+            
+            batch_generated = len(batch_questions)
+            if batch_generated < current_batch_size:
+                failed_count += current_batch_size - batch_generated
+                st.warning(f"⚠️ Failed to generate {current_batch_size - batch_generated} question(s) in batch {batch_num + 1}")
         
         status_container.empty()
         
@@ -145,8 +174,8 @@ if st.button("🎯 Generate Questions", type="primary", use_container_width=True
 st.markdown("---")
 st.subheader("📝 Practice Mode")
 
-chapter_id = next(c['id'] for c in chapters if c['name'] == selected_chapter)
-chapter_questions = storage.filter('questions', chapter_id=chapter_id)
+chapter_id = chapters_by_name[selected_chapter]['id']
+chapter_questions = filter_cached(storage, 'questions', chapter_id=chapter_id)
 
 if not chapter_questions:
     st.info("No questions available. Generate some questions first!")
@@ -177,7 +206,12 @@ with col_nav2:
 
 # Show image if present
 if current_question.get('image_path'):
-    st.image(current_question['image_path'], width=500)
+    st.image(read_image(current_question['image_path']), width=500)
+
+# Warm the neighbouring questions' images so Previous/Next render from memory
+for neighbour_idx in (current_idx - 1, current_idx + 1):
+    if 0 <= neighbour_idx < total_questions and chapter_questions[neighbour_idx].get('image_path'):
+        read_image(chapter_questions[neighbour_idx]['image_path'])
 
 st.markdown(f"**{current_question['question']}**")
 
@@ -213,6 +247,7 @@ with col2:
             'is_correct': is_correct
         }
         
+        # attempts is JSON Lines, so this appends a single line
         storage.append('attempts', attempt)
 
 with col3:
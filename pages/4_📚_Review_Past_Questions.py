@@ -1,19 +1,203 @@
 # pages/4_📚_Review_Past_Questions.py
 import streamlit as st
-import pandas as pd
+import csv
+import io
 from datetime import datetime
 from config import settings
 from utils.logger import setup_logger
 from utils.session_init import init_session_state
 from utils.design_system import get_global_css, COLORS
+from utils.storage_cache import filter_cached, load_cached
 
 logger = setup_logger(__name__)
 
+REVIEW_PAGE_SIZE = 20  # Question cards rendered per page
+
+# CSV export columns, in order
+EXPORT_FIELDS = ['Date', 'Question', 'Your Answer', 'Correct Answer', 'Status', 'Difficulty', 'Question ID']
+
+# Review card styling is defined once as CSS classes, so each card's
+# markup only names classes instead of repeating inline styles
+STATUS_STYLES = {
+    True: ("correct", "✓", "Correct"),
+    False: ("incorrect", "✗", "Incorrect")
+}
+
+DIFFICULTY_COLORS = {
+    'Intermediate': COLORS['info'],
+    'Advanced': COLORS['warning'],
+    'Complex': COLORS['error']
+}
+
+# Fixed selector options (difficulty levels follow the card colors)
+STATUS_OPTIONS = ["All", "Correct", "Incorrect"]
+DIFFICULTY_OPTIONS = ["All", *DIFFICULTY_COLORS]
+
+DIFFICULTY_PILLS_CSS = "".join(
+    f".pill-{level.lower()} {{ background: {color}20; color: {color}; }}\n"
+    for level, color in DIFFICULTY_COLORS.items()
+)
+
+REVIEW_CSS = f"""
+<style>
+    /* Card header with difficulty and status pills */
+    .review-header {{
+        display: flex;
+        justify-content: space-between;
+        align-items: start;
+        border: 1px solid;
+        border-radius: 0.75rem;
+        padding: 1.5rem 1.5rem 1rem 1.5rem;
+        margin-bottom: 1rem;
+    }}
+    
+    .review-header.correct {{ background: {COLORS['success']}08; border-color: {COLORS['success']}40; }}
+    .review-header.incorrect {{ background: {COLORS['error']}08; border-color: {COLORS['error']}40; }}
+    
+    .review-date {{
+        color: {COLORS['text_tertiary']};
+        font-size: 0.875rem;
+    }}
+    
+    .pill {{
+        display: inline-block;
+        padding: 0.25rem 0.75rem;
+        border-radius: 1rem;
+        font-size: 0.75rem;
+        font-weight: 600;
+        margin: 0 0.5rem 0.5rem 0;
+        background: {COLORS['text_secondary']}20;
+        color: {COLORS['text_secondary']};
+    }}
+    
+    .pill-correct {{ background: {COLORS['success']}20; color: {COLORS['success']}; }}
+    .pill-incorrect {{ background: {COLORS['error']}20; color: {COLORS['error']}; }}
+    {DIFFICULTY_PILLS_CSS}
+    /* Question, options and answers */
+    .review-box {{
+        background: {COLORS['bg_primary']};
+        padding: 1rem;
+        border-radius: 0.5rem;
+        margin-bottom: 1rem;
+    }}
+    
+    .review-box h4 {{ color: {COLORS['text_primary']}; margin: 0 0 0.5rem 0; }}
+    .review-box p {{ color: {COLORS['text_primary']}; margin: 0; }}
+    
+    .review-options-heading {{ margin: 1rem 0 0.5rem 0; color: {COLORS['text_primary']}; }}
+    
+    .review-option {{
+        background: {COLORS['bg_primary']};
+        border: 2px solid {COLORS['border']};
+        border-radius: 0.5rem;
+        padding: 0.75rem 1rem;
+        margin-bottom: 0.5rem;
+    }}
+    
+    .review-option.correct {{ background: {COLORS['success']}15; border-color: {COLORS['success']}; }}
+    .review-option.wrong {{ background: {COLORS['error']}15; border-color: {COLORS['error']}; }}
+    
+    .review-summary {{
+        display: flex;
+        gap: 1rem;
+    }}
+    
+    .review-summary > div {{
+        background: {COLORS['bg_tertiary']};
+        padding: 1rem;
+        border-radius: 0.5rem;
+        text-align: center;
+        flex: 1;
+    }}
+    
+    .review-summary .label {{ color: {COLORS['text_secondary']}; font-size: 0.875rem; margin-bottom: 0.25rem; }}
+    .review-summary .value {{ color: {COLORS['primary']}; font-size: 1.5rem; font-weight: 700; }}
+    .review-summary .correct-answer {{ background: {COLORS['success']}15; }}
+    .review-summary .correct-answer .value {{ color: {COLORS['success']}; }}
+    
+    .review-explanation {{
+        background: {COLORS['info']}10;
+        border-left: 4px solid {COLORS['info']};
+        padding: 1rem;
+        border-radius: 0.5rem;
+        margin-top: 1rem;
+    }}
+    
+    .review-explanation h4 {{ color: {COLORS['info']}; margin: 0 0 0.5rem 0; }}
+    .review-explanation p {{ color: {COLORS['text_primary']}; margin: 0; line-height: 1.6; }}
+    
+    .review-references {{
+        background: {COLORS['bg_tertiary']};
+        padding: 1rem;
+        border-radius: 0.5rem;
+        margin-top: 1rem;
+    }}
+    
+    .review-references h4 {{ color: {COLORS['text_secondary']}; margin: 0 0 0.5rem 0; font-size: 0.875rem; }}
+    .review-references p {{ color: {COLORS['text_secondary']}; margin: 0; font-size: 0.875rem; }}
+</style>
+"""
+
+# Card markup as format_map templates
+CARD_HEADER_TPL = """
+<div class="review-header {status_class}">
+    <div>
+        <span class="pill pill-{difficulty_class}">{difficulty}</span>
+        <span class="pill pill-{status_class}">{status_icon} {status_text}</span>
+    </div>
+    <div class="review-date">{date}</div>
+</div>
+"""
+
+CARD_QUESTION_TPL = """
+<div class="review-box">
+    <h4>Question:</h4>
+    <p>{question}</p>
+</div>
+"""
+
+OPTIONS_HEADING_HTML = "<h4 class='review-options-heading'>Options:</h4>"
+
+OPTION_TPL = '<div class="review-option {option_class}"><strong>{icon} {key}.</strong> {value}</div>'
+
+# Option styles: (class, icon)
+CORRECT_OPTION = ("correct", "✓")
+WRONG_OPTION = ("wrong", "✗")
+PLAIN_OPTION = ("", "")
+
+CARD_SUMMARY_TPL = """
+<div class="review-summary">
+    <div>
+        <div class="label">Your Answer</div>
+        <div class="value">{your_answer}</div>
+    </div>
+    <div class="correct-answer">
+        <div class="label">Correct Answer</div>
+        <div class="value">{correct_answer}</div>
+    </div>
+</div>
+"""
+
+CARD_EXPLANATION_TPL = """
+<div class="review-explanation">
+    <h4>📚 Explanation</h4>
+    <p>{explanation}</p>
+</div>
+"""
+
+CARD_REFERENCES_TPL = """
+<div class="review-references">
+    <h4>📖 References</h4>
+    <p>{citations}</p>
+</div>
+"""
+
 st.set_page_config(page_title="Review Questions", page_icon="📚", layout="wide")
 init_session_state()
 
-# Apply global CSS
-st.markdown(get_global_css(), unsafe_allow_html=True)
+# Apply global and review card CSS in one element (each <style> block on
+# its own unindented line, so both parse as HTML)
+st.markdown(get_global_css().strip() + "\n" + REVIEW_CSS.strip(), unsafe_allow_html=True)
 
 # Header
 st.markdown(f"""
@@ -32,11 +216,17 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 storage = st.session_state.storage
-chapters = storage.load('chapters')
-questions = storage.load('questions')
-attempts = storage.load('attempts')
+chapters = load_cached(storage, 'chapters')
+questions = load_cached(storage, 'questions')
 
-if not attempts:
+# Name -> chapter lookups for the selectors (reversed so the first chapter
+# wins on duplicate names, as a front-to-back scan would)
+chapters_by_name = {c['name']: c for c in reversed(chapters)}
+chapter_options = ["All", *(c['name'] for c in chapters)]
+
+# Only the newest attempt is needed to know whether there is any history;
+# a JSON Lines file is read from its end and SQLite stops after one row
+if not storage.tail('attempts', 1):
     st.markdown(f"""
     <div style="
         background: {COLORS['bg_secondary']};
@@ -70,49 +260,54 @@ col1, col2, col3 = st.columns(3)
 with col1:
     filter_chapter = st.selectbox(
         "Chapter",
-        options=["All"] + [c['name'] for c in chapters]
+        options=chapter_options
     )
 
 with col2:
     filter_correctness = st.selectbox(
         "Status",
-        options=["All", "Correct", "Incorrect"]
+        options=STATUS_OPTIONS
     )
 
 with col3:
     filter_difficulty = st.selectbox(
         "Difficulty",
-        options=["All", "Intermediate", "Advanced", "Complex"]
+        options=DIFFICULTY_OPTIONS
     )
 
-# Apply filters
-filtered_attempts = attempts.copy()
+# Get question details: index questions by id in one pass (first wins, as
+# the old per-attempt scan did) instead of scanning them for every attempt
+questions_by_id = {}
+for q in questions:
+    questions_by_id.setdefault(q['id'], q)
 
+# A chapter filter is answered by the storage's chapter_id index, so only
+# that chapter's attempts are read; the other filters go in a single pass
 if filter_chapter != "All":
-    chapter_id = next(c['id'] for c in chapters if c['name'] == filter_chapter)
-    filtered_attempts = [a for a in filtered_attempts if a.get('chapter_id') == chapter_id]
-
-if filter_correctness != "All":
-    is_correct = filter_correctness == "Correct"
-    filtered_attempts = [a for a in filtered_attempts if a.get('is_correct') == is_correct]
-
-# Get question details
-review_data = []
-for attempt in filtered_attempts:
-    question = next((q for q in questions if q['id'] == attempt['question_id']), None)
-    if question:
-        if filter_difficulty != "All" and question.get('difficulty', '').title() != filter_difficulty:
-            continue
-        
-        review_data.append({
-            'Date': attempt.get('created_at', 'N/A')[:10],
-            'Question': question['question'][:100] + '...' if len(question['question']) > 100 else question['question'],
-            'Your Answer': attempt['user_answer'],
-            'Correct Answer': attempt['correct_answer'],
-            'Status': attempt['is_correct'],
-            'Difficulty': question.get('difficulty', 'N/A').title(),
-            'Question ID': question['id']
-        })
+    attempts = filter_cached(storage, 'attempts', chapter_id=chapters_by_name[filter_chapter]['id'])
+else:
+    attempts = load_cached(storage, 'attempts')
+
+is_correct = filter_correctness == "Correct"
+rows = [
+    (attempt, question)
+    for attempt in attempts
+    if (question := questions_by_id.get(attempt['question_id']))
+    and (filter_correctness == "All" or attempt.get('is_correct') == is_correct)
+    and (filter_difficulty == "All" or question.get('difficulty', '').title() == filter_difficulty)
+]
+
+review_data = [
+    {
+        'Date': attempt.get('created_at', 'N/A')[:10],
+        'Your Answer': attempt['user_answer'],
+        'Correct Answer': attempt['correct_answer'],
+        'Status': attempt['is_correct'],
+        'Difficulty': question.get('difficulty', 'N/A').title(),
+        'Question ID': question['id']
+    }
+    for attempt, question in rows
+]
 
 if not review_data:
     st.info("No questions match your filters")
@@ -131,192 +326,89 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+# Only one page of cards is rendered per rerun, however long the history
+num_pages = (len(review_data) + REVIEW_PAGE_SIZE - 1) // REVIEW_PAGE_SIZE
+page = 1
+if num_pages > 1:
+    page = st.number_input("Page", min_value=1, max_value=num_pages, value=1, help=f"{REVIEW_PAGE_SIZE} questions per page")
+page_start = (page - 1) * REVIEW_PAGE_SIZE
+
 # Display questions as cards
-for idx, data in enumerate(review_data):
-    # Determine colors based on status
-    if data['Status']:
-        status_color = COLORS['success']
-        status_icon = "✓"
-        status_text = "Correct"
-        card_bg = f"{COLORS['success']}08"
-    else:
-        status_color = COLORS['error']
-        status_icon = "✗"
-        status_text = "Incorrect"
-        card_bg = f"{COLORS['error']}08"
-    
-    # Difficulty badge color
-    diff_colors = {
-        'Intermediate': COLORS['info'],
-        'Advanced': COLORS['warning'],
-        'Complex': COLORS['error']
-    }
-    diff_color = diff_colors.get(data['Difficulty'], COLORS['text_secondary'])
+for idx, data in enumerate(review_data[page_start:page_start + REVIEW_PAGE_SIZE], start=page_start):
+    status_class, status_icon, status_text = STATUS_STYLES[bool(data['Status'])]
     
     with st.expander(f"{status_icon} Question {idx + 1} - {data['Difficulty']} ({data['Date']})", expanded=False):
-        st.markdown(f"""
-        <div style="
-            background: {card_bg};
-            border: 1px solid {status_color}40;
-            border-radius: 0.75rem;
-            padding: 1.5rem;
-        ">
-            <div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 1rem;">
-                <div style="flex: 1;">
-                    <div style="
-                        display: inline-block;
-                        background: {diff_color}20;
-                        color: {diff_color};
-                        padding: 0.25rem 0.75rem;
-                        border-radius: 1rem;
-                        font-size: 0.75rem;
-                        font-weight: 600;
-                        margin-bottom: 0.5rem;
-                    ">
-                        {data['Difficulty']}
-                    </div>
-                    <div style="
-                        display: inline-block;
-                        background: {status_color}20;
-                        color: {status_color};
-                        padding: 0.25rem 0.75rem;
-                        border-radius: 1rem;
-                        font-size: 0.75rem;
-                        font-weight: 600;
-                        margin-left: 0.5rem;
-                        margin-bottom: 0.5rem;
-                    ">
-                        {status_icon} {status_text}
-                    </div>
-                </div>
-                <div style="color: {COLORS['text_tertiary']}; font-size: 0.875rem;">
-                    {data['Date']}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-        
         # Get full question details
-        question = next(q for q in questions if q['id'] == data['Question ID'])
+        question = questions_by_id[data['Question ID']]
+        
+        card = {
+            'status_class': status_class,
+            'status_icon': status_icon,
+            'status_text': status_text,
+            # Unknown levels keep the plain grey .pill style
+            'difficulty_class': data['Difficulty'].lower() if data['Difficulty'] in DIFFICULTY_COLORS else 'other',
+            'difficulty': data['Difficulty'],
+            'date': data['Date'],
+            'question': question['question'],
+            'your_answer': data['Your Answer'],
+            'correct_answer': question['correct_answer'],
+            'explanation': question['explanation'],
+            'citations': ', '.join(question.get('citations') or [])
+        }
         
-        # Question text
-        st.markdown(f"""
-        <div style="
-            background: {COLORS['bg_primary']};
-            padding: 1rem;
-            border-radius: 0.5rem;
-            margin-bottom: 1rem;
-        ">
-            <h4 style="color: {COLORS['text_primary']}; margin: 0 0 0.5rem 0;">Question:</h4>
-            <p style="color: {COLORS['text_primary']}; margin: 0; font-size: 1rem;">
-                {question['question']}
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
+        # The card's HTML is collected and sent as one markdown element (two
+        # when an image, which can't be inline HTML, splits it). Parts are
+        # stripped so whitespace between them can't end the HTML block.
+        card_parts = [CARD_HEADER_TPL.format_map(card), CARD_QUESTION_TPL.format_map(card)]
         
         # Show image if present
         if question.get('image_path'):
+            st.markdown("".join(part.strip() for part in card_parts), unsafe_allow_html=True)
             st.image(question['image_path'], width=500)
+            card_parts = []
         
         # Options
-        st.markdown(f"<h4 style='margin: 1rem 0 0.5rem 0; color: {COLORS['text_primary']};'>Options:</h4>", unsafe_allow_html=True)
+        card_parts.append(OPTIONS_HEADING_HTML)
         
         for key, value in question['options'].items():
             if key == question['correct_answer']:
-                bg_color = f"{COLORS['success']}15"
-                border_color = COLORS['success']
-                icon = "✓"
-            elif key == data['Your Answer'] and key != question['correct_answer']:
-                bg_color = f"{COLORS['error']}15"
-                border_color = COLORS['error']
-                icon = "✗"
+                option_class, icon = CORRECT_OPTION
+            elif key == data['Your Answer']:
+                option_class, icon = WRONG_OPTION
             else:
-                bg_color = COLORS['bg_primary']
-                border_color = COLORS['border']
-                icon = ""
+                option_class, icon = PLAIN_OPTION
             
-            st.markdown(f"""
-            <div style="
-                background: {bg_color};
-                border: 2px solid {border_color};
-                border-radius: 0.5rem;
-                padding: 0.75rem 1rem;
-                margin-bottom: 0.5rem;
-            ">
-                <strong>{icon} {key}.</strong> {value}
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Answer summary
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown(f"""
-            <div style="
-                background: {COLORS['bg_tertiary']};
-                padding: 1rem;
-                border-radius: 0.5rem;
-                text-align: center;
-            ">
-                <div style="color: {COLORS['text_secondary']}; font-size: 0.875rem; margin-bottom: 0.25rem;">Your Answer</div>
-                <div style="color: {COLORS['primary']}; font-size: 1.5rem; font-weight: 700;">{data['Your Answer']}</div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(f"""
-            <div style="
-                background: {COLORS['success']}15;
-                padding: 1rem;
-                border-radius: 0.5rem;
-                text-align: center;
-            ">
-                <div style="color: {COLORS['text_secondary']}; font-size: 0.875rem; margin-bottom: 0.25rem;">Correct Answer</div>
-                <div style="color: {COLORS['success']}; font-size: 1.5rem; font-weight: 700;">{question['correct_answer']}</div>
-            </div>
-            """, unsafe_allow_html=True)
+            card_parts.append(OPTION_TPL.format_map({
+                'option_class': option_class,
+                'icon': icon,
+                'key': key,
+                'value': value
+            }))
         
-        # Explanation
-        st.markdown(f"""
-        <div style="
-            background: {COLORS['info']}10;
-            border-left: 4px solid {COLORS['info']};
-            padding: 1rem;
-            border-radius: 0.5rem;
-            margin-top: 1rem;
-        ">
-            <h4 style="color: {COLORS['info']}; margin: 0 0 0.5rem 0;">📚 Explanation</h4>
-            <p style="color: {COLORS['text_primary']}; margin: 0; line-height: 1.6;">
-                {question['explanation']}
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
+        # Answer summary and explanation
+        card_parts.append(CARD_SUMMARY_TPL.format_map(card))
+        card_parts.append(CARD_EXPLANATION_TPL.format_map(card))
         
         # References
         if question.get('citations'):
-            st.markdown(f"""
-            <div style="
-                background: {COLORS['bg_tertiary']};
-                padding: 1rem;
-                border-radius: 0.5rem;
-                margin-top: 1rem;
-            ">
-                <h4 style="color: {COLORS['text_secondary']}; margin: 0 0 0.5rem 0; font-size: 0.875rem;">📖 References</h4>
-                <p style="color: {COLORS['text_secondary']}; margin: 0; font-size: 0.875rem;">
-                    {', '.join(question.get('citations', ['No citations']))}
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
+            card_parts.append(CARD_REFERENCES_TPL.format_map(card))
         
-        st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown("".join(part.strip() for part in card_parts), unsafe_allow_html=True)
 
 # Export option
 st.markdown("---")
 if st.button("📥 Export to CSV", type="secondary"):
-    df_export = pd.DataFrame(review_data)
-    csv = df_export.to_csv(index=False)
+    # Rows are written straight into one buffer; no DataFrame needed. The
+    # shortened question text is only built here, for the export.
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in review_data:
+        text = questions_by_id[row['Question ID']]['question']
+        writer.writerow({**row, 'Question': text[:100] + '...' if len(text) > 100 else text})
     st.download_button(
         label="Download CSV",
-        data=csv,
+        data=buffer.getvalue().encode('utf-8'),
         file_name=f"question_review_{datetime.now().strftime('%Y%m%d')}.csv",
         mime="text/csv"
     )
\ No newline at end of file
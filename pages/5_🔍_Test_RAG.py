@@ -1,25 +1,28 @@
 # pages/5_🔍_Test_RAG.py
 import streamlit as st
-import asyncio
-from storage.vector_store import LocalVectorStore
-from core.embeddings import EmbeddingManager
-from openai import AsyncOpenAI
+import numpy as np
+from core.openai_client import get_openai_client
 from config import settings
 from utils.logger import setup_logger
 from utils.session_init import init_session_state
 from utils.design_system import get_global_css, COLORS
+from utils.resources import get_embedding_manager, get_vector_store, iterate_async
+from utils.storage_cache import load_cached
 from datetime import datetime
 
 logger = setup_logger(__name__)
 
-st.set_page_config(page_title="RAG Q&A", page_icon="🔍", layout="wide")
-init_session_state()
+RAG_SYSTEM_PROMPT = """You are a medical education assistant. Provide clear, accurate answers based on the textbook content provided.
 
-# Apply global CSS
-st.markdown(get_global_css(), unsafe_allow_html=True)
+Guidelines:
+- Answer directly and comprehensively
+- Cite sources naturally (e.g., "According to page 45..." or "As mentioned in the text...")
+- Use appropriate medical terminology
+- If the context doesn't fully answer the question, mention what information is available
+- Keep answers focused and educational"""
 
-# Additional chat-specific CSS
-st.markdown(f"""
+# Chat-specific CSS, formatted once at import
+CHAT_CSS = f"""
 <style>
     /* Chat container */
     .chat-container {{
@@ -62,10 +65,21 @@ st.markdown(f"""
         box-shadow: 0 0 0 3px rgba(79, 70, 229, 0.1);
     }}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.set_page_config(page_title="RAG Q&A", page_icon="🔍", layout="wide")
+init_session_state()
+
+# Apply global and chat CSS in one element (each <style> block on its own
+# unindented line, so both parse as HTML)
+st.markdown(get_global_css().strip() + "\n" + CHAT_CSS.strip(), unsafe_allow_html=True)
 
 storage = st.session_state.storage
-chapters = storage.load('chapters')
+chapters = load_cached(storage, 'chapters')
+
+# Name -> chapter lookups for the selectors (reversed so the first chapter
+# wins on duplicate names, as a front-to-back scan would)
+chapters_by_name = {c['name']: c for c in reversed(chapters)}
 
 if not chapters:
     st.markdown(f"""
@@ -83,10 +97,10 @@ if not chapters:
     """, unsafe_allow_html=True)
     st.stop()
 
-# Initialize vector store and OpenAI client
-vector_store = LocalVectorStore()
-vector_store.load(settings.EMBEDDINGS_PATH)
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+# Initialize vector store, embedding manager and OpenAI client
+vector_store = get_vector_store()
+embedding_manager = get_embedding_manager()
+client = get_openai_client()
 
 # Initialize session state
 if 'rag_messages' not in st.session_state:
@@ -96,9 +110,9 @@ if 'selected_rag_chapter' not in st.session_state:
     
     if chapters:
         chapter_id = chapters[0]['id']
-        previous_conversations = storage.filter('rag_conversations', chapter_id=chapter_id)
+        previous_conversations = storage.tail('rag_conversations', 10, chapter_id=chapter_id)
         
-        for conv in previous_conversations[-10:]:
+        for conv in previous_conversations:
             st.session_state.rag_messages.append({
                 "role": "user",
                 "content": conv['user_message'],
@@ -112,7 +126,7 @@ if 'selected_rag_chapter' not in st.session_state:
 
 # Sidebar
 with st.sidebar:
-    
+
     st.markdown("### Settings")
     
     selected_chapter = st.selectbox(
@@ -126,13 +140,14 @@ with st.sidebar:
     if selected_chapter != st.session_state.selected_rag_chapter:
         st.session_state.selected_rag_chapter = selected_chapter
         
-        chapter = next(c for c in chapters if c['name'] == selected_chapter)
+        chapter = chapters_by_name[selected_chapter]
         chapter_id = chapter['id']
         
-        previous_conversations = storage.filter('rag_conversations', chapter_id=chapter_id)
+        # Only the last 10 exchanges are read, not the whole history
+        previous_conversations = storage.tail('rag_conversations', 10, chapter_id=chapter_id)
         
         st.session_state.rag_messages = []
-        for conv in previous_conversations[-10:]:
+        for conv in previous_conversations:
             st.session_state.rag_messages.append({
                 "role": "user",
                 "content": conv['user_message'],
@@ -200,13 +215,35 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+def get_answer_cache(chapter_id: int, num_chunks: int, temperature: float) -> dict:
+    """This session's answered questions for a chapter, context size and temperature"""
+    caches = st.session_state.setdefault('rag_answer_cache', {})
+    return caches.setdefault((chapter_id, num_chunks, temperature), {'vectors': [], 'answers': [], 'matrix': None})
+
 # Function to generate RAG answer
-async def generate_rag_answer(question: str, chapter_id: int, num_chunks: int, temperature: float):
-    """Generate answer using RAG approach"""
+async def stream_rag_answer(question: str, chapter_id: int, num_chunks: int, temperature: float, cache: dict, result: dict):
+    """
+    Generate an answer using the RAG approach, yielding text as it arrives
     
-    embedding_manager = EmbeddingManager()
+    The retrieved sources are stored in result['sources'].
+    """
+    result['sources'] = []
     query_embedding = await embedding_manager.embed_text(question)
     
+    # A question close enough to one already answered (e.g. a rephrasing)
+    # reuses that answer instead of another completion call
+    query_vector = np.asarray(query_embedding, dtype='float32')
+    if cache['answers']:
+        if cache['matrix'] is None:  # rebuilt only after new answers
+            cache['matrix'] = np.vstack(cache['vectors'])
+        scores = cache['matrix'] @ query_vector
+        best = int(scores.argmax())
+        if scores[best] >= settings.RAG_ANSWER_CACHE_SIMILARITY:
+            logger.info(f"Reusing cached answer (similarity {scores[best]:.3f})")
+            answer, result['sources'] = cache['answers'][best]
+            yield answer
+            return
+    
     search_results = vector_store.search(
         query_embedding,
         k=num_chunks,
@@ -214,26 +251,18 @@ async def generate_rag_answer(question: str, chapter_id: int, num_chunks: int, t
     )
     
     if not search_results:
-        return "I couldn't find any relevant information in this chapter to answer your question. Try rephrasing or asking about a different topic.", []
+        yield "I couldn't find any relevant information in this chapter to answer your question. Try rephrasing or asking about a different topic."
+        return
     
     context_parts = []
-    for i, result in enumerate(search_results, 1):
-        chunk = result['metadata']
+    for i, search_result in enumerate(search_results, 1):
+        chunk = search_result['metadata']
         context_parts.append(
             f"[Source {i} - Page {chunk['page_number']}]\n{chunk['text']}"
         )
     
     combined_context = "\n\n".join(context_parts)
     
-    system_prompt = """You are a medical education assistant. Provide clear, accurate answers based on the textbook content provided.
-
-Guidelines:
-- Answer directly and comprehensively
-- Cite sources naturally (e.g., "According to page 45..." or "As mentioned in the text...")
-- Use appropriate medical terminology
-- If the context doesn't fully answer the question, mention what information is available
-- Keep answers focused and educational"""
-
     user_prompt = f"""Question: {question}
 
 Context from textbook:
@@ -241,19 +270,29 @@ Context from textbook:
 
 Provide a clear, comprehensive answer based on this context."""
 
-    response = await client.chat.completions.create(
+    # Streamed, so the first tokens show while the rest is generated
+    stream = await client.chat.completions.create(
         model=settings.LLM_MODEL,
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": RAG_SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ],
         temperature=temperature,
-        max_tokens=1500
+        max_tokens=1500,
+        stream=True
     )
     
-    answer = response.choices[0].message.content
+    answer_parts = []
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            answer_parts.append(delta)
+            yield delta
     
-    return answer, search_results
+    result['sources'] = search_results
+    cache['vectors'].append(query_vector)
+    cache['answers'].append(("".join(answer_parts), search_results))
+    cache['matrix'] = None
 
 # Display chat messages
 chat_container = st.container()
@@ -296,8 +335,8 @@ with chat_container:
 
 # Chat input
 if prompt := st.chat_input("Ask a question about this chapter..."):
-    
-    chapter = next(c for c in chapters if c['name'] == st.session_state.selected_rag_chapter)
+
+    chapter = chapters_by_name[st.session_state.selected_rag_chapter]
     chapter_id = chapter['id']
     
     st.session_state.rag_messages.append({
@@ -312,11 +351,12 @@ if prompt := st.chat_input("Ask a question about this chapter..."):
     with st.chat_message("assistant"):
         with st.spinner("Thinking..."):
             try:
-                answer, sources = asyncio.run(
-                    generate_rag_answer(prompt, chapter_id, num_chunks, temperature)
-                )
-                
-                st.markdown(answer)
+                result = {}
+                answer = st.write_stream(iterate_async(stream_rag_answer(
+                    prompt, chapter_id, num_chunks, temperature,
+                    get_answer_cache(chapter_id, num_chunks, temperature), result
+                )))
+                sources = result['sources']
                 
                 assistant_msg = {
                     "role": "assistant",
@@ -334,7 +374,7 @@ if prompt := st.chat_input("Ask a question about this chapter..."):
                 })
                 
                 st.rerun()
-                
+            
             except Exception as e:
                 logger.error(f"Error generating answer: {e}")
                 error_msg = f"Sorry, I encountered an error: {str(e)}"
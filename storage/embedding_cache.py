@@ -0,0 +1,57 @@
+# storage/embedding_cache.py
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class EmbeddingCache:
+    """SQLite-backed store of embeddings keyed by content hash, persisted across restarts"""
+    
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        with self._connect() as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, embedding BLOB NOT NULL)"
+            )
+    
+    def _connect(self) -> closing:
+        # Short-lived connections so calls are safe from worker threads
+        return closing(sqlite3.connect(self.db_path))
+    
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Look up embeddings for keys (missing keys are simply absent)"""
+        found = {}
+        try:
+            with self._connect() as conn:
+                # Stay well under SQLite's bound-parameter limit
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    placeholders = ", ".join("?" * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype='float32')
+        except Exception as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+        return found
+    
+    def put_many(self, embeddings: Dict[str, np.ndarray]) -> None:
+        """Store embeddings (float32) under their keys"""
+        try:
+            with self._connect() as conn, conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                    [
+                        (key, np.asarray(embedding, dtype='float32').tobytes())
+                        for key, embedding in embeddings.items()
+                    ]
+                )
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
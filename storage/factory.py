@@ -0,0 +1,20 @@
+# storage/factory.py
+from pathlib import Path
+from typing import Optional, Union
+from config import settings
+from storage.json_store import JSONStorage
+from storage.sqlite_store import SQLiteStorage
+
+# Either backend: both expose the same load/save/append/filter interface
+Storage = Union[JSONStorage, SQLiteStorage]
+
+def create_storage(cache_path: Optional[Path] = None) -> Storage:
+    """Create the storage backend selected by settings.STORAGE_BACKEND"""
+    cache_path = cache_path or settings.CACHE_PATH
+    
+    if settings.STORAGE_BACKEND == "sqlite":
+        return SQLiteStorage(cache_path)
+    if settings.STORAGE_BACKEND == "json":
+        return JSONStorage(cache_path)
+    
+    raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
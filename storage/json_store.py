@@ -1,60 +1,195 @@
 # storage/json_store.py
-import json
+import orjson
+import os
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional
 from datetime import datetime
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Append-only collections stored as JSON Lines (one record per line), so an
+# append writes just the new line and recent records can be read from the end
+JSONL_COLLECTIONS = {'attempts', 'rag_conversations'}
+
+# numpy scalars/arrays (e.g. similarity scores) serialize as numbers, not via default=str
+_DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# Parsed file contents shared by every JSONStorage in the process, keyed by
+# path and valid while the file's (mtime, size) is unchanged. Streamlit
+# reruns reload the same collections on every interaction; this skips the
+# read and parse unless something wrote the file in between.
+_CACHE: Dict[Path, tuple] = {}
+
+# Field value -> records lookups over cached file contents, keyed by
+# (path, field) and tied to the parsed list they were built from, so
+# filter() on e.g. chapter_id touches only the matching records
+_INDEXES: Dict[tuple, tuple] = {}
+
+def _copy_items(data: Any) -> Any:
+    """Deep copy of parsed JSON, so callers can't change the cached records"""
+    # Only dicts and lists nest in parsed JSON (records' options,
+    # citations, ...; chunk_quality is stored as one dict)
+    if isinstance(data, dict):
+        return {key: _copy_items(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_copy_items(value) for value in data]
+    return data
+
+def _jsonl_line(item: Dict[str, Any]) -> bytes:
+    return orjson.dumps(item, default=str, option=_DUMPS_OPTIONS) + b"\n"
+
+def _reverse_lines(file_path: Path, block_size: int = 1 << 16) -> Iterator[bytes]:
+    """Non-empty lines of a file, last first, reading backwards in blocks"""
+    with open(file_path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        partial = b""
+        while pos > 0:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + partial).split(b"\n")
+            partial = lines.pop(0)  # may continue in the previous block
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if partial:
+            yield partial
+
 class JSONStorage:
     """Thread-safe JSON storage manager"""
     
     def __init__(self, cache_path: Path):
         self.cache_path = cache_path
         self.cache_path.mkdir(parents=True, exist_ok=True)
+        self._migrate_to_jsonl()
         
     def _get_file_path(self, filename: str) -> Path:
-        """Get full path for a JSON file"""
-        if not filename.endswith('.json'):
-            filename = f"{filename}.json"
-        return self.cache_path / filename
+        """Get full path for a JSON (or JSON Lines) file"""
+        name = filename[:-5] if filename.endswith('.json') else filename
+        suffix = '.jsonl' if name in JSONL_COLLECTIONS else '.json'
+        return self.cache_path / f"{name}{suffix}"
     
-    def load(self, filename: str) -> List[Dict[str, Any]]:
-        """Load data from JSON file"""
+    def _migrate_to_jsonl(self) -> None:
+        """Rewrite JSON files of JSON Lines collections in the new layout"""
+        for name in JSONL_COLLECTIONS:
+            json_path = self.cache_path / f"{name}.json"
+            if not json_path.exists() or self._get_file_path(name).exists():
+                continue
+            try:
+                data = orjson.loads(json_path.read_bytes())
+            except orjson.JSONDecodeError as e:
+                logger.error(f"Error decoding {json_path.name} for migration: {e}")
+                continue
+            if self.save(name, data):
+                json_path.unlink()
+                logger.info(f"Migrated {json_path.name} to JSON Lines")
+    
+    def get_mtime(self, filename: str) -> int:
+        """Get last modification time of a JSON file in ns (0 if missing)"""
+        try:
+            return self._get_file_path(filename).stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+    
+    def _read(self, filename: str) -> List[Dict[str, Any]]:
+        """Parsed file contents from the shared cache - not to be mutated"""
         file_path = self._get_file_path(filename)
         
-        if not file_path.exists():
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
             logger.info(f"File {filename} does not exist, returning empty list")
             return []
         
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = _CACHE.get(file_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            if file_path.suffix == '.jsonl':
+                data = [orjson.loads(line) for line in file_path.read_bytes().splitlines() if line]
+            else:
+                data = orjson.loads(file_path.read_bytes())
+            _CACHE[file_path] = (key, data)
             logger.info(f"Loaded {len(data)} records from {filename}")
             return data
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Error decoding JSON from {filename}: {e}")
             return []
         except Exception as e:
             logger.error(f"Error loading {filename}: {e}")
             return []
     
+    def load(self, filename: str) -> List[Dict[str, Any]]:
+        """Load data from JSON file"""
+        return _copy_items(self._read(filename))
+    
+    @staticmethod
+    def _unchanged(file_path: Path, content: bytes) -> bool:
+        """Whether the file already holds exactly content (size checked first)"""
+        try:
+            if file_path.stat().st_size != len(content):
+                return False
+            return file_path.read_bytes() == content
+        except FileNotFoundError:
+            return False
+    
     def save(self, filename: str, data: List[Dict[str, Any]]) -> bool:
         """Save data to JSON file"""
         file_path = self._get_file_path(filename)
         
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+            # orjson emits UTF-8 bytes directly - one write, no text encoding layer
+            if file_path.suffix == '.jsonl':
+                content = b"".join(map(_jsonl_line, data))
+            else:
+                content = orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2 | _DUMPS_OPTIONS)
+            
+            if self._unchanged(file_path, content):
+                logger.info(f"{filename} unchanged, skipping write")
+            else:
+                # Write beside the file and swap it in, so a crash mid-write
+                # never leaves a truncated file behind
+                tmp_path = file_path.with_suffix(file_path.suffix + '.tmp')
+                tmp_path.write_bytes(content)
+                os.replace(tmp_path, file_path)
+            stat = file_path.stat()
+            _CACHE[file_path] = ((stat.st_mtime_ns, stat.st_size), _copy_items(data))
             logger.info(f"Saved {len(data)} records to {filename}")
             return True
         except Exception as e:
             logger.error(f"Error saving {filename}: {e}")
             return False
     
+    def save_many(self, collections: Dict[str, List[Dict[str, Any]]]) -> bool:
+        """Save several collections (each file is replaced atomically)"""
+        return all([self.save(filename, data) for filename, data in collections.items()])
+    
+    def _append_lines(self, file_path: Path, data: List[Dict[str, Any]], items: List[Dict[str, Any]]) -> None:
+        """Write items to the end of a JSON Lines file and extend its cached contents"""
+        cached = _CACHE.get(file_path)
+        with open(file_path, 'ab') as f:
+            f.write(b"".join(map(_jsonl_line, items)))
+        
+        # data was the cached parse the ids were based on: the cache is still
+        # complete with the new items added (a new list, so indexes rebuild)
+        if cached is not None and cached[1] is data:
+            stat = file_path.stat()
+            _CACHE[file_path] = ((stat.st_mtime_ns, stat.st_size), data + _copy_items(items))
+    
     def append(self, filename: str, item: Dict[str, Any]) -> Dict[str, Any]:
         """Append item to JSON file"""
+        file_path = self._get_file_path(filename)
+        if file_path.suffix == '.jsonl':
+            data = self._read(filename)
+            item['id'] = len(data) + 1
+            item['created_at'] = datetime.now().isoformat()
+            self._append_lines(file_path, data, [item])
+            logger.info(f"Appended item with id {item['id']} to {filename}")
+            return item
+        
         data = self.load(filename)
         
         # Add metadata
@@ -67,6 +202,26 @@ class JSONStorage:
         logger.info(f"Appended item with id {item['id']} to {filename}")
         return item
     
+    def extend(self, filename: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Append several items with a single read and write of the JSON file"""
+        file_path = self._get_file_path(filename)
+        data = self._read(filename) if file_path.suffix == '.jsonl' else self.load(filename)
+        now = datetime.now().isoformat()
+        
+        # Add metadata
+        for offset, item in enumerate(items, start=len(data) + 1):
+            item['id'] = offset
+            item['created_at'] = now
+        
+        if file_path.suffix == '.jsonl':
+            self._append_lines(file_path, data, items)
+        else:
+            data.extend(items)
+            self.save(filename, data)
+        
+        logger.info(f"Appended {len(items)} items to {filename}")
+        return items
+    
     def update(self, filename: str, item_id: int, updates: Dict[str, Any]) -> bool:
         """Update an existing item"""
         data = self.load(filename)
@@ -84,15 +239,69 @@ class JSONStorage:
     
     def get_by_id(self, filename: str, item_id: int) -> Optional[Dict[str, Any]]:
         """Get item by ID"""
-        data = self.load(filename)
-        return next((item for item in data if item.get('id') == item_id), None)
+        matches = self._index(filename, 'id').get(item_id)
+        return _copy_items(matches[0]) if matches else None
+    
+    def get_many(self, filename: str, item_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get several items by ID in one pass, in the order of item_ids"""
+        by_id = self._index(filename, 'id')
+        return [_copy_items(by_id[item_id][0]) for item_id in item_ids if item_id in by_id]
+    
+    def _index(self, filename: str, key: str) -> Dict[Any, List[Dict[str, Any]]]:
+        """Records grouped by their value of key, rebuilt when the file changes"""
+        data = self._read(filename)
+        index_key = (self._get_file_path(filename), key)
+        cached = _INDEXES.get(index_key)
+        if cached is not None and cached[0] is data:
+            return cached[1]
+        
+        index: Dict[Any, List[Dict[str, Any]]] = {}
+        for item in data:
+            index.setdefault(item.get(key), []).append(item)
+        _INDEXES[index_key] = (data, index)
+        return index
     
     def filter(self, filename: str, **filters) -> List[Dict[str, Any]]:
         """Filter items by criteria"""
-        data = self.load(filename)
+        if not filters:
+            return self.load(filename)
+        
+        # The first criterion is answered from the index, the rest narrow its hits
+        (first_key, first_value), *rest = filters.items()
+        try:
+            result = self._index(filename, first_key).get(first_value, [])
+        except TypeError:  # unhashable value in the data or the query
+            result = [item for item in self._read(filename) if item.get(first_key) == first_value]
         
-        result = data
-        for key, value in filters.items():
+        for key, value in rest:
             result = [item for item in result if item.get(key) == value]
         
-        return result
\ No newline at end of file
+        return _copy_items(result)
+    
+    def tail(self, filename: str, n: int, **filters) -> List[Dict[str, Any]]:
+        """
+        Last n items matching the filters, oldest first
+        
+        A JSON Lines file not already cached is read backwards from its end
+        and parsing stops once n matches are found.
+        """
+        file_path = self._get_file_path(filename)
+        cached = _CACHE.get(file_path)
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            return []
+        
+        if file_path.suffix != '.jsonl' or (cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size)):
+            return self.filter(filename, **filters)[-n:] if n > 0 else []
+        
+        result = []
+        for line in _reverse_lines(file_path):
+            if len(result) >= n:
+                break
+            item = orjson.loads(line)
+            if all(item.get(key) == value for key, value in filters.items()):
+                result.append(item)
+        
+        result.reverse()
+        return result
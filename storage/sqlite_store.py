@@ -0,0 +1,285 @@
+# storage/sqlite_store.py
+import orjson
+import re
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def _dumps(data: Any) -> str:
+    return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+
+class SQLiteStorage:
+    """SQLite-backed drop-in for JSONStorage with indexed id/chapter_id lookups"""
+    
+    def __init__(self, cache_path: Path, db_name: str = "storage.db"):
+        self.cache_path = cache_path
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_path / db_name
+        
+        with self._connect() as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS _documents (name TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS _migrated (name TEXT PRIMARY KEY)")
+        
+        self._migrate_json_files()
+    
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per operation keeps this safe to call
+        # from worker threads (asyncio.to_thread)
+        return closing(sqlite3.connect(self.db_path))
+    
+    def _table(self, filename: str) -> str:
+        """Map a JSONStorage filename to a table name"""
+        name = filename[:-5] if filename.endswith('.json') else filename
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid collection name: {filename}")
+        return name
+    
+    def _ensure_table(self, conn: sqlite3.Connection, table: str) -> None:
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS "{table}" '
+            f'(item_id INTEGER, chapter_id INTEGER, data TEXT NOT NULL)'
+        )
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_item_id" ON "{table}"(item_id)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_chapter_id" ON "{table}"(chapter_id)')
+    
+    @staticmethod
+    def _row(item: Dict[str, Any]) -> tuple:
+        return (
+            item.get('id'),
+            item.get('chapter_id'),
+            _dumps(item)
+        )
+    
+    def _migrate_json_files(self) -> None:
+        """Import existing JSON (and JSON Lines) collections once so switching backends keeps the data"""
+        for json_path in sorted([*self.cache_path.glob("*.json"), *self.cache_path.glob("*.jsonl")]):
+            name = json_path.stem
+            if not _NAME_RE.match(name):
+                continue
+            
+            with self._connect() as conn, conn:
+                if conn.execute("SELECT 1 FROM _migrated WHERE name = ?", (name,)).fetchone():
+                    continue
+                
+                try:
+                    if json_path.suffix == '.jsonl':
+                        data = [orjson.loads(line) for line in json_path.read_bytes().splitlines() if line]
+                    else:
+                        data = orjson.loads(json_path.read_bytes())
+                except Exception as e:
+                    logger.error(f"Error reading {json_path} for migration: {e}")
+                    continue
+                
+                self._write(conn, name, data)
+                conn.execute("INSERT INTO _migrated (name) VALUES (?)", (name,))
+                logger.info(f"Migrated {json_path.name} into {self.db_path.name}")
+    
+    def _write(self, conn: sqlite3.Connection, table: str, data: Any) -> None:
+        """Replace a collection's contents (lists become rows, anything else a document)"""
+        self._ensure_table(conn, table)
+        conn.execute(f'DELETE FROM "{table}"')
+        conn.execute("DELETE FROM _documents WHERE name = ?", (table,))
+        
+        if isinstance(data, list):
+            conn.executemany(
+                f'INSERT INTO "{table}" (item_id, chapter_id, data) VALUES (?, ?, ?)',
+                [self._row(item) for item in data]
+            )
+        else:
+            conn.execute(
+                "INSERT INTO _documents (name, data) VALUES (?, ?)",
+                (table, _dumps(data))
+            )
+    
+    def _select(self, table: str, where: str = "", params: tuple = (), order: str = "ORDER BY rowid") -> List[Dict[str, Any]]:
+        with self._connect() as conn, conn:
+            self._ensure_table(conn, table)
+            rows = conn.execute(
+                f'SELECT data FROM "{table}" {where} {order}', params
+            ).fetchall()
+        return [orjson.loads(row[0]) for row in rows]
+    
+    def get_mtime(self, filename: str) -> int:
+        """Get last modification time of the database in ns (0 if missing)"""
+        try:
+            return self.db_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+    
+    def load(self, filename: str) -> List[Dict[str, Any]]:
+        """Load a whole collection"""
+        table = self._table(filename)
+        
+        try:
+            with self._connect() as conn:
+                doc = conn.execute(
+                    "SELECT data FROM _documents WHERE name = ?", (table,)
+                ).fetchone()
+            if doc:
+                return orjson.loads(doc[0])
+            
+            data = self._select(table)
+            logger.info(f"Loaded {len(data)} records from {filename}")
+            return data
+        except Exception as e:
+            logger.error(f"Error loading {filename}: {e}")
+            return []
+    
+    def save(self, filename: str, data: List[Dict[str, Any]]) -> bool:
+        """Replace a collection's contents"""
+        table = self._table(filename)
+        
+        try:
+            with self._connect() as conn, conn:
+                self._write(conn, table, data)
+            logger.info(f"Saved {len(data)} records to {filename}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving {filename}: {e}")
+            return False
+    
+    def save_many(self, collections: Dict[str, List[Dict[str, Any]]]) -> bool:
+        """Replace several collections' contents in one transaction"""
+        try:
+            with self._connect() as conn, conn:
+                for filename, data in collections.items():
+                    self._write(conn, self._table(filename), data)
+            logger.info(f"Saved {', '.join(collections)}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving {', '.join(collections)}: {e}")
+            return False
+    
+    def append(self, filename: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Append item to a collection"""
+        table = self._table(filename)
+        
+        with self._connect() as conn, conn:
+            self._ensure_table(conn, table)
+            count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            
+            # Add metadata
+            item['id'] = count + 1
+            item['created_at'] = datetime.now().isoformat()
+            
+            conn.execute(
+                f'INSERT INTO "{table}" (item_id, chapter_id, data) VALUES (?, ?, ?)',
+                self._row(item)
+            )
+        
+        logger.info(f"Appended item with id {item['id']} to {filename}")
+        return item
+    
+    def extend(self, filename: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Append several items to a collection in one transaction"""
+        table = self._table(filename)
+        
+        with self._connect() as conn, conn:
+            self._ensure_table(conn, table)
+            count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            now = datetime.now().isoformat()
+            
+            # Add metadata
+            for offset, item in enumerate(items, start=count + 1):
+                item['id'] = offset
+                item['created_at'] = now
+            
+            conn.executemany(
+                f'INSERT INTO "{table}" (item_id, chapter_id, data) VALUES (?, ?, ?)',
+                [self._row(item) for item in items]
+            )
+        
+        logger.info(f"Appended {len(items)} items to {filename}")
+        return items
+    
+    def update(self, filename: str, item_id: int, updates: Dict[str, Any]) -> bool:
+        """Update an existing item"""
+        table = self._table(filename)
+        
+        with self._connect() as conn, conn:
+            self._ensure_table(conn, table)
+            row = conn.execute(
+                f'SELECT rowid, data FROM "{table}" WHERE item_id = ? ORDER BY rowid LIMIT 1',
+                (item_id,)
+            ).fetchone()
+            
+            if row:
+                item = orjson.loads(row[1])
+                item.update(updates)
+                item['updated_at'] = datetime.now().isoformat()
+                conn.execute(
+                    f'UPDATE "{table}" SET item_id = ?, chapter_id = ?, data = ? WHERE rowid = ?',
+                    (*self._row(item), row[0])
+                )
+                logger.info(f"Updated item {item_id} in {filename}")
+                return True
+        
+        logger.warning(f"Item {item_id} not found in {filename}")
+        return False
+    
+    def get_by_id(self, filename: str, item_id: int) -> Optional[Dict[str, Any]]:
+        """Get item by ID"""
+        items = self._select(self._table(filename), "WHERE item_id = ?", (item_id,))
+        return items[0] if items else None
+    
+    def get_many(self, filename: str, item_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get several items by ID, in the order of item_ids"""
+        if not item_ids:
+            return []
+        
+        placeholders = ", ".join("?" * len(item_ids))
+        items = self._select(
+            self._table(filename), f"WHERE item_id IN ({placeholders})", tuple(item_ids)
+        )
+        by_id = {}
+        for item in items:
+            by_id.setdefault(item.get('id'), item)
+        return [by_id[item_id] for item_id in item_ids if item_id in by_id]
+    
+    @staticmethod
+    def _where(filters: Dict[str, Any]) -> tuple:
+        """SQL clause for the indexed filter keys, popped from filters; returns (where, params)"""
+        # Indexed columns are pushed into SQL; other keys are checked on the rows
+        columns = {'id': 'item_id', 'chapter_id': 'chapter_id'}
+        clauses, params = [], []
+        for key in list(filters):
+            if key in columns and filters[key] is not None:
+                clauses.append(f"{columns[key]} = ?")
+                params.append(filters.pop(key))
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, tuple(params)
+    
+    def filter(self, filename: str, **filters) -> List[Dict[str, Any]]:
+        """Filter items by criteria (id/chapter_id use indexes)"""
+        where, params = self._where(filters)
+        result = self._select(self._table(filename), where, params)
+        
+        for key, value in filters.items():
+            result = [item for item in result if item.get(key) == value]
+        
+        return result
+    
+    def tail(self, filename: str, n: int, **filters) -> List[Dict[str, Any]]:
+        """Last n items matching the filters, oldest first"""
+        if n <= 0:
+            return []
+        
+        unindexed = dict(filters)
+        where, params = self._where(unindexed)
+        if unindexed:
+            # Keys without a column can't be limited in SQL
+            return self.filter(filename, **filters)[-n:]
+        
+        result = self._select(self._table(filename), where, (*params, n), order="ORDER BY rowid DESC LIMIT ?")
+        result.reverse()
+        return result
@@ -1,32 +1,170 @@
 # storage/vector_store.py
 import faiss
+import functools
+import heapq
 import numpy as np
+import orjson
+import os
 import pickle
+import threading
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
+from config import settings
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Prompt-sized prefixes stored with each chunk as metadata['text_<n>']
+PREVIEW_LENGTHS = (600, 300)
+
+# On-disk layout: one index + metadata file pair per chapter under shards/,
+# listed (in row order) by the manifest. Saving writes only changed shards.
+# Shard metadata is JSON (orjson): faster to parse than pickle and safe to
+# load; shards saved before that still have a .pkl, read as a fallback.
+MANIFEST_NAME = "manifest.json"
+SHARDS_DIR = "shards"
+
+# Inverted lists scanned per query on IVF shards: more lists, better recall
+IVF_NPROBE_PROFILES = {'fast': 4, 'balanced': 16, 'recall': 64}
+
+def truncate_at_word(text: str, limit: int) -> str:
+    """Cut text to at most limit chars, backing off to the last whitespace"""
+    if len(text) <= limit:
+        return text
+    cut = max(text.rfind(' ', 0, limit + 1), text.rfind('\n', 0, limit + 1))
+    return text[:cut if cut > 0 else limit].rstrip()
+
+def add_text_previews(metadata_list: List[Dict[str, Any]]) -> None:
+    """Fill in missing text_<n> prefixes so prompts don't slice mid-word"""
+    for metadata in metadata_list:
+        text = metadata.get('text', '')
+        for length in PREVIEW_LENGTHS:
+            key = f'text_{length}'
+            if key not in metadata:
+                metadata[key] = truncate_at_word(text, length)
+
+def _ivf_nprobe() -> int:
+    """nprobe for IVF shards, from VECTOR_SEARCH_PROFILE if set"""
+    if settings.VECTOR_SEARCH_PROFILE:
+        try:
+            return IVF_NPROBE_PROFILES[settings.VECTOR_SEARCH_PROFILE]
+        except KeyError:
+            raise ValueError(f"Unknown VECTOR_SEARCH_PROFILE: {settings.VECTOR_SEARCH_PROFILE}")
+    return settings.VECTOR_IVF_NPROBE
+
+def _locked(method):
+    """Run a LocalVectorStore method while holding the store's lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Write via a temp file and rename, so readers never see a partial file"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
 class LocalVectorStore:
-    """FAISS-based local vector store"""
+    """FAISS-based local vector store, sharded by chapter"""
     
-    def __init__(self, dimension: int = 3072):
+    def __init__(self, dimension: int = 3072, quantize: bool = True):
         self.dimension = dimension
-        self.index = faiss.IndexFlatL2(dimension)
-        self.metadata: List[Dict[str, Any]] = []
+        self.quantize = quantize
+        self.shards: Dict[Optional[int], faiss.Index] = {}  # chapter_id -> index, in row order
+        self.shard_metadata: Dict[Optional[int], List[Dict[str, Any]]] = {}  # chapter_id -> rows
+        self._shard_mtimes: Dict[Optional[int], int] = {}  # chapter_id -> shard file mtime when loaded
+        self._mmapped: set = set()  # chapters whose index is memory-mapped (read-only)
+        self._dirty: set = set()  # chapters changed since the last save
+        self._removed: set = set()  # chapters whose shard files go on the next save
+        self._offsets: Optional[Dict[Optional[int], int]] = None  # first global row per chapter
+        self._disk_mtime: Optional[int] = None  # manifest mtime last loaded/saved
+        self.read_only = False  # True when shards are memory-mapped from disk
+        self.version = 0  # Bumped whenever the contents change, for result caches
+        # One store is shared process-wide: the upload page adds and deletes
+        # in its script thread while other sessions search from worker
+        # threads, so shards, metadata and offsets change under this lock
+        self._lock = threading.RLock()
+    
+    @property
+    @_locked
+    def metadata(self) -> List[Dict[str, Any]]:
+        """All rows' metadata in global row order"""
+        return [meta for rows in self.shard_metadata.values() for meta in rows]
+    
+    def _create_index(self) -> faiss.Index:
+        """Create an empty index (int8 scalar quantized unless quantize=False)"""
+        if not self.quantize:
+            return faiss.IndexFlatL2(self.dimension)
+        
+        # 1 byte per dimension instead of 4 - 4x less memory and scan bandwidth
+        index = faiss.IndexScalarQuantizer(
+            self.dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2
+        )
+        # Widen the trained per-dimension range by 10% so vectors added
+        # later are not clipped
+        index.sq.rangestat_arg = 0.1
+        return index
+    
+    @staticmethod
+    def _is_ivf(index: faiss.Index) -> bool:
+        """Whether an index is an inverted-file (IVF) index"""
+        try:
+            faiss.extract_index_ivf(index)
+            return True
+        except RuntimeError:
+            return False
+    
+    @classmethod
+    def _vectors(cls, index: faiss.Index) -> np.ndarray:
+        """All vectors of an index, decoded back to float32"""
+        if cls._is_ivf(index):
+            faiss.extract_index_ivf(index).make_direct_map()
+        return index.reconstruct_n(0, index.ntotal)
+    
+    def _build_ivf_index(self, chapter_id: Optional[int]) -> None:
+        """Rebuild a shard as IVF-PQ so search only scans nprobe inverted lists"""
+        vectors = self._vectors(self.shards[chapter_id])
+        
+        index = faiss.index_factory(self.dimension, settings.VECTOR_IVF_FACTORY, faiss.METRIC_L2)
+        index.train(vectors)
+        index.add(vectors)
+        faiss.extract_index_ivf(index).nprobe = _ivf_nprobe()
+        self.shards[chapter_id] = index
         
+        logger.info(
+            f"Rebuilt chapter {chapter_id} shard as {settings.VECTOR_IVF_FACTORY} "
+            f"with {index.ntotal} vectors"
+        )
+    
+    def _chapter_offsets(self) -> Dict[Optional[int], int]:
+        """Global row id of each shard's first row (shards in insertion order)"""
+        if self._offsets is None:
+            self._offsets = {}
+            total = 0
+            for chapter_id, index in self.shards.items():
+                self._offsets[chapter_id] = total
+                total += index.ntotal
+        return self._offsets
+    
+    def _changed(self) -> None:
+        self._offsets = None
+        self.version += 1
+    
+    @_locked
     def add_embeddings(
-        self, 
-        embeddings: List[List[float]], 
+        self,
+        embeddings: Union[List[List[float]], np.ndarray],
         metadata_list: List[Dict[str, Any]]
     ) -> None:
-        """Add embeddings with metadata to the index"""
-        if not embeddings:
+        """Add embeddings with metadata to their chapters' shards"""
+        if len(embeddings) == 0:
             logger.warning("No embeddings to add")
             return
         
-        embeddings_array = np.array(embeddings).astype('float32')
+        # No copy when given a C-contiguous float32 array already
+        embeddings_array = np.ascontiguousarray(embeddings, dtype='float32')
         
         if embeddings_array.shape[1] != self.dimension:
             raise ValueError(
@@ -34,63 +172,262 @@ class LocalVectorStore:
                 f"does not match index dimension {self.dimension}"
             )
         
-        self.index.add(embeddings_array)
-        self.metadata.extend(metadata_list)
+        add_text_previews(metadata_list)
         
+        rows_by_chapter: Dict[Optional[int], List[int]] = {}
+        for row, meta in enumerate(metadata_list):
+            rows_by_chapter.setdefault(meta.get('chapter_id'), []).append(row)
+        
+        for chapter_id, rows in rows_by_chapter.items():
+            if chapter_id in self._mmapped:
+                raise RuntimeError(f"Chapter {chapter_id} shard was loaded memory-mapped (read-only)")
+            
+            vectors = embeddings_array[rows]
+            index = self.shards.get(chapter_id)
+            if index is None:
+                index = self._create_index()
+                index.train(vectors)  # Each shard quantizes against its own chapter's range
+                self.shards[chapter_id] = index
+                self.shard_metadata[chapter_id] = []
+            
+            index.add(vectors)
+            self.shard_metadata[chapter_id].extend(metadata_list[row] for row in rows)
+            self._dirty.add(chapter_id)
+            self._removed.discard(chapter_id)
+            
+            if (self.quantize and not self._is_ivf(index) and
+                    index.ntotal >= settings.VECTOR_IVF_THRESHOLD):
+                self._build_ivf_index(chapter_id)
+        
+        self._changed()
         logger.info(f"Added {len(embeddings)} embeddings to index")
     
+    @_locked
+    def remove_chapter(self, chapter_id: int) -> int:
+        """Drop a chapter's shard (its files go on the next save); returns rows removed"""
+        index = self.shards.pop(chapter_id, None)
+        if index is None:
+            return 0
+        
+        del self.shard_metadata[chapter_id]
+        self._shard_mtimes.pop(chapter_id, None)
+        self._mmapped.discard(chapter_id)
+        self._dirty.discard(chapter_id)
+        self._removed.add(chapter_id)
+        self._changed()
+        
+        logger.info(f"Removed {index.ntotal} embeddings of chapter {chapter_id}")
+        return index.ntotal
+    
     def search(
-        self, 
-        query_embedding: List[float], 
+        self,
+        query_embedding: List[float],
         k: int = 5,
         filter_chapter: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """Search for similar vectors"""
-        query_array = np.array([query_embedding]).astype('float32')
+        query_array = np.asarray(query_embedding, dtype='float32').reshape(1, -1)
+        results = self.batch_search(query_array, k, [filter_chapter])[0]
         
-        # Search with buffer for filtering
-        search_k = k * 3 if filter_chapter else k
-        distances, indices = self.index.search(query_array, search_k)
+        logger.info(f"Found {len(results)} results for query")
+        return results
+    
+    @_locked
+    def batch_search(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        filter_chapters: Optional[List[Optional[int]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search several queries at once
         
-        results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            if idx >= len(self.metadata):
-                continue
-                
-            meta = self.metadata[idx]
-            
-            # Apply chapter filter
-            if filter_chapter and meta.get('chapter_id') != filter_chapter:
-                continue
+        Queries filtered to a chapter search only that chapter's shard, as
+        one multi-row faiss call per distinct chapter. Unfiltered queries
+        search every shard and keep the k nearest overall.
+        
+        Args:
+            query_embeddings: (n, dimension) array of queries
+            k: Number of results per query
+            filter_chapters: Chapter filter per query (None entries are unfiltered)
+        
+        Returns:
+            One result list per query, in query order
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype='float32').reshape(-1, self.dimension)
+        if filter_chapters is None:
+            filter_chapters = [None] * len(query_embeddings)
+        
+        rows_by_chapter: Dict[Optional[int], List[int]] = {}
+        for row, chapter_id in enumerate(filter_chapters):
+            rows_by_chapter.setdefault(chapter_id or None, []).append(row)
+        
+        offsets = self._chapter_offsets()
+        all_results: List[List[Dict[str, Any]]] = [[] for _ in filter_chapters]
+        for filter_chapter, rows in rows_by_chapter.items():
+            shard_ids = [filter_chapter] if filter_chapter else list(self.shards)
             
-            results.append({
-                'metadata': meta,
-                'score': float(dist),
-                'index': int(idx)
-            })
+            candidates: List[List[Dict[str, Any]]] = [[] for _ in rows]
+            for chapter_id in shard_ids:
+                index = self.shards.get(chapter_id)
+                if index is None or index.ntotal == 0:
+                    continue
+                
+                shard_metadata = self.shard_metadata[chapter_id]
+                distances, indices = index.search(query_embeddings[rows], k)
+                
+                for row_candidates, row_distances, row_indices in zip(candidates, distances, indices):
+                    for dist, idx in zip(row_distances, row_indices):
+                        if idx < 0 or idx >= len(shard_metadata):
+                            continue
+                        row_candidates.append({
+                            'metadata': shard_metadata[idx],
+                            'score': float(dist),
+                            'index': int(offsets[chapter_id] + idx)
+                        })
             
-            if len(results) >= k:
-                break
+            for row, row_candidates in zip(rows, candidates):
+                if len(shard_ids) > 1:
+                    row_candidates = heapq.nsmallest(k, row_candidates, key=lambda result: result['score'])
+                all_results[row] = row_candidates[:k]
         
-        logger.info(f"Found {len(results)} results for query")
-        return results
+        return all_results
+    
+    @staticmethod
+    def _shard_paths(path: Path, chapter_id: Optional[int]) -> tuple:
+        shard_dir = path / SHARDS_DIR
+        return shard_dir / f"chapter_{chapter_id}.index", shard_dir / f"chapter_{chapter_id}.json"
+    
+    @staticmethod
+    def _read_shard_metadata(metadata_path: Path) -> List[Dict[str, Any]]:
+        legacy_path = metadata_path.with_suffix('.pkl')
+        if not metadata_path.exists() and legacy_path.exists():
+            with open(legacy_path, 'rb') as f:
+                return pickle.load(f)
+        return orjson.loads(metadata_path.read_bytes())
     
+    @_locked
     def save(self, path: Path) -> None:
-        """Save index and metadata to disk"""
-        path.mkdir(parents=True, exist_ok=True)
+        """Write changed chapter shards and the manifest to disk"""
+        (path / SHARDS_DIR).mkdir(parents=True, exist_ok=True)
         
-        index_path = path / "faiss.index"
-        metadata_path = path / "metadata.pkl"
+        for chapter_id in self._removed:
+            index_path, metadata_path = self._shard_paths(path, chapter_id)
+            for shard_path in (index_path, metadata_path, metadata_path.with_suffix('.pkl')):
+                shard_path.unlink(missing_ok=True)
+        
+        for chapter_id in self._dirty:
+            index_path, metadata_path = self._shard_paths(path, chapter_id)
+            _write_atomic(index_path, faiss.serialize_index(self.shards[chapter_id]).tobytes())
+            _write_atomic(metadata_path, orjson.dumps(self.shard_metadata[chapter_id], option=orjson.OPT_SERIALIZE_NUMPY))
+            metadata_path.with_suffix('.pkl').unlink(missing_ok=True)
+            self._shard_mtimes[chapter_id] = index_path.stat().st_mtime_ns
+        
+        # The manifest goes last: readers only ever see complete shards
+        _write_atomic(path / MANIFEST_NAME, orjson.dumps({
+            'dimension': self.dimension,
+            'chapters': list(self.shards)
+        }))
         
-        faiss.write_index(self.index, str(index_path))
+        logger.info(
+            f"Saved {len(self._dirty)} changed shards ({len(self._removed)} removed) "
+            f"of {len(self.shards)} to {path}"
+        )
+        self._dirty.clear()
+        self._removed.clear()
+        self._disk_mtime = self._files_mtime(path)
+    
+    @staticmethod
+    def _files_mtime(path: Path) -> Optional[int]:
+        """Modification time (ns) of the manifest, None if missing"""
+        try:
+            return (path / MANIFEST_NAME).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    @_locked
+    def reload_if_changed(self, path: Path) -> bool:
+        """Reload from disk if another instance saved since this one loaded"""
+        mtime = self._files_mtime(path)
+        if mtime is None or mtime == self._disk_mtime:
+            return False
+        return self.load(path, mmap=self.read_only)
+    
+    def _read_shard_index(self, index_path: Path, mmap: bool) -> tuple:
+        """Read one shard's index, memory-mapped when possible; returns (index, mmapped)"""
+        if mmap:
+            try:
+                index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                return index, True
+            except RuntimeError as e:
+                # Not every index type supports mmap - fall back to a normal read
+                logger.warning(f"Memory-mapped load of {index_path.name} failed, reading into memory: {e}")
+        return faiss.read_index(str(index_path)), False
+    
+    @_locked
+    def load(self, path: Path, mmap: bool = False) -> bool:
+        """
+        Load shards from disk
         
-        with open(metadata_path, 'wb') as f:
-            pickle.dump(self.metadata, f)
+        With mmap=True shard indexes are memory-mapped read-only, so
+        processes share the OS page cache instead of each holding a copy
+        of the vectors; those chapters then can't be added to. Shards
+        already loaded and unchanged on disk are kept as they are, so a
+        reload only reads new or rewritten chapters.
+        """
+        if not (path / MANIFEST_NAME).exists():
+            return self._migrate_single_index(path)
         
-        logger.info(f"Saved index with {self.index.ntotal} vectors to {path}")
+        try:
+            manifest = orjson.loads((path / MANIFEST_NAME).read_bytes())
+            
+            shards = {}
+            shard_metadata = {}
+            for chapter_id in manifest['chapters']:
+                index_path, metadata_path = self._shard_paths(path, chapter_id)
+                mtime = index_path.stat().st_mtime_ns
+                
+                if chapter_id in self.shards and self._shard_mtimes.get(chapter_id) == mtime:
+                    shards[chapter_id] = self.shards[chapter_id]
+                    shard_metadata[chapter_id] = self.shard_metadata[chapter_id]
+                    continue
+                
+                index, mmapped = self._read_shard_index(index_path, mmap)
+                if mmapped:
+                    self._mmapped.add(chapter_id)
+                else:
+                    self._mmapped.discard(chapter_id)
+                if self._is_ivf(index):
+                    faiss.extract_index_ivf(index).nprobe = _ivf_nprobe()
+                
+                metadata = self._read_shard_metadata(metadata_path)
+                add_text_previews(metadata)
+                
+                shards[chapter_id] = index
+                shard_metadata[chapter_id] = metadata
+                self._shard_mtimes[chapter_id] = mtime
+            
+            for chapter_id in set(self.shards) - set(shards):
+                self._shard_mtimes.pop(chapter_id, None)
+                self._mmapped.discard(chapter_id)
+            
+            self.shards = shards
+            self.shard_metadata = shard_metadata
+            self._dirty.clear()
+            self._removed.clear()
+            self.read_only = mmap
+            self._disk_mtime = self._files_mtime(path)
+            self._changed()
+            
+            total = sum(index.ntotal for index in shards.values())
+            logger.info(f"Loaded {len(shards)} shards with {total} vectors from {path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading index: {e}")
+            return False
     
-    def load(self, path: Path) -> bool:
-        """Load index and metadata from disk"""
+    def _migrate_single_index(self, path: Path) -> bool:
+        """Split a pre-sharding faiss.index/metadata.pkl pair into chapter shards"""
         index_path = path / "faiss.index"
         metadata_path = path / "metadata.pkl"
         
@@ -99,21 +436,31 @@ class LocalVectorStore:
             return False
         
         try:
-            self.index = faiss.read_index(str(index_path))
-            
+            index = faiss.read_index(str(index_path))
             with open(metadata_path, 'rb') as f:
-                self.metadata = pickle.load(f)
+                metadata = pickle.load(f)
             
-            logger.info(f"Loaded index with {self.index.ntotal} vectors from {path}")
+            # Older deletes dropped metadata without the vectors; rows past
+            # the metadata can't be attributed to a chapter
+            vectors = self._vectors(index)[:len(metadata)] if index.ntotal else []
+            self.add_embeddings(vectors, metadata[:len(vectors)])
+            self.save(path)
+            self.read_only = False
+            
+            logger.info(f"Migrated {len(vectors)} vectors from {index_path.name} into {len(self.shards)} shards")
             return True
         except Exception as e:
-            logger.error(f"Error loading index: {e}")
+            logger.error(f"Error migrating index: {e}")
             return False
     
+    @_locked
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector store"""
+        index_types = sorted({type(index).__name__ for index in self.shards.values()})
         return {
-            'total_vectors': self.index.ntotal,
+            'total_vectors': sum(index.ntotal for index in self.shards.values()),
+            'index_type': ", ".join(index_types),
             'dimension': self.dimension,
-            'total_metadata': len(self.metadata)
-        }
\ No newline at end of file
+            'total_metadata': sum(len(rows) for rows in self.shard_metadata.values()),
+            'shards': len(self.shards)
+        }
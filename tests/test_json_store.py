@@ -0,0 +1,27 @@
+# tests/test_json_store.py
+from storage import json_store
+from storage.json_store import JSONStorage
+
+def test_dict_collection_round_trip(tmp_path):
+    storage = JSONStorage(tmp_path)
+    quality = {'12': {'scores': [80, 90]}, '13': {'scores': [70]}}
+    
+    assert storage.save('chunk_quality', quality)
+    assert storage.load('chunk_quality') == quality
+    
+    # Read back from disk, as after a restart
+    json_store._CACHE.clear()
+    assert JSONStorage(tmp_path).load('chunk_quality') == quality
+
+def test_nested_fields_not_shared_with_cache(tmp_path):
+    storage = JSONStorage(tmp_path)
+    storage.save('questions', [{'id': 1, 'options': {'A': 'x'}, 'citations': ['p. 1']}])
+    
+    loaded = storage.load('questions')
+    loaded[0]['options']['A'] = 'changed'
+    loaded[0]['citations'].append('p. 2')
+    storage.get_by_id('questions', 1)['options']['A'] = 'changed'
+    
+    for reloaded in (storage.load('questions')[0], storage.get_by_id('questions', 1), storage.filter('questions', id=1)[0]):
+        assert reloaded['options'] == {'A': 'x'}
+        assert reloaded['citations'] == ['p. 1']
@@ -0,0 +1,29 @@
+# tests/test_question_index.py
+import difflib
+import pytest
+
+pytest.importorskip("datasketch")
+from core.question_index import QuestionIndex
+
+# Vignette stems the baseline rejected as duplicates (ratio > 0.55) even
+# though they share little 4-gram or word-set overlap
+SIMILAR_STEMS = [
+    (
+        "A 45-year-old man presents with crushing chest pain radiating to the left arm. What is the most likely diagnosis?",
+        "A 62-year-old woman presents with sudden shortness of breath and pleuritic chest pain. What is the most likely diagnosis?",
+    ),
+]
+
+@pytest.mark.parametrize("existing, new", SIMILAR_STEMS)
+def test_candidates_keep_pairs_above_ratio_threshold(existing, new):
+    existing_folded, new_folded = existing.casefold(), new.casefold()
+    matcher = difflib.SequenceMatcher(None, existing_folded, new_folded, autojunk=False)
+    assert matcher.ratio() > 0.55
+    
+    index = QuestionIndex()
+    index.add(1, existing)
+    
+    # The pair must reach the exact ratio() check in _is_question_unique
+    assert existing_folded in index.candidates(new)
+    assert matcher.quick_ratio() > 0.55
+    assert 2 * min(len(existing_folded), len(new_folded)) / (len(existing_folded) + len(new_folded)) > 0.55
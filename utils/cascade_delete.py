@@ -1,15 +1,26 @@
 # utils/cascade_delete.py
 from pathlib import Path
-from typing import Dict, Any
-from storage.json_store import JSONStorage
-from storage.vector_store import LocalVectorStore
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+from storage.factory import Storage
+from utils.resources import get_vector_store
 from config import settings
 from utils.logger import setup_logger
 import os
 
 logger = setup_logger(__name__)
 
-def cascade_delete_chapter(chapter_id: int, storage: JSONStorage) -> Dict[str, Any]:
+IMAGE_DELETE_WORKERS = 16  # Image files unlinked concurrently
+
+def _remove_file(path: str) -> Optional[Exception]:
+    """Delete a file, returning the error instead of raising it"""
+    try:
+        os.remove(path)
+        return None
+    except Exception as e:
+        return e
+
+def cascade_delete_chapter(chapter_id: int, storage: Storage) -> Dict[str, Any]:
     """
     Delete a chapter and all related data
     
@@ -27,6 +38,9 @@ def cascade_delete_chapter(chapter_id: int, storage: JSONStorage) -> Dict[str, A
         'errors': []
     }
     
+    # Collections are rewritten together at the end, only those that changed
+    updates = {}
+    
     try:
         # 1. Get chapter info
         chapters = storage.load('chapters')
@@ -53,64 +67,58 @@ def cascade_delete_chapter(chapter_id: int, storage: JSONStorage) -> Dict[str, A
         questions = storage.load('questions')
         questions_to_keep = [q for q in questions if q.get('chapter_id') != chapter_id]
         stats['questions_deleted'] = len(questions) - len(questions_to_keep)
-        storage.save('questions', questions_to_keep)
+        if stats['questions_deleted']:
+            updates['questions'] = questions_to_keep
         logger.info(f"Deleted {stats['questions_deleted']} questions")
         
         # 4. Delete attempts (only for deleted questions)
-        deleted_question_ids = [q['id'] for q in questions if q.get('chapter_id') == chapter_id]
+        deleted_question_ids = {q['id'] for q in questions if q.get('chapter_id') == chapter_id}
         attempts = storage.load('attempts')
         attempts_to_keep = [a for a in attempts if a.get('question_id') not in deleted_question_ids]
         stats['attempts_deleted'] = len(attempts) - len(attempts_to_keep)
-        storage.save('attempts', attempts_to_keep)
+        if stats['attempts_deleted']:
+            updates['attempts'] = attempts_to_keep
         logger.info(f"Deleted {stats['attempts_deleted']} attempts")
         
         # 5. Delete images
         images = storage.load('images')
         chapter_images = [img for img in images if img.get('chapter_id') == chapter_id]
         
-        # Delete image files
-        for img in chapter_images:
-            if 'path' in img:
-                img_path = Path(img['path'])
-                if img_path.exists():
-                    try:
-                        os.remove(img_path)
+        # Delete image files, several at a time (missing files are skipped)
+        image_paths = [img['path'] for img in chapter_images if 'path' in img]
+        if image_paths:
+            with ThreadPoolExecutor(max_workers=min(IMAGE_DELETE_WORKERS, len(image_paths))) as executor:
+                for img_path, error in zip(image_paths, executor.map(_remove_file, image_paths)):
+                    if error is None:
                         stats['images_deleted'] += 1
-                    except Exception as e:
-                        stats['errors'].append(f"Failed to delete image {img_path}: {e}")
+                    elif not isinstance(error, FileNotFoundError):
+                        stats['errors'].append(f"Failed to delete image {img_path}: {error}")
         
         # Remove from storage
         images_to_keep = [img for img in images if img.get('chapter_id') != chapter_id]
-        storage.save('images', images_to_keep)
+        if len(images_to_keep) < len(images):
+            updates['images'] = images_to_keep
         logger.info(f"Deleted {stats['images_deleted']} images")
         
         # 6. Delete RAG conversations
         rag_conversations = storage.load('rag_conversations')
         rag_to_keep = [conv for conv in rag_conversations if conv.get('chapter_id') != chapter_id]
         stats['rag_conversations_deleted'] = len(rag_conversations) - len(rag_to_keep)
-        storage.save('rag_conversations', rag_to_keep)
+        if stats['rag_conversations_deleted']:
+            updates['rag_conversations'] = rag_to_keep
         logger.info(f"Deleted {stats['rag_conversations_deleted']} RAG conversations")
         
         # 7. Delete embeddings from vector store
         try:
-            vector_store = LocalVectorStore()
-            vector_store.load(settings.EMBEDDINGS_PATH)
-            
-            # Filter out embeddings for this chapter
-            filtered_metadata = [
-                meta for meta in vector_store.metadata 
-                if meta.get('chapter_id') != chapter_id
-            ]
+            # The process-wide store: no index read here, and its in-memory
+            # shards stay in step with what is saved
+            vector_store = get_vector_store()
             
-            stats['embeddings_deleted'] = len(vector_store.metadata) - len(filtered_metadata)
+            # Each chapter has its own shard: drop it and delete its files,
+            # the other chapters' shards are left untouched
+            stats['embeddings_deleted'] = vector_store.remove_chapter(chapter_id)
             
             if stats['embeddings_deleted'] > 0:
-                # Rebuild vector store without this chapter's embeddings
-                # This requires rebuilding the entire FAISS index
-                logger.warning("Vector store rebuild required - embeddings marked for deletion")
-                # Note: Full rebuild would need re-embedding remaining chapters
-                # For now, just update metadata
-                vector_store.metadata = filtered_metadata
                 vector_store.save(settings.EMBEDDINGS_PATH)
             
             logger.info(f"Removed {stats['embeddings_deleted']} embeddings from vector store")
@@ -118,9 +126,12 @@ def cascade_delete_chapter(chapter_id: int, storage: JSONStorage) -> Dict[str, A
         except Exception as e:
             stats['errors'].append(f"Failed to delete embeddings: {e}")
         
-        # 8. Delete chapter entry
-        chapters_to_keep = [c for c in chapters if c['id'] != chapter_id]
-        storage.save('chapters', chapters_to_keep)
+        # 8. Delete chapter entry, writing every changed collection at once
+        # (one transaction on SQLite)
+        updates['chapters'] = [c for c in chapters if c['id'] != chapter_id]
+        if not storage.save_many(updates):
+            stats['errors'].append(f"Failed to save {', '.join(updates)}")
+            return stats
         stats['chapter_deleted'] = True
         logger.info(f"Deleted chapter {chapter_id} entry")
         
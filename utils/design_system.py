@@ -3,6 +3,7 @@
 Modern Design System for Medical Exam Prep Application
 Production-ready UI components and styling
 """
+import functools
 
 # Color Palette
 COLORS = {
@@ -62,8 +63,9 @@ SHADOWS = {
     'xl': '0 20px 25px -5px rgba(0, 0, 0, 0.1)',
 }
 
+@functools.lru_cache(maxsize=1)
 def get_global_css():
-    """Return global CSS for the entire application"""
+    """Return global CSS for the entire application (built once per process)"""
     return f"""
     <style>
         @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap');
@@ -0,0 +1,51 @@
+# utils/helpers.py
+import numpy as np
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Pick at most threshold points of a series with Largest-Triangle-Three-Buckets
+    
+    Keeps the first and last points and, from each bucket in between, the
+    point forming the largest triangle with the previously kept point and the
+    next bucket's mean - preserving the visual shape of the line. Series
+    already within the threshold keep every point.
+    
+    Args:
+        x: Numeric x values (e.g. datetime64 viewed as int64), ascending
+        y: y values, same length as x
+        threshold: Maximum number of points to keep (>= 3)
+    
+    Returns:
+        Ascending indices of the kept points
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    xf = np.asarray(x, dtype='float64')
+    yf = np.asarray(y, dtype='float64')
+    
+    # Interior points split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        
+        # Mean of the next bucket (the last point for the final bucket)
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], edges[i + 2]
+            mean_x, mean_y = xf[next_start:next_stop].mean(), yf[next_start:next_stop].mean()
+        else:
+            mean_x, mean_y = xf[-1], yf[-1]
+        
+        areas = np.abs(
+            (xf[previous] - mean_x) * (yf[start:stop] - yf[previous])
+            - (xf[previous] - xf[start:stop]) * (mean_y - yf[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept[i + 1] = previous
+    
+    return kept
@@ -0,0 +1,69 @@
+# utils/resources.py
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Coroutine, Iterator
+import streamlit as st
+from storage.vector_store import LocalVectorStore
+from core.embeddings import EmbeddingManager
+from core.agents.question_generator import QuestionGeneratorAgent
+from config import settings
+
+@st.cache_resource
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """Long-lived event loop on a daemon thread, shared by all sessions"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True, name="async-runner").start()
+    return loop
+
+def submit_async(coro: Coroutine) -> Future:
+    """Start a coroutine on the shared event loop without waiting for it"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop())
+
+def run_async(coro: Coroutine) -> Any:
+    """
+    Run a coroutine on the shared event loop and wait for its result
+    
+    Cached resources hold AsyncOpenAI clients whose connection pools are
+    bound to the loop they were first used on, so they must not be driven
+    by a fresh asyncio.run() loop on every rerun.
+    """
+    return submit_async(coro).result()
+
+def iterate_async(agen: AsyncIterator) -> Iterator:
+    """Consume an async iterator on the shared event loop, one item per step"""
+    async def next_item() -> Any:
+        return await agen.__anext__()
+    
+    while True:
+        try:
+            yield run_async(next_item())
+        except StopAsyncIteration:
+            return
+
+@st.cache_resource
+def _load_vector_store() -> LocalVectorStore:
+    vector_store = LocalVectorStore()
+    vector_store.load(settings.EMBEDDINGS_PATH)
+    return vector_store
+
+def get_vector_store() -> LocalVectorStore:
+    """Process-wide vector store, reloaded in place only when the files on disk change"""
+    vector_store = _load_vector_store()
+    vector_store.reload_if_changed(settings.EMBEDDINGS_PATH)
+    return vector_store
+
+@st.cache_resource
+def get_embedding_manager() -> EmbeddingManager:
+    """Shared embedding manager, so its in-memory embedding cache stays warm across reruns"""
+    return EmbeddingManager()
+
+@st.cache_resource
+def _create_question_agent() -> QuestionGeneratorAgent:
+    return QuestionGeneratorAgent(vector_store=get_vector_store())
+
+def get_question_agent() -> QuestionGeneratorAgent:
+    """Shared question generator (clients, caches and compiled graph built once)"""
+    agent = _create_question_agent()
+    get_vector_store()  # pick up chapters uploaded or deleted since last use
+    return agent
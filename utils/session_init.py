@@ -1,6 +1,6 @@
 # utils/session_init.py
 import streamlit as st
-from storage.json_store import JSONStorage
+from storage.factory import create_storage
 from config import settings
 
 def init_session_state():
@@ -8,7 +8,7 @@ def init_session_state():
     
     # Storage initialization
     if 'storage' not in st.session_state:
-        st.session_state.storage = JSONStorage(settings.CACHE_PATH)
+        st.session_state.storage = create_storage()
     
     # Navigation state
     if 'current_question_idx' not in st.session_state:
@@ -30,9 +30,15 @@ def init_session_state():
     if 'selected_rag_chapter' not in st.session_state:
         st.session_state.selected_rag_chapter = None
     
-    # Initialize empty JSON files if they don't exist
-    storage = st.session_state.storage
+    _ensure_storage_files()
+
+@st.cache_resource
+def _ensure_storage_files():
+    """Initialize empty JSON (Lines) files if they don't exist (once per process)"""
+    if settings.STORAGE_BACKEND != "json":
+        return  # SQLite creates its tables on first use
+    
+    storage = create_storage()
     for filename in ['chapters', 'questions', 'attempts', 'images', 'rag_conversations']:
-        file_path = settings.CACHE_PATH / f"{filename}.json"
-        if not file_path.exists():
+        if not storage.get_mtime(filename):  # 0 when the file is missing
             storage.save(filename, [])
\ No newline at end of file
@@ -0,0 +1,24 @@
+# utils/storage_cache.py
+from typing import Any, Dict, List
+import streamlit as st
+
+# Reads are keyed on the collection's storage mtime, so reruns from widget
+# clicks skip the disk read and parse until a write changes the file. The
+# storage object itself (underscore-prefixed) is excluded from hashing.
+# st.cache_data hands every caller its own copy, so pages may mutate results.
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _load(name: str, mtime: int, _storage) -> List[Dict[str, Any]]:
+    return _storage.load(name)
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def _filter(name: str, mtime: int, filters: tuple, _storage) -> List[Dict[str, Any]]:
+    return _storage.filter(name, **dict(filters))
+
+def load_cached(storage, name: str) -> List[Dict[str, Any]]:
+    """storage.load(name), re-read only when the collection changes on disk"""
+    return _load(name, storage.get_mtime(name), storage)
+
+def filter_cached(storage, name: str, **filters) -> List[Dict[str, Any]]:
+    """storage.filter(name, **filters), re-read only when the collection changes on disk"""
+    return _filter(name, storage.get_mtime(name), tuple(sorted(filters.items())), storage)
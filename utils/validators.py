@@ -2,6 +2,10 @@
 from typing import Dict, Any, List
 import re
 
+REQUIRED_FIELDS = ('question', 'options', 'correct_answer', 'explanation')
+OPTION_LABELS = ('A', 'B', 'C', 'D')
+OPTION_KEYS = frozenset(OPTION_LABELS)
+
 def validate_question_structure(question: Dict[str, Any]) -> tuple[bool, List[str]]:
     """
     Validate question structure
@@ -12,8 +16,7 @@ def validate_question_structure(question: Dict[str, Any]) -> tuple[bool, List[st
     errors = []
     
     # Required fields
-    required_fields = ['question', 'options', 'correct_answer', 'explanation']
-    for field in required_fields:
+    for field in REQUIRED_FIELDS:
         if field not in question:
             errors.append(f"Missing required field: {field}")
     
@@ -23,12 +26,12 @@ def validate_question_structure(question: Dict[str, Any]) -> tuple[bool, List[st
             errors.append("Options must be a dictionary")
         elif len(question['options']) != 4:
             errors.append("Must have exactly 4 options (A, B, C, D)")
-        elif set(question['options'].keys()) != {'A', 'B', 'C', 'D'}:
+        elif question['options'].keys() != OPTION_KEYS:
             errors.append("Options must be labeled A, B, C, D")
     
     # Correct answer validation
     if 'correct_answer' in question:
-        if question['correct_answer'] not in ['A', 'B', 'C', 'D']:
+        if question['correct_answer'] not in OPTION_LABELS:
             errors.append("Correct answer must be A, B, C, or D")
     
     return len(errors) == 0, errors
\ No newline at end of file